@@ -0,0 +1,264 @@
+"""
+End-to-end benchmark of ``POST /v1/chat/completions``.
+
+Runs the FastAPI app in-process (httpx ASGI transport, no server or network)
+against a seeded SQLite stand-in for the Student database and a local LLM
+backend (``stub`` by default, or ``replay`` of a recorded cassette). A
+weighted question mix from ``questions.json`` is sent by ``--concurrency``
+closed-loop clients, and the run is written as JSON: latency percentiles,
+requests per second, errors, and the time spent in each pipeline stage
+(intent, schema, sql_generation, execute, summary, visualization, chat)
+taken from the ``timings`` the endpoint returns.
+
+Usage::
+
+    python -m benchmarks.chat_benchmark --requests 200 --concurrency 8
+    python -m benchmarks.chat_benchmark --llm-latency-ms 300 --baseline benchmarks/results/before.json
+    python -m benchmarks.chat_benchmark --backend replay --cassette cassettes/llm.jsonl
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=float)
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 1),
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+        "p99": round(float(np.percentile(values, 99)), 1),
+        "max": round(float(values.max()), 1)
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="measured requests (default 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients (default 8)")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests sent first (default 10)")
+    parser.add_argument("--questions", default=os.path.join(HERE, "questions.json"),
+                        help="JSON list of {question, weight}")
+    parser.add_argument("--students", type=int, default=500, help="students in the SQLite fixture")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the fixture and the question order")
+    parser.add_argument("--backend", choices=("stub", "replay"), default="stub", help="LLM backend")
+    parser.add_argument("--cassette", help="cassette for --backend replay")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="latency injected per LLM call (replay: overrides the recorded latency)")
+    parser.add_argument("--chart-format", choices=("png", "spec"), default="png")
+    parser.add_argument("--stream", action="store_true", help="measure stream=true (time to the last event)")
+    parser.add_argument("--output", help="result file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier result file to compare against")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, workdir):
+    """Point the app at the fixture and a local LLM before it is imported."""
+    from benchmarks.fixture import seed_database
+
+    os.environ["DATABASE_URL"] = seed_database(os.path.join(workdir, "student.db"), args.students, args.seed)
+    os.environ["LLM_BACKEND"] = args.backend
+    if args.backend == "replay":
+        if not args.cassette:
+            sys.exit("--backend replay needs --cassette")
+        os.environ["LLM_CASSETTE"] = args.cassette
+        if args.llm_latency_ms:
+            os.environ["LLM_REPLAY_LATENCY_MS"] = str(args.llm_latency_ms)
+    else:
+        os.environ["LLM_STUB_LATENCY_MS"] = str(args.llm_latency_ms)
+    # Measure the service, not the provider quota (set these explicitly to model one).
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "1000000")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "1000000000")
+    os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(workdir, "images"))
+
+
+def question_mix(path, count, rng):
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    questions = [e["question"] for e in entries]
+    weights = [e.get("weight", 1) for e in entries]
+    return rng.choices(questions, weights=weights, k=count)
+
+
+async def send(client, question, index, args):
+    body = {
+        "model": "benchmark",
+        "messages": [{"role": "user", "content": question}],
+        "stream": args.stream,
+        "chart_format": args.chart_format,
+        # A fresh conversation per request, so no request is answered as a follow-up.
+        "conversation_id": f"bench-{index}"
+    }
+    started = time.perf_counter()
+    timings = None
+    if args.stream:
+        async with client.stream("POST", "/v1/chat/completions", json=body) as response:
+            status = response.status_code
+            async for _ in response.aiter_lines():
+                pass
+    else:
+        response = await client.post("/v1/chat/completions", json=body)
+        status = response.status_code
+        if status == 200:
+            timings = response.json().get("timings")
+    latency_ms = (time.perf_counter() - started) * 1000
+    return {"question": question, "status": status, "latency_ms": latency_ms, "timings": timings}
+
+
+async def run_load(client, questions, args, offset=0):
+    queue = asyncio.Queue()
+    for i, question in enumerate(questions):
+        queue.put_nowait((offset + i, question))
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            index, question = queue.get_nowait()
+            try:
+                results.append(await send(client, question, index, args))
+            except Exception as e:
+                results.append({"question": question, "status": "exception", "error": str(e),
+                                "latency_ms": None, "timings": None})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    ok = [r for r in results if r["status"] == 200]
+    stage_ms = defaultdict(list)
+    stage_status = defaultdict(lambda: defaultdict(int))
+    by_question = defaultdict(list)
+    for r in ok:
+        by_question[r["question"]].append(r["latency_ms"])
+        for name, stage in ((r["timings"] or {}).get("stages") or {}).items():
+            stage_status[name][stage["status"]] += 1
+            # Cancelled speculative stages did no useful work; count them but don't time them.
+            if stage["status"] == "done":
+                stage_ms[name].append(stage["ms"])
+    errors = defaultdict(int)
+    for r in results:
+        if r["status"] != 200:
+            errors[str(r["status"])] += 1
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": dict(errors),
+        "duration_s": round(elapsed, 3),
+        "requests_per_second": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles([r["latency_ms"] for r in ok]),
+        "stages_ms": {
+            name: {**percentiles(stage_ms[name]), "status": dict(stage_status[name])}
+            for name in sorted(stage_status)
+        },
+        "by_question_ms": {q: percentiles(v) for q, v in sorted(by_question.items())}
+    }
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = [("requests_per_second", baseline["summary"]["requests_per_second"],
+             report["summary"]["requests_per_second"])]
+    for key in ("p50", "p95", "p99"):
+        rows.append((f"latency {key} ms", baseline["summary"]["latency_ms"].get(key),
+                     report["summary"]["latency_ms"].get(key)))
+    for name, stage in report["summary"]["stages_ms"].items():
+        before = baseline["summary"]["stages_ms"].get(name, {}).get("p50")
+        rows.append((f"{name} p50 ms", before, stage.get("p50")))
+    deltas = {}
+    for label, before, after in rows:
+        change = round((after - before) / before * 100, 1) if before and after is not None else None
+        deltas[label] = {"baseline": before, "current": after, "change_pct": change}
+    return deltas
+
+
+def print_report(report):
+    summary = report["summary"]
+    latency = summary["latency_ms"]
+    print(f"\n{summary['succeeded']}/{summary['requests']} ok in {summary['duration_s']}s "
+          f"({summary['requests_per_second']} req/s, concurrency {report['config']['concurrency']})")
+    if summary["errors"]:
+        print(f"errors: {summary['errors']}")
+    if latency.get("count"):
+        print(f"latency ms  p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"\n{'stage':<16}{'runs':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}")
+    for name, stage in summary["stages_ms"].items():
+        if stage.get("count"):
+            print(f"{name:<16}{stage['count']:>6}{stage['p50']:>10}{stage['p95']:>10}"
+                  f"{stage['p99']:>10}{stage['mean']:>10}")
+    for label, delta in (report.get("comparison") or {}).items():
+        change = f"{delta['change_pct']:+.1f}%" if delta["change_pct"] is not None else "n/a"
+        print(f"{label:<28}{delta['baseline']!s:>10} -> {delta['current']!s:<10}{change}")
+
+
+async def main(args):
+    import httpx
+
+    workdir = tempfile.mkdtemp(prefix="chat-benchmark-")
+    configure_environment(args, workdir)
+    from my_agents import api
+
+    rng = random.Random(args.seed)
+    warmup = question_mix(args.questions, args.warmup, rng)
+    measured = question_mix(args.questions, args.requests, rng)
+
+    transport = httpx.ASGITransport(app=api.app)
+    # Start the render processes up front so the first charts don't pay for spawning them.
+    await asyncio.to_thread(api.visualization_handler.renderer.warm_up)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            if warmup:
+                await run_load(client, warmup, args, offset=-len(warmup))
+            results, elapsed = await run_load(client, measured, args)
+    finally:
+        api.visualization_handler.renderer.shutdown()
+
+    report = {
+        "benchmark": "chat_completions",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup,
+            "students": args.students, "seed": args.seed, "backend": args.backend,
+            "llm_latency_ms": args.llm_latency_ms, "chart_format": args.chart_format, "stream": args.stream,
+            "questions": os.path.relpath(args.questions)
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "summary": summarize(results, elapsed),
+        "llm": api.llm_handler.client.stats(),
+        "caches": {"sql": api.sql_cache.stats(), "results": api.db_manager.result_cache.stats()},
+        "render": api.visualization_handler.render_stats()
+    }
+    if args.baseline:
+        report["comparison"] = compare(report, args.baseline)
+
+    output = args.output or os.path.join(
+        HERE, "results", f"chat-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print_report(report)
+    print(f"\nWrote {output}")
+    return report
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,93 @@
+"""
+Seeded SQLite stand-in for the Student database used by the benchmarks.
+
+The data is generated from a fixed seed, so two runs with the same
+arguments query identical tables.
+"""
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+SUBJECTS = ["CTPS", "PDS", "DBMS", "JAVA", "PYTHON", "OOPS", "PLACEMENT PROGRAMMING"]
+DEPARTMENTS = ["CSE", "IT", "ECE", "EEE", "MECH"]
+ASSESSMENTS = ["Quiz", "Assignment", "Lab Test", "Mid Term", "End Term"]
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Ananya", "Vihaan", "Saanvi", "Arjun", "Myra", "Kabir", "Aadhya",
+               "Reyansh", "Kiara", "Advik", "Pari", "Vivaan", "Navya", "Rohan", "Meera", "Karthik", "Nila"]
+LAST_NAMES = ["Sharma", "Iyer", "Reddy", "Nair", "Patel", "Gupta", "Rao", "Menon", "Das", "Singh"]
+
+SCHEMA = """
+CREATE TABLE students (
+    student_id INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    department VARCHAR(20) NOT NULL,
+    year_of_study INTEGER NOT NULL,
+    city VARCHAR(50)
+);
+CREATE TABLE courses (
+    course_id INTEGER PRIMARY KEY,
+    subject VARCHAR(50) NOT NULL,
+    credits INTEGER NOT NULL
+);
+CREATE TABLE scores (
+    score_id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES students(student_id),
+    course_id INTEGER NOT NULL REFERENCES courses(course_id),
+    assessment VARCHAR(30) NOT NULL,
+    score REAL NOT NULL,
+    assessed_on DATE NOT NULL
+);
+CREATE TABLE attendance (
+    student_id INTEGER NOT NULL REFERENCES students(student_id),
+    course_id INTEGER NOT NULL REFERENCES courses(course_id),
+    attended INTEGER NOT NULL,
+    total INTEGER NOT NULL
+);
+"""
+
+CITIES = ["Chennai", "Coimbatore", "Madurai", "Bengaluru", "Hyderabad", "Kochi"]
+
+
+def seed_database(path: str, students: int = 500, seed: int = 0) -> str:
+    """
+    Create (or replace) a SQLite database at ``path`` and fill it.
+
+    Every student has a score per assessment in each course and an
+    attendance row per course, so ``scores`` holds
+    ``students * len(SUBJECTS) * len(ASSESSMENTS)`` rows.
+    Returns the SQLAlchemy URL of the database.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rng = random.Random(seed)
+    start = date(2024, 7, 1)
+
+    with sqlite3.connect(path) as connection:
+        connection.executescript(SCHEMA)
+        connection.executemany(
+            "INSERT INTO courses VALUES (?, ?, ?)",
+            [(i + 1, subject, rng.choice([2, 3, 4])) for i, subject in enumerate(SUBJECTS)]
+        )
+        student_rows, score_rows, attendance_rows = [], [], []
+        for student_id in range(1, students + 1):
+            student_rows.append((
+                student_id,
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                rng.choice(DEPARTMENTS),
+                rng.randint(1, 4),
+                rng.choice(CITIES)
+            ))
+            ability = rng.gauss(70, 10)
+            for course_id in range(1, len(SUBJECTS) + 1):
+                for week, assessment in enumerate(ASSESSMENTS):
+                    score = min(100.0, max(0.0, rng.gauss(ability, 12)))
+                    assessed_on = start + timedelta(weeks=4 * week + course_id, days=rng.randint(0, 4))
+                    score_rows.append((None, student_id, course_id, assessment, round(score, 1),
+                                       assessed_on.isoformat()))
+                total = rng.randint(40, 60)
+                attendance_rows.append((student_id, course_id, rng.randint(total // 2, total), total))
+        connection.executemany("INSERT INTO students VALUES (?, ?, ?, ?, ?)", student_rows)
+        connection.executemany("INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?)", score_rows)
+        connection.executemany("INSERT INTO attendance VALUES (?, ?, ?, ?)", attendance_rows)
+    return f"sqlite:///{os.path.abspath(path)}"
@@ -0,0 +1,140 @@
+"""
+Startup benchmark: import time, time to ready and time to first request.
+
+Each run starts a fresh interpreter that imports ``my_agents.api`` (timed),
+runs the app's lifespan, polls ``/health/ready`` until it answers 200, and
+then sends two chart-producing questions through ``/v1/chat/completions``.
+Runs are made with pre-warming on and off (``STARTUP_PREWARM``) so the cost
+moved out of the first request is visible. The database is the seeded
+SQLite fixture and the LLM the stub backend, as in ``chat_benchmark``.
+
+Usage::
+
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULT_MARKER = "STARTUP_RESULT "
+FIRST_QUESTION = "Visualize the average score per subject"
+SECOND_QUESTION = "Plot attendance for each course"
+
+
+async def probe():
+    """Measure one cold start in this (fresh) process and print the result."""
+    import httpx
+
+    started = time.perf_counter()
+    from my_agents import api
+    import_s = time.perf_counter() - started
+
+    result = {"import_s": round(import_s, 3)}
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.app.router.lifespan_context(api.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup", timeout=None) as client:
+            while (await client.get("/health/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+            result["ready_s"] = round(time.perf_counter() - started, 3)
+            result["components"] = api.startup_state["components"]
+            for key, question in (("first_request_ms", FIRST_QUESTION), ("second_request_ms", SECOND_QUESTION)):
+                sent = time.perf_counter()
+                response = await client.post("/v1/chat/completions", json={
+                    "model": "startup", "messages": [{"role": "user", "content": question}]
+                })
+                result[key] = round((time.perf_counter() - sent) * 1000, 1)
+                result[key.replace("_ms", "_status")] = response.status_code
+            result["first_response_s"] = round(time.perf_counter() - started, 3)
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+
+def run_once(env):
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup_benchmark", "--probe"],
+        cwd=os.path.dirname(HERE), env=env, capture_output=True, text=True, timeout=300
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"Startup probe failed:\n{completed.stderr[-2000:]}")
+
+
+def aggregate(runs):
+    keys = ("import_s", "ready_s", "first_request_ms", "second_request_ms", "first_response_s")
+    return {
+        key: {
+            "median": round(statistics.median(r[key] for r in runs), 3),
+            "min": min(r[key] for r in runs),
+            "max": max(r[key] for r in runs)
+        }
+        for key in keys
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per mode (default 3)")
+    parser.add_argument("--students", type=int, default=500, help="students in the SQLite fixture")
+    parser.add_argument("--output", help="result file (default benchmarks/results/startup-<timestamp>.json)")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        asyncio.run(probe())
+        return
+
+    from benchmarks.fixture import seed_database
+
+    workdir = tempfile.mkdtemp(prefix="startup-benchmark-")
+    base_env = {
+        **os.environ,
+        "DATABASE_URL": seed_database(os.path.join(workdir, "student.db"), args.students),
+        "LLM_BACKEND": "stub",
+        "LLM_REQUESTS_PER_MINUTE": "1000000",
+        "LLM_TOKENS_PER_MINUTE": "1000000000",
+    }
+
+    modes = {}
+    for mode, prewarm in (("prewarm", "true"), ("cold", "false")):
+        runs = []
+        for i in range(args.runs):
+            # A fresh image store per run, so no chart is served from a previous run.
+            env = {**base_env, "STARTUP_PREWARM": prewarm,
+                   "IMAGE_STORE_DIR": os.path.join(workdir, f"images-{mode}-{i}")}
+            runs.append(run_once(env))
+            print(f"{mode} run {i + 1}: {runs[-1]['import_s']}s import, {runs[-1]['ready_s']}s to ready, "
+                  f"first request {runs[-1]['first_request_ms']} ms, second {runs[-1]['second_request_ms']} ms")
+        modes[mode] = {"summary": aggregate(runs), "runs": runs}
+
+    report = {
+        "benchmark": "startup",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"runs": args.runs, "students": args.students},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "modes": modes
+    }
+    output = args.output or os.path.join(
+        HERE, "results", f"startup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    for mode, data in modes.items():
+        s = data["summary"]
+        print(f"{mode:<8} import {s['import_s']['median']}s  ready {s['ready_s']['median']}s  "
+              f"first request {s['first_request_ms']['median']} ms  second {s['second_request_ms']['median']} ms")
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
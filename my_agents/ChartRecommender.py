@@ -0,0 +1,148 @@
+import re
+import os
+import warnings
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TEMPORAL_NAME = re.compile(r"(date|time|year|month|week|day|quarter|semester|term|period)", re.IGNORECASE)
+# Date strings that are dates whatever the column is called: 2024-07-01, 2024/07/01 10:30, 01-07-2024.
+DATE_VALUE = re.compile(r"^\s*(\d{4}[-/]\d{1,2}[-/]\d{1,2}|\d{1,2}[-/]\d{1,2}[-/]\d{4})([ T]\d{1,2}:\d{2}(:\d{2})?)?")
+ID_NAME = re.compile(r"(^id$|_id$|^id_|Id$|_no$|_code$)")
+
+
+@dataclass
+class ColumnProfile:
+    """How a result's columns can be used on a chart."""
+    temporal: List[str] = field(default_factory=list)
+    measures: List[str] = field(default_factory=list)
+    categories: List[str] = field(default_factory=list)
+    cardinality: Dict[str, int] = field(default_factory=dict)
+
+
+def _looks_temporal(series: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    if pd.api.types.is_numeric_dtype(series):
+        # Year/month numbers: only trust the column name, and only for integers.
+        return bool(TEMPORAL_NAME.search(str(series.name))) and pd.api.types.is_integer_dtype(series)
+    # Text is ``object`` before pandas 3 and the ``str`` dtype from pandas 3 on.
+    if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+        sample = series.dropna().head(20)
+        if sample.empty or not all(hasattr(v, "year") or isinstance(v, str) for v in sample):
+            return False
+        if isinstance(sample.iloc[0], str) and not TEMPORAL_NAME.search(str(series.name)) \
+                and not all(isinstance(v, str) and DATE_VALUE.match(v) for v in sample):
+            return False
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(sample, errors="coerce")
+        return bool(parsed.notna().all())
+    return False
+
+
+class ChartRecommender:
+    """
+    Picks up to three charts for a query result from its shape alone.
+
+    Columns are profiled as temporal (datetime values, date-like strings or
+    integer year/month columns), measures (numeric, not identifiers) and
+    categories (text, booleans, low-cardinality values). Then:
+
+    - a temporal column and a measure give a line chart over time
+    - a category with at most ``max_bar_categories`` values and a measure
+      gives a bar chart of the mean, plus a box plot when each category has
+      at least ``min_rows_per_box`` rows
+    - two measures give a scatter plot once there are ``min_scatter_rows`` rows
+    - a measure with enough rows and nothing better gives a histogram
+
+    The output has the same shape as the LLM recommendation it replaces.
+    """
+
+    def __init__(self, max_charts: int = 3, max_bar_categories: int = None,
+                 min_rows_per_box: int = 5, min_scatter_rows: int = 10, min_histogram_rows: int = 10):
+        self.max_charts = max_charts
+        self.max_bar_categories = max_bar_categories or int(os.getenv("CHART_MAX_CATEGORIES", "30"))
+        self.min_rows_per_box = min_rows_per_box
+        self.min_scatter_rows = min_scatter_rows
+        self.min_histogram_rows = min_histogram_rows
+
+    def profile(self, df: pd.DataFrame) -> ColumnProfile:
+        profile = ColumnProfile()
+        for col in df.columns:
+            series = df[col]
+            distinct = int(series.nunique(dropna=True))
+            profile.cardinality[col] = distinct
+            if distinct <= 1:
+                continue
+            if _looks_temporal(series):
+                profile.temporal.append(col)
+            elif pd.api.types.is_bool_dtype(series):
+                profile.categories.append(col)
+            elif pd.api.types.is_numeric_dtype(series):
+                # Identifier columns are numeric but meaningless to aggregate.
+                if ID_NAME.search(str(col)) and distinct == series.notna().sum():
+                    continue
+                profile.measures.append(col)
+            else:
+                profile.categories.append(col)
+        return profile
+
+    def recommend(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Recommend charts for ``df``.
+
+        Parameters:
+        -----------
+        df : pandas.DataFrame
+            Query result to chart
+
+        Returns:
+        --------
+        dict
+            ``{"visualizations": [{"type", "title", "x_axis", "y_axis", "description"}, ...]}``
+        """
+        profile = self.profile(df)
+        rows = len(df)
+        charts = []
+
+        def add(chart_type, x_col, y_col, title, description):
+            if len(charts) < self.max_charts:
+                charts.append({"type": chart_type, "title": title, "x_axis": x_col,
+                               "y_axis": y_col, "description": description})
+
+        measures = profile.measures
+        if profile.temporal and measures:
+            x_col, y_col = profile.temporal[0], measures[0]
+            add("line_chart", x_col, y_col, f"{y_col} over {x_col}",
+                f"How {y_col} changes over {x_col}.")
+
+        bar_categories = [c for c in profile.categories if profile.cardinality[c] <= self.max_bar_categories]
+        if bar_categories and measures:
+            x_col, y_col = bar_categories[0], measures[0]
+            add("bar_chart", x_col, y_col, f"{y_col} by {x_col}",
+                f"Average {y_col} for each {x_col}.")
+            if rows / profile.cardinality[x_col] >= self.min_rows_per_box:
+                add("boxplot", x_col, y_col, f"{y_col} spread by {x_col}",
+                    f"Distribution of {y_col} within each {x_col}.")
+        elif profile.categories and measures and rows <= self.max_bar_categories:
+            # One row per entity (e.g. per student): compare them directly.
+            x_col, y_col = profile.categories[0], measures[0]
+            add("bar_chart", x_col, y_col, f"{y_col} by {x_col}", f"{y_col} for each {x_col}.")
+
+        if len(measures) >= 2 and rows >= self.min_scatter_rows:
+            x_col, y_col = measures[0], measures[1]
+            add("scatter_plot", x_col, y_col, f"{y_col} vs {x_col}",
+                f"Relationship between {x_col} and {y_col}.")
+
+        for col in measures:
+            if rows < self.min_histogram_rows:
+                break
+            add("histogram", col, None, f"Distribution of {col}", f"How {col} values are distributed.")
+
+        logger.info(f"Recommended charts: {[(c['type'], c['x_axis'], c['y_axis']) for c in charts]}")
+        return {"visualizations": charts}
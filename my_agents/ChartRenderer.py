@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+CHART_TYPES = ("bar_chart", "line_chart", "scatter_plot", "histogram", "boxplot")
+
+# Populated in each worker by _init_worker so the import cost is paid once per process.
+_sns = None
+_Figure = None
+
+
+def _init_worker():
+    """Pre-import matplotlib (Agg backend) and seaborn in a renderer process."""
+    global _sns, _Figure
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    import seaborn as sns
+    _Figure = Figure
+    _sns = sns
+
+
+def draw_chart(ax, df, spec):
+    """
+    Draw one chart spec onto ``ax``.
+
+    ``df`` is the frame returned by ``DataReducer.reduce``; ``spec["reduction"]``
+    says whether it holds raw rows or pre-aggregated values. Seaborn's
+    estimators are never asked for confidence intervals.
+    """
+    sns = _sns
+    chart_type, x_col, y_col = spec["type"], spec["x_axis"], spec.get("y_axis")
+    method = spec.get("reduction", {}).get("method", "none")
+    if chart_type == "bar_chart":
+        sns.barplot(x=df[x_col], y=df[y_col], errorbar=None, ax=ax)
+    elif chart_type == "line_chart":
+        sns.lineplot(x=df[x_col], y=df[y_col], errorbar=None, ax=ax)
+    elif chart_type == "scatter_plot" and method == "hexbin":
+        collection = ax.hexbin(df[x_col], df[y_col], C=df["count"], reduce_C_function=sum,
+                               gridsize=30, mincnt=1, cmap="viridis")
+        ax.figure.colorbar(collection, ax=ax, label="Rows")
+    elif chart_type == "scatter_plot":
+        sns.scatterplot(x=df[x_col], y=df[y_col], ax=ax)
+    elif chart_type == "histogram" and method == "bins":
+        edges = list(df["left"]) + [df["right"].iloc[-1]] if len(df) else [0, 1]
+        ax.hist(df["left"], bins=edges, weights=df["count"])
+    elif chart_type == "histogram" and method == "value_counts":
+        ax.bar(df[x_col].astype(str), df["count"])
+    elif chart_type == "histogram":
+        sns.histplot(df[x_col], ax=ax)
+    elif chart_type == "boxplot" and method == "box_stats":
+        stats = [{**row, "label": str(row[x_col])} for row in df.to_dict(orient="records")]
+        ax.bxp(stats, showfliers=False)
+    elif chart_type == "boxplot":
+        sns.boxplot(x=df[x_col], y=df[y_col], ax=ax)
+    else:
+        raise ValueError(f"Unsupported visualization type: {chart_type}")
+
+    ax.set_xlabel(x_col)
+    ax.set_ylabel("Count" if chart_type == "histogram" else y_col)
+    if chart_type in ("bar_chart", "line_chart", "boxplot") and len(df) > 10:
+        ax.tick_params(axis="x", labelrotation=45)
+
+
+def render_chart(df, spec):
+    """
+    Render ``spec`` to PNG bytes in a worker process.
+
+    Uses a standalone ``Figure`` (no pyplot global state), so renders in
+    different processes or threads never share a figure.
+
+    Returns:
+    --------
+    tuple
+        (png_bytes, render_ms)
+    """
+    if _Figure is None:
+        _init_worker()
+    started = time.perf_counter()
+    fig = _Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    draw_chart(ax, df, spec)
+    ax.set_title(spec.get("title", "Visualization"))
+    fig.tight_layout()
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue(), (time.perf_counter() - started) * 1000
+
+
+def _worker_main(connection):
+    """
+    Renderer process loop: report ready, then answer ``(frame, spec)`` tasks
+    with ``("ok", (png_bytes, render_ms))`` or ``("error", message)`` until
+    the pipe is closed.
+    """
+    _init_worker()
+    connection.send(("ready", os.getpid()))
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        try:
+            connection.send(("ok", render_chart(*task)))
+        except Exception as e:
+            connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class RenderTimeoutError(Exception):
+    """Raised for a chart whose render ran past the renderer's timeout."""
+
+
+class _WorkerSlot:
+    """
+    One renderer process and the pipe to it. The process is spawned on
+    first use and replaced after it is killed or dies.
+    """
+
+    def __init__(self, context, start_timeout: float):
+        self.context = context
+        self.start_timeout = start_timeout
+        self.process = None
+        self.connection = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self.process is not None and self.process.is_alive():
+                return
+            parent, child = self.context.Pipe()
+            process = self.context.Process(target=_worker_main, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            if not parent.poll(self.start_timeout):
+                process.terminate()
+                parent.close()
+                raise RuntimeError(f"Renderer process did not start within {self.start_timeout:.0f}s")
+            parent.recv()
+            self.process, self.connection = process, parent
+
+    def stop(self):
+        with self._lock:
+            process, connection, self.process, self.connection = self.process, self.connection, None, None
+        if connection is not None:
+            connection.close()
+        if process is not None:
+            process.terminate()
+            process.join(1)
+
+
+class ChartRenderer:
+    """
+    Renders charts in a persistent set of worker processes.
+
+    Workers are spawned once with matplotlib and seaborn already imported.
+    Each chart is its own task, so the up-to-three charts of one answer render
+    in parallel. Charts arrive as ``(frame, spec)`` pairs already passed
+    through ``DataReducer.reduce``, so workers only receive what the chart can
+    show. ``stats`` reports render times and the current queue depth.
+
+    Every worker is fed by its own dispatcher thread. The timeout starts when
+    a worker takes the chart, not when it is queued, and a chart that runs
+    past it gets only its own worker terminated and replaced; renders of
+    other requests in the other workers carry on.
+    """
+
+    def __init__(self, max_workers=None, timeout=None):
+        self.max_workers = max_workers or int(os.getenv("CHART_RENDER_WORKERS", "3"))
+        self.timeout = timeout or float(os.getenv("CHART_RENDER_TIMEOUT", "15"))
+        self.start_timeout = float(os.getenv("CHART_RENDER_START_TIMEOUT", "60"))
+        # spawn keeps workers independent of the server's threads and event loop.
+        context = multiprocessing.get_context("spawn")
+        self._slots = [_WorkerSlot(context, self.start_timeout) for _ in range(self.max_workers)]
+        self._tasks = queue.Queue()
+        self._dispatchers = []
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._render_ms = deque(maxlen=500)
+        self.counters = {"rendered": 0, "failed": 0, "timed_out": 0, "restarted": 0}
+
+    def _start_dispatchers(self):
+        with self._lock:
+            if self._dispatchers:
+                return
+            self._dispatchers = [
+                threading.Thread(target=self._dispatch, args=(slot,), name=f"chart-render-{i}", daemon=True)
+                for i, slot in enumerate(self._slots)
+            ]
+            for thread in self._dispatchers:
+                thread.start()
+
+    def warm_up(self, workers: int = None):
+        """Start ``workers`` (default: all) worker processes now instead of on the first charts."""
+        slots = self._slots[:min(workers or self.max_workers, self.max_workers)]
+        threads = [threading.Thread(target=slot.ensure_started) for slot in slots]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._start_dispatchers()
+
+    def _dispatch(self, slot: _WorkerSlot):
+        """Feed ``slot`` one chart at a time, replacing its process when a render hangs or crashes."""
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            frame, spec, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                slot.ensure_started()
+                slot.connection.send((frame, spec))
+                if not slot.connection.poll(self.timeout):
+                    slot.stop()
+                    self._count("restarted")
+                    raise RenderTimeoutError(f"Rendering timed out after {self.timeout:.0f}s")
+                status, value = slot.connection.recv()
+            except (EOFError, OSError) as e:
+                slot.stop()
+                self._count("restarted")
+                future.set_exception(RuntimeError(f"Renderer process exited: {e or type(e).__name__}"))
+                continue
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if status == "ok":
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _submit(self, frame, spec) -> Future:
+        self._start_dispatchers()
+        future = Future()
+        with self._lock:
+            self._pending += 1
+        future.add_done_callback(self._on_done)
+        self._tasks.put((frame, spec, future))
+        return future
+
+    def _on_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _record(self, spec, outcome):
+        """Turn a finished future's outcome into ``(spec, png_bytes or None, error or None)``."""
+        png, error = None, None
+        with self._lock:
+            if isinstance(outcome, RenderTimeoutError):
+                self.counters["timed_out"] += 1
+                error = str(outcome)
+            elif isinstance(outcome, BaseException):
+                self.counters["failed"] += 1
+                error = str(outcome)
+            else:
+                png, render_ms = outcome
+                self.counters["rendered"] += 1
+                self._render_ms.append(render_ms)
+        if error:
+            logger.error(f"Error generating visualization '{spec.get('title')}': {error}")
+        return spec, png, error
+
+    def render_many(self, charts):
+        """Render ``(frame, spec)`` pairs in parallel, blocking; returns ``[(spec, png, error), ...]``."""
+        futures = [(spec, self._submit(frame, spec)) for frame, spec in charts]
+        outcomes = []
+        for _, future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+        return [self._record(spec, outcome) for (spec, _), outcome in zip(futures, outcomes)]
+
+    async def arender_many(self, charts):
+        """Awaitable ``render_many`` that never blocks the event loop."""
+        futures = [(spec, self._submit(frame, spec)) for frame, spec in charts]
+        # Cancelling the request cancels the wrapped futures, so its queued charts are never rendered.
+        outcomes = await asyncio.gather(*(asyncio.wrap_future(future) for _, future in futures),
+                                        return_exceptions=True)
+        return [self._record(spec, outcome) for (spec, _), outcome in zip(futures, outcomes)]
+
+    def stats(self):
+        with self._lock:
+            times = sorted(self._render_ms)
+            queue_depth = self._pending
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "queue_depth": queue_depth,
+            "workers": self.max_workers,
+            "avg_render_ms": round(sum(times) / len(times), 1) if times else 0.0,
+            "p95_render_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 1) if times else 0.0
+        }
+
+    def shutdown(self):
+        with self._lock:
+            dispatchers, self._dispatchers = self._dispatchers, []
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                task[2].cancel()
+        for _ in dispatchers:
+            self._tasks.put(None)
+        for slot in self._slots:
+            slot.stop()
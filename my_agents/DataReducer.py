@@ -0,0 +1,176 @@
+import os
+import logging
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of ``threshold`` points that keep the visual shape of
+    the series: the first and last points plus, for each bucket in between,
+    the point forming the largest triangle with the previous pick and the
+    average of the next bucket. ``x`` must be sorted.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+
+class DataReducer:
+    """
+    Shrinks a chart's data to what the image can actually show before it is drawn.
+
+    Line charts are averaged per x value and downsampled with LTTB, scatter
+    plots above ``max_scatter_points`` become 2-D bin counts drawn as a
+    hexbin, bar charts are pre-aggregated to group means, box plots to
+    per-group quartiles, and histograms to bin counts. The reduced frame is
+    what gets sent to the renderer (or to the client), so render cost stays
+    roughly flat as the row count grows.
+    """
+
+    def __init__(self, max_points=None, max_scatter_points=None, max_categories=None,
+                 bins=None):
+        self.max_points = max_points or int(os.getenv("CHART_MAX_POINTS", "1000"))
+        self.max_scatter_points = max_scatter_points or int(os.getenv("CHART_MAX_SCATTER_POINTS", "5000"))
+        self.max_categories = max_categories or int(os.getenv("CHART_MAX_CATEGORIES", "30"))
+        self.bins = bins or int(os.getenv("CHART_BINS", "50"))
+
+    def reduce(self, df: pd.DataFrame, spec: Dict[str, Any]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        Reduce ``df`` for ``spec``.
+
+        Parameters:
+        -----------
+        df : pandas.DataFrame
+            Full query result
+        spec : dict
+            Chart spec with type, x_axis and (except for histograms) y_axis
+
+        Returns:
+        --------
+        tuple
+            (reduced_frame, spec) where ``spec`` gains a ``reduction`` entry
+            naming the method and the row counts before and after
+        """
+        chart_type = spec["type"]
+        x_col, y_col = spec["x_axis"], spec.get("y_axis")
+        columns = list(dict.fromkeys(c for c in (x_col, y_col) if c))
+        frame = df[columns].dropna()
+
+        if chart_type == "line_chart":
+            reduced, method = self.reduce_line(frame, x_col, y_col)
+        elif chart_type == "scatter_plot":
+            reduced, method = self.reduce_scatter(frame, x_col, y_col)
+        elif chart_type == "bar_chart":
+            reduced, method = self.group_means(frame, x_col, y_col), "group_mean"
+        elif chart_type == "boxplot":
+            reduced, method = self.group_box_stats(frame, x_col, y_col), "box_stats"
+        elif chart_type == "histogram":
+            reduced, method = self.reduce_histogram(frame, x_col)
+        else:
+            raise ValueError(f"Unsupported visualization type: {chart_type}")
+
+        reduction = {"method": method, "rows_in": len(df), "rows_out": len(reduced)}
+        if method != "none":
+            logger.info(f"Reduced '{spec.get('title')}' ({chart_type}): {reduction}")
+        return reduced.reset_index(drop=True), {**spec, "reduction": reduction}
+
+    def reduce_line(self, frame, x_col, y_col):
+        y = pd.to_numeric(frame[y_col], errors="coerce")
+        frame = frame.assign(**{y_col: y}).dropna()
+        method = "none"
+        if frame[x_col].duplicated().any():
+            # Several y per x: plot the mean rather than have seaborn bootstrap a CI band.
+            frame = frame.groupby(x_col, sort=True, as_index=False)[y_col].mean()
+            method = "x_mean"
+        else:
+            frame = frame.sort_values(x_col, kind="stable")
+        if len(frame) > self.max_points:
+            x = frame[x_col]
+            if pd.api.types.is_datetime64_any_dtype(x):
+                positions = x.astype("int64").to_numpy(dtype=float)
+            elif pd.api.types.is_numeric_dtype(x):
+                positions = x.to_numpy(dtype=float)
+            else:
+                positions = np.arange(len(frame), dtype=float)
+            keep = lttb_indices(positions, frame[y_col].to_numpy(dtype=float), self.max_points)
+            frame = frame.iloc[keep]
+            method = "lttb"
+        return frame, method
+
+    def reduce_scatter(self, frame, x_col, y_col):
+        if len(frame) <= self.max_scatter_points:
+            return frame, "none"
+        x = pd.to_numeric(frame[x_col], errors="coerce")
+        y = pd.to_numeric(frame[y_col], errors="coerce")
+        valid = x.notna() & y.notna()
+        if not valid.any():
+            return frame.sample(self.max_scatter_points, random_state=0), "sample"
+        # Bin finer than the renderer's hex grid so every hexagon covers several bin centres.
+        counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=self.bins * 2)
+        xi, yi = np.nonzero(counts)
+        binned = pd.DataFrame({
+            x_col: (x_edges[xi] + x_edges[xi + 1]) / 2,
+            y_col: (y_edges[yi] + y_edges[yi + 1]) / 2,
+            "count": counts[xi, yi].astype(int)
+        })
+        return binned, "hexbin"
+
+    def top_groups(self, frame, x_col):
+        """Limit a categorical x axis to its ``max_categories`` most frequent values."""
+        if frame[x_col].nunique() <= self.max_categories:
+            return frame
+        keep = frame[x_col].value_counts().index[:self.max_categories]
+        return frame[frame[x_col].isin(keep)]
+
+    def group_means(self, frame, x_col, y_col):
+        frame = frame.assign(**{y_col: pd.to_numeric(frame[y_col], errors="coerce")}).dropna()
+        frame = self.top_groups(frame, x_col)
+        return frame.groupby(x_col, sort=True, as_index=False)[y_col].mean()
+
+    def group_box_stats(self, frame, x_col, y_col):
+        """Per-group quartiles and 1.5*IQR whiskers, in the form ``Axes.bxp`` expects."""
+        frame = frame.assign(**{y_col: pd.to_numeric(frame[y_col], errors="coerce")}).dropna()
+        frame = self.top_groups(frame, x_col)
+        groups = frame.groupby(x_col, sort=True)[y_col]
+        stats = groups.quantile([0.25, 0.5, 0.75]).unstack()
+        stats.columns = ["q1", "med", "q3"]
+        iqr = stats["q3"] - stats["q1"]
+        low = frame[x_col].map(stats["q1"] - 1.5 * iqr)
+        high = frame[x_col].map(stats["q3"] + 1.5 * iqr)
+        inside = frame[(frame[y_col] >= low) & (frame[y_col] <= high)].groupby(x_col)[y_col]
+        stats["whislo"] = inside.min()
+        stats["whishi"] = inside.max()
+        stats["count"] = groups.size()
+        return stats.reset_index()
+
+    def reduce_histogram(self, frame, x_col):
+        values = frame[x_col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            counts, edges = np.histogram(values.to_numpy(dtype=float), bins=self.bins)
+            return pd.DataFrame({"left": edges[:-1], "right": edges[1:], "count": counts}), "bins"
+        counts = values.astype(str).value_counts().head(self.max_categories)
+        return pd.DataFrame({x_col: counts.index, "count": counts.to_numpy()}), "value_counts"
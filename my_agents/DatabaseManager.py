@@ -1,64 +1,467 @@
 import os
-from sqlalchemy import create_engine, text
-from langchain_community.utilities import SQLDatabase
+import re
+import asyncio
+import logging
+from dataclasses import dataclass, replace
+from typing import Optional
+from sqlalchemy import text
+from my_agents.DatabasePool import DatabasePool, PoolSettings, ReplicaSet, async_url, env_flag, is_connection_error
+from my_agents.SchemaCache import SchemaCache
+from my_agents.SQLValidator import SQLValidator, UnsafeQueryError, strip_trailing_comments
+from my_agents.QueryGovernor import QueryGovernor, QueryHandle, QueryRejectedError
+from my_agents.ResultCache import ResultCache, is_cacheable
+from my_agents.Metrics import timed
+
+logger = logging.getLogger(__name__)
+
+TABLE_VERSIONS_QUERY = (
+    "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+)
+# MySQL 8 caches UPDATE_TIME for a day unless the session disables the statistics cache.
+STATS_EXPIRY_OFF = "SET SESSION information_schema_stats_expiry = 0"
+
+# Top-level LIMIT at the end of a query: ``LIMIT n``, ``LIMIT offset, n`` or ``LIMIT n OFFSET m``.
+LIMIT_PATTERN = re.compile(
+    r"\blimit\s+(?P<first>\d+)(?:\s*(?P<separator>,|offset)\s*(?P<second>\d+))?\s*$", re.IGNORECASE
+)
+
+
+@dataclass
+class QueryResult:
+    """Rows fetched by ``execute_bounded_query`` and whether they were capped."""
+    columns: list
+    rows: list
+    truncated: bool = False
+    cached: bool = False
+
+
+def inject_limit(query: str, limit: int) -> str:
+    """
+    Cap a SELECT at ``limit`` rows in its SQL.
+
+    ``LIMIT limit`` is appended when the query has no top-level LIMIT, and a
+    larger LIMIT of its own is lowered to ``limit``. The cap has to be in the
+    statement: the MySQL drivers buffer the whole result set client side, so
+    the fetch loop alone does not bound what the server sends. Trailing
+    comments are dropped first so the LIMIT cannot end up inside one.
+    """
+    stripped = strip_trailing_comments(strip_trailing_comments(query).rstrip(";"))
+    if not stripped.lower().startswith(("select", "with")):
+        return stripped
+    match = LIMIT_PATTERN.search(stripped)
+    if match is None:
+        return f"{stripped} LIMIT {limit}"
+    if match.group("separator") == ",":
+        offset, count = match.group("first"), int(match.group("second"))
+        bounded = f"LIMIT {offset}, {min(count, limit)}"
+    else:
+        bounded = f"LIMIT {min(int(match.group('first')), limit)}"
+        if match.group("separator"):
+            bounded += f" OFFSET {match.group('second')}"
+    return stripped[:match.start()] + bounded
+
+
+def estimate_row_bytes(row) -> int:
+    """Cheap size estimate of one fetched row."""
+    return sum(len(v) if isinstance(v, (str, bytes)) else 8 for v in row)
+
 
 class DatabaseManager:
     def __init__(self):
-        """Initialize database manager with environment variables."""
-        self.db_url = "mysql+mysqlconnector://root:@127.0.0.2:3306/Student"
+        """
+        Initialize database manager with environment variables.
+
+        ``DATABASE_URL`` is the primary. ``DATABASE_REPLICA_URLS`` (comma
+        separated) lists read replicas that LLM-generated queries are sent to
+        round-robin; schema loading, table version probes and query kills stay
+        on the primary. Pools are sized by ``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``,
+        ``DB_POOL_TIMEOUT``, ``DB_POOL_RECYCLE`` and ``DB_POOL_PRE_PING``.
+        ``DATABASE_ASYNC`` runs those queries on an async driver instead of a
+        worker thread (``aexecute_bounded_query``).
+        """
+        self.db_url = os.getenv("DATABASE_URL", "mysql+mysqlconnector://root:@127.0.0.2:3306/Student")
 
         if not self.db_url:
             raise ValueError("DATABASE_URL environment variable not set.")
 
+        self.replica_urls = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+        self.pool_settings = PoolSettings.from_env()
+        self.async_enabled = env_flag("DATABASE_ASYNC", False)
+        self.replica_retry_interval = float(os.getenv("DB_REPLICA_RETRY_INTERVAL", "10"))
+
         self.engine = None
-        self.db = None
+        self.primary = None
+        self.replicas = ReplicaSet([])
+        self.schema_cache = None
+        self._validator = None
+        self._validator_fingerprint = None
+
+        # Caps applied to LLM-generated queries by execute_bounded_query.
+        self.max_rows = int(os.getenv("QUERY_MAX_ROWS", "1000"))
+        self.max_bytes = int(os.getenv("QUERY_MAX_BYTES", str(5 * 1024 * 1024)))
+        self.fetch_batch_size = int(os.getenv("QUERY_FETCH_BATCH_SIZE", "500"))
+        self.governor = QueryGovernor(
+            max_estimated_rows=int(os.getenv("QUERY_MAX_ESTIMATED_ROWS", "5000000")),
+            timeout_ms=int(os.getenv("QUERY_TIMEOUT_MS", "10000"))
+        )
+        # Any query returning (table_name, version) rows can replace the UPDATE_TIME probe,
+        # e.g. a trigger-maintained version table where UPDATE_TIME is unreliable.
+        self.table_versions_query = os.getenv("RESULT_CACHE_VERSION_QUERY", TABLE_VERSIONS_QUERY)
+        self._stats_expiry_supported = True
+        self.result_cache = ResultCache(
+            self.probe_table_versions,
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            probe_interval=float(os.getenv("RESULT_CACHE_PROBE_INTERVAL", "2.0"))
+        )
+
+    def _async_url(self, url: str, index: Optional[int] = None) -> Optional[str]:
+        if not self.async_enabled:
+            return None
+        explicit = os.getenv("DATABASE_ASYNC_URL") if index is None else None
+        return explicit or async_url(url)
 
     def connect_database(self):
-        """Connect to the database using SQLAlchemy."""
+        """Create the primary and replica pools (engines connect lazily)."""
         if self.engine is None:
             try:
-                self.engine = create_engine(self.db_url, pool_recycle=3600)
-                self.db = SQLDatabase(self.engine)
-                return self.db
+                primary = DatabasePool("primary", self.db_url, self.pool_settings, self._async_url(self.db_url))
+                self.replicas = ReplicaSet(
+                    [DatabasePool(f"replica-{i + 1}", url, self.pool_settings, self._async_url(url, i))
+                     for i, url in enumerate(self.replica_urls)],
+                    retry_interval=self.replica_retry_interval
+                )
+                self.primary = primary
+                self.schema_cache = SchemaCache(primary.engine)
+                # Published last: other threads treat a set engine as fully connected.
+                self.engine = primary.engine
             except Exception as e:
                 print(f"Database connection error: {e}")
                 raise
-        return self.db  # Return existing database connection
+        return self.engine
+
+    def pools(self):
+        if self.engine is None:
+            self.connect_database()
+        return [self.primary] + self.replicas.replicas
 
+    def warm_up(self, connections: int = 2):
+        """Open ``connections`` pooled connections per database ahead of the first query."""
+        for pool in self.pools():
+            try:
+                pool.warm_up(connections)
+            except Exception as e:
+                if pool is self.primary:
+                    raise
+                pool.mark_down(e)
+
+    def ping(self):
+        """Round trip to the primary; raises if it cannot be reached."""
+        if self.engine is None:
+            self.connect_database()
+        with self.primary.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    def check_replicas(self):
+        """Ping every replica, marking unreachable ones unhealthy and recovered ones healthy."""
+        if self.engine is None:
+            self.connect_database()
+        return self.replicas.check()
+
+    def pool_stats(self):
+        """Checkout occupancy and health of every pool, keyed by pool label."""
+        stats = {}
+        for pool in self.pools():
+            stats.update(pool.stats())
+        return stats
+
+    def read_pools(self):
+        """
+        Where to run an LLM-generated read: the next healthy replica, then the
+        primary as a fallback if that replica cannot be reached. Replicas may
+        lag the primary, so a result cached right after a write can briefly be
+        older than the table versions it is cached under.
+        """
+        if self.engine is None:
+            self.connect_database()
+        replica = self.replicas.choose()
+        return [replica, self.primary] if replica is not None else [self.primary]
+
+    def _should_fail_over(self, pool, error: Exception) -> bool:
+        """Mark ``pool`` down and return True if ``error`` lost a replica, so the read moves to the primary."""
+        if pool is self.primary or not (is_connection_error(error) or not pool.healthy):
+            return False
+        pool.mark_down(error)
+        logger.warning(f"Read on {pool.name} failed, retrying on the primary: {error}")
+        return True
+
+    @timed("DatabaseManager.get_database_schema")
     def get_database_schema(self):
         """Retrieve database schema with table names and respective column names."""
+        schema = self.get_schema_details()
+        if isinstance(schema, str):
+            return schema
+        return {table: [col["name"] for col in columns] for table, columns in schema.items()}
+
+    @timed("DatabaseManager.get_schema_details")
+    def get_schema_details(self):
+        """Retrieve the cached schema including column types and keys."""
         if self.engine is None:
             self.connect_database()
 
         try:
-            with self.engine.connect() as connection:
-                tables_query = text("SHOW TABLES")
-                result = connection.execute(tables_query)
-                tables = [row[0] for row in result.fetchall()]
-
-                schema = {}
-                for table in tables:
-                    columns_query = text(f"SHOW COLUMNS FROM {table}")
-                    columns_result = connection.execute(columns_query)
-                    schema[table] = [col[0] for col in columns_result.fetchall()]
-
-                return schema  # Returns a dictionary {table_name: [columns]}
+            return self.schema_cache.get()  # Returns {table_name: [{name, type, key, comment}]}
         except Exception as e:
             print(f"Error fetching database schema: {e}")
             return "Error fetching database schema."
 
-    def execute_read_query(self, query):
-        """Execute read-only queries using the main database connection."""
+    def get_schema_fingerprint(self):
+        """Return the fingerprint of the cached schema (table, column and type names)."""
+        if self.engine is None:
+            self.connect_database()
+        return self.schema_cache.fingerprint
+
+    def get_validator(self):
+        """Return the SQL validator for the current schema, rebuilt when the fingerprint moves."""
+        schema = self.get_schema_details()
+        if not isinstance(schema, dict):
+            return SQLValidator()
+        fingerprint = self.schema_cache.fingerprint
+        if self._validator is None or fingerprint != self._validator_fingerprint:
+            self._validator = SQLValidator(schema)
+            self._validator_fingerprint = fingerprint
+        return self._validator
+
+    def validate_query(self, query, require_limit=True):
+        """
+        Check ``query`` with the local SQL validator against the cached schema.
+
+        Raises:
+        -------
+        UnsafeQueryError
+            If the query is not a single bounded, read-only SELECT over known tables
+        """
+        validation = self.get_validator().validate(query, require_limit=require_limit)
+        if not validation["is_valid"]:
+            raise UnsafeQueryError(validation)
+        return validation
+
+    def probe_table_versions(self):
+        """
+        Return ``{table_name: version}`` used to invalidate cached results.
+
+        With the default ``UPDATE_TIME`` probe, MySQL 8 would otherwise answer
+        from its statistics cache (``information_schema_stats_expiry``, one day
+        by default), so the probe session turns that cache off. ``UPDATE_TIME``
+        has one-second resolution: a write landing in the same second as the
+        probe that cached a result leaves the version unchanged, so results can
+        be served stale until the table's next write in a later second. Set
+        ``RESULT_CACHE_VERSION_QUERY`` to a trigger-maintained version table
+        where that window matters.
+        """
+        if self.engine is None:
+            self.connect_database()
+        default_probe = self.table_versions_query == TABLE_VERSIONS_QUERY
+        if self.engine.dialect.name != "mysql" and default_probe:
+            return {}
+        with self.engine.connect() as connection:
+            if default_probe and self._stats_expiry_supported:
+                try:
+                    connection.execute(text(STATS_EXPIRY_OFF))
+                except Exception as e:
+                    # MySQL 5.7 and MariaDB have no statistics cache to turn off.
+                    print(f"Could not disable information_schema stats caching: {e}")
+                    self._stats_expiry_supported = False
+                    connection.rollback()
+            return {row[0]: row[1] for row in connection.execute(text(self.table_versions_query))}
+
+    def governed(self, connection, query, handle: Optional[QueryHandle] = None) -> str:
+        """
+        Check ``query`` with the query governor and return the statement to run on ``connection``.
+
+        On MySQL the plan is checked with EXPLAIN, the statement gets a
+        ``MAX_EXECUTION_TIME`` hint, and the connection id is recorded on
+        ``handle`` so ``cancel_query`` can kill it.
+        """
+        if not self.governor.applies_to(connection):
+            return query
+        self.governor.check(connection, query)
+        return self.governor.prepare(connection, query, handle)
+
+    def cancel_query(self, handle: QueryHandle):
+        """Kill the server-side query tracked by ``handle`` (e.g. on client disconnect)."""
+        if self.engine is not None:
+            pool = next((p for p in self.pools() if p.name == handle.pool), self.primary)
+            self.governor.cancel(pool.engine, handle)
+
+    @timed("DatabaseManager.execute_read_query")
+    def execute_read_query(self, query, handle: Optional[QueryHandle] = None):
+        """Execute read-only queries on a replica, or the primary when none is available."""
         if self.engine is None:
             self.connect_database()
 
+        self.validate_query(query, require_limit=False)
         try:
-            with self.engine.connect() as connection:
-                result = connection.execute(text(query))
-                return result.keys(), result.fetchall()
+            for pool in self.read_pools():
+                try:
+                    if handle is not None:
+                        handle.pool = pool.name
+                    with pool.connect() as connection:
+                        result = connection.execute(text(self.governed(connection, query, handle)))
+                        pool.count_read()
+                        return result.keys(), result.fetchall()
+                except QueryRejectedError:
+                    raise
+                except Exception as e:
+                    if not self._should_fail_over(pool, e):
+                        raise
+        except QueryRejectedError:
+            raise
         except Exception as e:
-            print(f"Error executing query: {e}")
+            self._query_failed(e, handle)
+
+    def fetch_bounded(self, connection, bounded_query, max_rows: int, max_bytes: int,
+                      handle: Optional[QueryHandle] = None):
+        """
+        Run ``bounded_query`` on ``connection`` under the governor and fetch it in
+        ``fetchmany`` batches until ``max_rows`` rows or ``max_bytes`` (estimated).
+
+        Takes a sync connection, so it also runs inside ``AsyncConnection.run_sync``.
+        """
+        result = connection.execute(text(self.governed(connection, bounded_query, handle)))
+        columns = list(result.keys())
+        rows = []
+        size = 0
+        truncated = False
+        while not truncated:
+            batch = result.fetchmany(self.fetch_batch_size)
+            if not batch:
+                break
+            for row in batch:
+                if len(rows) >= max_rows or size >= max_bytes:
+                    truncated = True
+                    break
+                rows.append(tuple(row))
+                size += estimate_row_bytes(row)
+        result.close()
+        return QueryResult(columns, rows, truncated)
+
+    def prepare_bounded_query(self, query, max_rows: Optional[int], max_bytes: Optional[int], use_cache: bool):
+        """
+        Bound and validate ``query`` and look it up in the result cache.
+
+        Returns:
+        --------
+        tuple
+            ``(bounded_query, max_rows, max_bytes, cache_key, cached_result)``;
+            ``cache_key`` is None when the result must not be cached
+        """
+        if self.engine is None:
+            self.connect_database()
+
+        max_rows = max_rows or self.max_rows
+        max_bytes = max_bytes or self.max_bytes
+        bounded_query = inject_limit(query, max_rows + 1)
+        self.validate_query(bounded_query)
+
+        cache_key = None
+        if use_cache and is_cacheable(bounded_query):
+            cache_key = f"/* max_rows={max_rows} max_bytes={max_bytes} */ {bounded_query}"
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return bounded_query, max_rows, max_bytes, cache_key, replace(cached, cached=True)
+        return bounded_query, max_rows, max_bytes, cache_key, None
+
+    def _store_result(self, cache_key, bounded_query, query_result: QueryResult):
+        if cache_key is not None:
+            self.result_cache.put(cache_key, self.get_validator().referenced_tables(bounded_query), query_result)
+        return query_result
+
+    def _query_failed(self, error: Exception, handle: Optional[QueryHandle]):
+        print(f"Error executing query: {error}")
+        translated = self.governor.translate_error(error, handle)
+        if translated is error:
+            raise error
+        raise translated from error
+
+    @timed("DatabaseManager.execute_bounded_query")
+    def execute_bounded_query(self, query, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                              handle: Optional[QueryHandle] = None, use_cache: bool = True):
+        """
+        Execute a read-only query with bounded fetching.
+
+        The query is capped at ``LIMIT max_rows + 1`` (see ``inject_limit``),
+        rows are pulled in ``fetchmany`` batches, and fetching stops at
+        ``max_rows`` rows or ``max_bytes`` (estimated), whichever comes first. Execution goes
+        through the query governor (see ``governed``) on a replica when any
+        is configured and healthy. Results are served from and stored in
+        ``result_cache`` unless ``use_cache`` is off.
+
+        Returns:
+        --------
+        QueryResult
+            Column names, fetched rows and a ``truncated`` flag
+        """
+        bounded_query, max_rows, max_bytes, cache_key, cached = \
+            self.prepare_bounded_query(query, max_rows, max_bytes, use_cache)
+        if cached is not None:
+            return cached
+
+        try:
+            for pool in self.read_pools():
+                try:
+                    if handle is not None:
+                        handle.pool = pool.name
+                    with pool.connect() as connection:
+                        query_result = self.fetch_bounded(connection, bounded_query, max_rows, max_bytes, handle)
+                    pool.count_read()
+                    return self._store_result(cache_key, bounded_query, query_result)
+                except QueryRejectedError:
+                    raise
+                except Exception as e:
+                    if not self._should_fail_over(pool, e):
+                        raise
+        except QueryRejectedError:
             raise
+        except Exception as e:
+            self._query_failed(e, handle)
+
+    @timed("DatabaseManager.aexecute_bounded_query")
+    async def aexecute_bounded_query(self, query, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                                     handle: Optional[QueryHandle] = None, use_cache: bool = True):
+        """
+        ``execute_bounded_query`` on the async driver (``DATABASE_ASYNC``).
+
+        Validation and the result cache lookup, which may probe table
+        versions, still run in a worker thread; the query itself runs on an
+        async connection, so a slow query holds no thread.
+        """
+        bounded_query, max_rows, max_bytes, cache_key, cached = await asyncio.to_thread(
+            self.prepare_bounded_query, query, max_rows, max_bytes, use_cache
+        )
+        if cached is not None:
+            return cached
+
+        try:
+            for pool in self.read_pools():
+                try:
+                    if handle is not None:
+                        handle.pool = pool.name
+                    async with pool.aconnect() as connection:
+                        query_result = await connection.run_sync(
+                            self.fetch_bounded, bounded_query, max_rows, max_bytes, handle
+                        )
+                    pool.count_read()
+                    return self._store_result(cache_key, bounded_query, query_result)
+                except QueryRejectedError:
+                    raise
+                except Exception as e:
+                    if not self._should_fail_over(pool, e):
+                        raise
+        except QueryRejectedError:
+            raise
+        except Exception as e:
+            self._query_failed(e, handle)
+
 def format_result_as_table(result):
     """Format query result as a table."""
     if not result:
@@ -0,0 +1,241 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from my_agents.Metrics import DB_CHECKOUT_WAIT_SECONDS, DB_CHECKOUT_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+# Async DBAPI used for each backend when DATABASE_ASYNC is on and the URL names a sync driver.
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, "true" if default else "false").lower() in ("1", "true", "yes")
+
+
+def async_url(url: str) -> str:
+    """Swap the driver of ``url`` for its async counterpart (``mysql+mysqlconnector`` -> ``mysql+aiomysql``)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {backend}; set DATABASE_ASYNC_URL")
+    if parsed.get_driver_name() == ASYNC_DRIVERS[backend]:
+        return url
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True when SQLAlchemy saw ``error`` as a lost connection rather than a failed query."""
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+@dataclass
+class PoolSettings:
+    """Connection pool options applied to the primary and every replica."""
+    size: int = 5
+    max_overflow: int = 10
+    timeout: float = 30.0
+    recycle: int = 3600
+    pre_ping: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        return cls(
+            size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            recycle=int(os.getenv("DB_POOL_RECYCLE", "3600")),
+            pre_ping=env_flag("DB_POOL_PRE_PING", True)
+        )
+
+    @property
+    def capacity(self) -> int:
+        return self.size + self.max_overflow
+
+    def engine_options(self, url: str) -> dict:
+        options = {"pool_pre_ping": self.pre_ping, "pool_recycle": self.recycle}
+        parsed = make_url(url)
+        # In-memory SQLite uses a per-thread pool that takes no size or overflow.
+        if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+            options.update(pool_size=self.size, max_overflow=self.max_overflow, pool_timeout=self.timeout)
+        return options
+
+
+class DatabasePool:
+    """
+    One database server (the primary or a replica): its engine, an optional
+    async engine, checkout timing, and whether it is currently healthy.
+
+    ``connect`` and ``aconnect`` record how long each checkout waited in
+    ``db_pool_checkout_wait_seconds``; ``stats`` reports how much of the
+    pool is checked out so pools can be sized under load. A failed checkout
+    marks the pool unhealthy and the next successful one marks it healthy
+    again, so a replica's trial request (see ``ReplicaSet``) restores it.
+    """
+
+    def __init__(self, name: str, url: str, settings: PoolSettings, async_engine_url: Optional[str] = None):
+        self.name = name
+        self.url = url
+        self.settings = settings
+        self.engine = create_engine(url, **settings.engine_options(url))
+        self.async_engine = None
+        if async_engine_url:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            self.async_engine = create_async_engine(async_engine_url, **settings.engine_options(async_engine_url))
+        self.healthy = True
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {"reads": 0, "failures": 0}
+
+    def _checkout_failed(self, label: str, error: Exception):
+        if isinstance(error, PoolTimeoutError):
+            # The pool is saturated, not the server down.
+            DB_CHECKOUT_TIMEOUTS.inc(pool=label)
+        else:
+            self.mark_down(error)
+
+    @contextmanager
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = self.engine.connect()
+        except Exception as e:
+            self._checkout_failed(self.name, e)
+            raise
+        finally:
+            DB_CHECKOUT_WAIT_SECONDS.observe(time.perf_counter() - started, pool=self.name)
+        self.mark_up()
+        with connection:
+            yield connection
+
+    @asynccontextmanager
+    async def aconnect(self):
+        label = f"{self.name}:async"
+        started = time.perf_counter()
+        try:
+            connection = await self.async_engine.connect()
+        except Exception as e:
+            self._checkout_failed(label, e)
+            raise
+        finally:
+            DB_CHECKOUT_WAIT_SECONDS.observe(time.perf_counter() - started, pool=label)
+        self.mark_up()
+        try:
+            yield connection
+        finally:
+            await connection.close()
+
+    def count_read(self):
+        with self._lock:
+            self.counters["reads"] += 1
+
+    def mark_down(self, error: Exception):
+        with self._lock:
+            was_healthy = self.healthy
+            self.healthy = False
+            self.checked_at = time.monotonic()
+            self.counters["failures"] += 1
+        if was_healthy:
+            logger.warning(f"Database {self.name} marked unhealthy: {error}")
+
+    def mark_up(self):
+        if self.healthy:
+            return
+        with self._lock:
+            was_healthy = self.healthy
+            self.healthy = True
+        if not was_healthy:
+            logger.info(f"Database {self.name} is healthy again")
+
+    def retry_due(self, interval: float) -> bool:
+        """For an unhealthy pool, claim the next trial request once ``interval`` has passed."""
+        with self._lock:
+            now = time.monotonic()
+            if self.healthy or now - self.checked_at < interval:
+                return False
+            self.checked_at = now
+            return True
+
+    def check(self) -> bool:
+        """Ping the server and update ``healthy``."""
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            self.mark_down(e)
+            return False
+        self.mark_up()
+        return True
+
+    def warm_up(self, connections: int):
+        opened = [self.engine.connect() for _ in range(max(1, connections))]
+        for connection in opened:
+            # Closing returns the connection to the pool, where it stays open.
+            connection.close()
+
+    @staticmethod
+    def _pool_stats(pool, capacity: int) -> Dict[str, float]:
+        checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+        return {
+            "checked_out": checked_out,
+            "idle": pool.checkedin() if hasattr(pool, "checkedin") else 0,
+            "overflow": max(0, pool.overflow()) if hasattr(pool, "overflow") else 0,
+            "capacity": capacity,
+            "saturation": round(checked_out / capacity, 3) if capacity else 0.0
+        }
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Pool occupancy keyed by pool label (``name`` and, with an async engine, ``name:async``)."""
+        with self._lock:
+            state = {**self.counters, "healthy": self.healthy}
+        result = {self.name: {**self._pool_stats(self.engine.pool, self.settings.capacity), **state}}
+        if self.async_engine is not None:
+            result[f"{self.name}:async"] = self._pool_stats(self.async_engine.sync_engine.pool,
+                                                            self.settings.capacity)
+        return result
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+class ReplicaSet:
+    """
+    Round-robin over read replicas, skipping unhealthy ones.
+
+    A replica is marked unhealthy when a checkout from it fails, when a
+    query loses its connection, or when ``check`` cannot reach it. Every
+    ``retry_interval`` seconds one request is let through to an unhealthy
+    replica as a trial, and a successful checkout brings it back; ``check``
+    pings all of them and is meant to run periodically. ``choose`` returns
+    ``None`` when there are no replicas or none is usable, and callers then
+    read from the primary.
+    """
+
+    def __init__(self, replicas: List[DatabasePool], retry_interval: float = 10.0):
+        self.replicas = replicas
+        self.retry_interval = retry_interval
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self) -> Optional[DatabasePool]:
+        with self._lock:
+            start = self._next
+            self._next += 1
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if replica.healthy or replica.retry_due(self.retry_interval):
+                return replica
+        return None
+
+    def check(self) -> Dict[str, bool]:
+        return {replica.name: replica.check() for replica in self.replicas}
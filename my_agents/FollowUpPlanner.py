@@ -0,0 +1,209 @@
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from my_agents.ChartRecommender import ChartRecommender
+from my_agents.IntentRouter import VISUALIZE_PATTERN
+from my_agents.SchemaRetriever import tokenize
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_PATTERN = re.compile(
+    r"\b(that|those|these|them|previous|same|the (results?|list|table|data|rows))\b",
+    re.IGNORECASE,
+)
+# "it"/"this" are too common to count as a reference except in "chart it", "plot this".
+PRONOUN_PATTERN = re.compile(r"\b(it|this)\b", re.IGNORECASE)
+LEADING_REFINE_PATTERN = re.compile(r"^\s*(now|only|just|and|then|also|ok(ay)?|so)\b", re.IGNORECASE)
+TOP_PATTERN = re.compile(r"\b(top|first|highest|best|largest|biggest)\s+(\d+)\b", re.IGNORECASE)
+BOTTOM_PATTERN = re.compile(r"\b(bottom|last|lowest|worst|smallest)\s+(\d+)\b", re.IGNORECASE)
+SORT_PATTERN = re.compile(r"\b(sort|order|rank|arrange)(ed|ing)?\b", re.IGNORECASE)
+BY_PATTERN = re.compile(
+    r"\bby\s+(?:the\s+|their\s+)?([a-z_][\w ]*?)(?=\s+(?:asc\w*|desc\w*|in|with|where|and|then|from)\b|[?.!,]|$)",
+    re.IGNORECASE,
+)
+DESC_PATTERN = re.compile(r"\b(desc\w*|highest first|largest first|high to low|reversed?)\b", re.IGNORECASE)
+ASC_PATTERN = re.compile(r"\b(asc\w*|lowest first|smallest first|low to high)\b", re.IGNORECASE)
+FILTER_PATTERN = re.compile(
+    r"\b(?:with|where|whose|having)\s+(?:an?\s+|the\s+)?([a-z_][\w ]*?)\s*"
+    r"(>=|<=|!=|>|<|=|is not|isn't|greater than|more than|less than|at least|at most|equal to|equals|"
+    r"above|below|over|under|is|of)\s*"
+    r"(-?\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"|[\w\-]+)",
+    re.IGNORECASE,
+)
+ONLY_PATTERN = re.compile(r"\b(?:only|just)\s+(?:the\s+)?(.+)", re.IGNORECASE)
+
+OPERATORS = {
+    ">": ">", "above": ">", "over": ">", "greater than": ">", "more than": ">",
+    "<": "<", "below": "<", "under": "<", "less than": "<",
+    ">=": ">=", "at least": ">=", "<=": "<=", "at most": "<=",
+    "=": "==", "is": "==", "of": "==", "equal to": "==", "equals": "==",
+    "!=": "!=", "is not": "!=", "isn't": "!=",
+}
+MAX_VALUE_CARDINALITY = 200
+
+
+def refers_back(message: str) -> bool:
+    """Whether ``message`` points at the previous answer ("those", "that", "plot it")."""
+    return bool(REFERENCE_PATTERN.search(message)) or bool(
+        VISUALIZE_PATTERN.search(message) and PRONOUN_PATTERN.search(message)
+    )
+
+
+def resolve_column(phrase: str, columns) -> Optional[str]:
+    """Best column for a phrase like 'ctps scores', by exact name or token overlap."""
+    normalized = re.sub(r"\s+", "_", phrase.strip().lower())
+    for col in columns:
+        if str(col).lower() == normalized:
+            return col
+    wanted = set(tokenize(phrase))
+    best, best_overlap = None, 0
+    for col in columns:
+        overlap = len(wanted & set(tokenize(str(col))))
+        if overlap > best_overlap:
+            best, best_overlap = col, overlap
+    return best
+
+
+@dataclass
+class FollowUpPlan:
+    """Pandas steps that answer a follow-up from the previous result."""
+    steps: List[Tuple[str, Dict[str, Any]]] = field(default_factory=list)
+    visualize: bool = False
+
+    def describe(self) -> str:
+        parts = []
+        for op, args in self.steps:
+            if op == "filter":
+                parts.append(f"rows where {args['column']} {args['op']} {args['value']}")
+            elif op == "sort":
+                parts.append(f"sorted by {args['column']} ({'ascending' if args['ascending'] else 'descending'})")
+            elif op == "head":
+                parts.append(f"first {args['n']}")
+            elif op == "tail":
+                parts.append(f"last {args['n']}")
+        if self.visualize:
+            parts.append("charted")
+        return ", ".join(parts)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        for op, args in self.steps:
+            if op == "filter":
+                df = df[self._mask(df[args["column"]], args["op"], args["value"])]
+            elif op == "sort":
+                df = df.sort_values(args["column"], ascending=args["ascending"], kind="stable")
+            elif op == "head":
+                df = df.head(args["n"])
+            elif op == "tail":
+                df = df.tail(args["n"])
+        return df.reset_index(drop=True)
+
+    @staticmethod
+    def _mask(series: pd.Series, op: str, value):
+        if isinstance(value, str):
+            series = series.astype(str).str.lower()
+            value = value.lower()
+        return {
+            ">": series > value, "<": series < value, ">=": series >= value,
+            "<=": series <= value, "==": series == value, "!=": series != value,
+        }[op]
+
+
+class FollowUpPlanner:
+    """
+    Recognises follow-ups that only refine or chart the previous result.
+
+    A message qualifies when it refers back to the result ("those", "that",
+    "the list") or opens like a refinement ("now", "only", "just"), and every
+    part of it that was recognised resolves against the cached frame's
+    columns or values: filters ("with score above 80", "only math"), sorting
+    ("sort them by name"), top/bottom N ("only the top 3 of those") and
+    charting ("now visualize that"). Anything else returns None so the
+    normal SQL pipeline answers it.
+    """
+
+    def __init__(self):
+        self.recommender = ChartRecommender()
+
+    def plan(self, message: str, df: pd.DataFrame) -> Optional[FollowUpPlan]:
+        if not (refers_back(message) or LEADING_REFINE_PATTERN.search(message)):
+            return None
+        text = message.strip().rstrip("?.!")
+        columns = list(df.columns)
+        plan = FollowUpPlan(visualize=bool(VISUALIZE_PATTERN.search(text)))
+
+        for match in FILTER_PATTERN.finditer(text):
+            step = self._filter_step(df, match)
+            if step is None:
+                return None
+            plan.steps.append(step)
+
+        only = ONLY_PATTERN.search(text)
+        if only and not plan.steps:
+            step = self._value_step(df, only.group(1))
+            if step is not None:
+                plan.steps.append(step)
+
+        top, bottom = TOP_PATTERN.search(text), BOTTOM_PATTERN.search(text)
+        by = BY_PATTERN.search(text)
+        sort_column = None
+        if by and (top or bottom or SORT_PATTERN.search(text)):
+            sort_column = resolve_column(by.group(1), columns)
+            if sort_column is None:
+                return None
+        if top or bottom:
+            sort_column = sort_column or self._default_measure(df)
+            n = int((top or bottom).group(2))
+            if sort_column is not None:
+                plan.steps.append(("sort", {"column": sort_column, "ascending": bool(bottom and not top)}))
+                plan.steps.append(("head", {"n": n}))
+            else:
+                plan.steps.append(("head" if top else "tail", {"n": n}))
+        elif SORT_PATTERN.search(text):
+            if sort_column is None:
+                return None
+            descending = bool(DESC_PATTERN.search(text)) or (
+                text.lower().lstrip().startswith("rank") and not ASC_PATTERN.search(text)
+            )
+            plan.steps.append(("sort", {"column": sort_column, "ascending": not descending}))
+
+        if not plan.steps and not plan.visualize:
+            return None
+        logger.info(f"Follow-up answered locally: {plan.describe()}")
+        return plan
+
+    def _default_measure(self, df: pd.DataFrame) -> Optional[str]:
+        measures = self.recommender.profile(df).measures
+        return measures[0] if measures else None
+
+    def _filter_step(self, df: pd.DataFrame, match) -> Optional[Tuple[str, Dict[str, Any]]]:
+        column = resolve_column(match.group(1), df.columns)
+        if column is None:
+            return None
+        op = OPERATORS[match.group(2).lower()]
+        raw = match.group(3).strip("'\"")
+        if pd.api.types.is_numeric_dtype(df[column]):
+            try:
+                value = float(raw)
+            except ValueError:
+                return None
+        elif op in ("==", "!="):
+            value = raw
+        else:
+            return None
+        return "filter", {"column": column, "op": op, "value": value}
+
+    def _value_step(self, df: pd.DataFrame, phrase: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """``only math`` -> filter the categorical column that has a value named 'math'."""
+        phrase = phrase.lower()
+        for column in df.columns:
+            series = df[column]
+            if pd.api.types.is_numeric_dtype(series) or series.nunique() > MAX_VALUE_CARDINALITY:
+                continue
+            for value in series.dropna().astype(str).unique():
+                if re.search(rf"\b{re.escape(value.lower())}\b", phrase):
+                    return "filter", {"column": column, "op": "==", "value": value}
+        return None
@@ -0,0 +1,138 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+IMAGE_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Spec fields that change the rendered image; descriptions and reduction
+# bookkeeping do not.
+KEY_FIELDS = ("type", "title", "x_axis", "y_axis")
+
+
+def chart_key(frame: pd.DataFrame, spec: Dict[str, Any]) -> str:
+    """
+    Content address of a chart: a hash of the fields that shape the image and
+    of the (reduced) data it is drawn from.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({k: spec.get(k) for k in KEY_FIELDS}, sort_keys=True, default=str).encode())
+    digest.update(json.dumps([str(c) for c in frame.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:32]
+
+
+class ImageStore:
+    """
+    Content-addressed PNG store for rendered charts.
+
+    Images live under ``root/<key[:2]>/<key>.png``, where the key is
+    ``chart_key`` of the chart spec and data, so an identical chart is stored
+    (and rendered) once no matter how many requests ask for it. Entries not
+    read for ``max_age`` seconds are removed, and the least recently used ones
+    go first when the store grows past ``max_bytes``.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        self.root = root or os.getenv("IMAGE_STORE_DIR", "visualizations/store")
+        self.max_bytes = max_bytes or int(os.getenv("IMAGE_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+        self.max_age = max_age or float(os.getenv("IMAGE_STORE_MAX_AGE", str(7 * 24 * 3600)))
+        self._lock = threading.Lock()
+        # key -> (size, last_access), least recently used first
+        self._index: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.counters = {"hits": 0, "stored": 0, "evicted": 0}
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                key, ext = os.path.splitext(filename)
+                if ext == ".png" and IMAGE_KEY_PATTERN.match(key):
+                    stat = os.stat(os.path.join(dirpath, filename))
+                    entries.append((stat.st_mtime, key, stat.st_size))
+        for mtime, key, size in sorted(entries):
+            self._index[key] = (size, mtime)
+            self._bytes += size
+        self.enforce_retention()
+
+    def path_for(self, key: str) -> str:
+        if not IMAGE_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid image key: {key!r}")
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def contains(self, key: str) -> bool:
+        """Whether ``key`` is stored; counts as an access for retention."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return False
+            self._index[key] = (entry[0], time.time())
+            self._index.move_to_end(key)
+            self.counters["hits"] += 1
+            return True
+
+    def put(self, key: str, png: bytes) -> str:
+        """Store ``png`` under ``key`` (no-op if already stored) and return the key."""
+        path = self.path_for(key)
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+                return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if key not in self._index:
+                self._bytes += len(png)
+                self.counters["stored"] += 1
+            self._index[key] = (len(png), time.time())
+            self._index.move_to_end(key)
+        self.enforce_retention()
+        return key
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def enforce_retention(self):
+        """Drop entries older than ``max_age``, then the least recently used over ``max_bytes``."""
+        now = time.time()
+        removed = []
+        with self._lock:
+            while self._index:
+                key, (size, last_access) = next(iter(self._index.items()))
+                if now - last_access <= self.max_age and self._bytes <= self.max_bytes:
+                    break
+                del self._index[key]
+                self._bytes -= size
+                self.counters["evicted"] += 1
+                removed.append(key)
+        for key in removed:
+            try:
+                os.remove(self.path_for(key))
+            except OSError as e:
+                logger.warning(f"Could not remove stored image {key}: {e}")
+        if removed:
+            logger.info(f"Image store evicted {len(removed)} image(s)")
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "images": len(self._index), "bytes": self._bytes}
@@ -0,0 +1,145 @@
+import re
+import time
+import logging
+from dataclasses import dataclass
+from typing import Optional, Set
+
+from my_agents.SchemaRetriever import tokenize
+
+logger = logging.getLogger(__name__)
+
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|hiya|yo|thanks|thank you|thx|good (morning|afternoon|evening)|bye|goodbye|"
+    r"how are you|what'?s up|ok(ay)?|cool|great)\b[\s\w,!.?']{0,20}$",
+    re.IGNORECASE,
+)
+CHAT_PATTERN = re.compile(
+    r"\b(who are you|what can you do|help me|tell me a joke|explain|what is an?|define|how do i|"
+    r"your name|study tips?|advice)\b",
+    re.IGNORECASE,
+)
+DATA_PATTERN = re.compile(
+    r"\b(top|bottom|highest|lowest|average|avg|mean|median|count|how many|number of|total|sum|"
+    r"max(imum)?|min(imum)?|list|show|rank(ed|ing)?|compare|between|greater than|less than|above|"
+    r"below|per|group(ed)? by|distribution|trend|score[sd]?|percentage|students?|courses?|grades?)\b",
+    re.IGNORECASE,
+)
+VISUALIZE_PATTERN = re.compile(
+    r"\b(visuali[sz](e|ation)|chart|plot|graph|histogram|diagram|draw|pie|bar chart|line chart)\b",
+    re.IGNORECASE,
+)
+VISUAL_HINT_PATTERN = re.compile(
+    r"\b(trends?|over time|distribution|compare|comparison|versus|vs\.?|correlat\w*|pattern|"
+    r"per (day|week|month|year)|by (day|week|month|year|course|class|grade))\b",
+    re.IGNORECASE,
+)
+NO_VISUAL_PATTERN = re.compile(
+    r"\b(no (chart|graph|plot)s?|without (a )?(chart|graph|plot)|just the (number|value|name)|"
+    r"only the (number|value|name))\b",
+    re.IGNORECASE,
+)
+RANKING_PATTERN = re.compile(r"\b(top|bottom|best|worst)\s+\d+\b", re.IGNORECASE)
+SCALAR_PATTERN = re.compile(r"^\s*(how many|what is the (total|count|number|average)|count)\b", re.IGNORECASE)
+
+
+@dataclass
+class RouteDecision:
+    label: Optional[str]
+    confidence: float
+    source: str
+    reason: str
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.label is None
+
+
+class IntentRouter:
+    """
+    Answers the clear intent and visualization questions locally.
+
+    Rules look at greetings, data keywords and terms from the cached schema.
+    A decision is used when its confidence reaches ``threshold``; anything
+    below is left to the LLM. Every decision is logged with its source and
+    confidence so the thresholds can be tuned from the logs.
+    """
+
+    def __init__(self, threshold: float = 0.75):
+        self.threshold = threshold
+        self.schema_terms: Set[str] = set()
+        self._fingerprint = None
+
+    def update_schema_terms(self, schema: dict, fingerprint: Optional[str] = None):
+        """Refresh the table/column vocabulary used as an SQL signal."""
+        if fingerprint is not None and fingerprint == self._fingerprint:
+            return
+        terms = set()
+        for table, columns in schema.items():
+            terms.update(tokenize(table))
+            for column in columns:
+                terms.update(tokenize(column["name"] if isinstance(column, dict) else column))
+        self.schema_terms = terms
+        self._fingerprint = fingerprint
+
+    def classify_intent(self, question: str) -> RouteDecision:
+        """Return SQL/CHAT with a confidence, or an ambiguous decision (label None)."""
+        schema_hits = len(set(tokenize(question)) & self.schema_terms)
+        data_hits = len(DATA_PATTERN.findall(question))
+        has_number = bool(re.search(r"\d", question))
+
+        if GREETING_PATTERN.match(question) and not schema_hits:
+            return RouteDecision("CHAT", 0.95, "rules", "greeting")
+
+        sql_signal = min(schema_hits, 3) * 1.0 + min(data_hits, 3) * 0.6 + (0.3 if has_number else 0.0)
+        chat_signal = len(CHAT_PATTERN.findall(question)) * 1.0
+
+        if sql_signal >= 1.2 and chat_signal == 0:
+            return RouteDecision("SQL", min(0.99, 0.6 + 0.12 * sql_signal), "rules",
+                                 f"schema_hits={schema_hits} data_hits={data_hits}")
+        if sql_signal == 0 and chat_signal > 0:
+            return RouteDecision("CHAT", 0.9, "rules", "chat phrase without data terms")
+        if sql_signal == 0 and len(question.split()) <= 3:
+            return RouteDecision("CHAT", 0.8, "rules", "short message without data terms")
+        return RouteDecision(None, 0.5, "rules", f"sql_signal={sql_signal:.1f} chat_signal={chat_signal:.1f}")
+
+    def classify_visualization(self, question: str) -> RouteDecision:
+        """Return yes/no for charting with a confidence, or an ambiguous decision."""
+        if NO_VISUAL_PATTERN.search(question):
+            return RouteDecision("no", 0.95, "rules", "explicit opt-out")
+        if VISUALIZE_PATTERN.search(question):
+            return RouteDecision("yes", 0.95, "rules", "explicit chart request")
+        if VISUAL_HINT_PATTERN.search(question):
+            return RouteDecision("yes", 0.85, "rules", "trend/comparison/distribution wording")
+        if RANKING_PATTERN.search(question):
+            return RouteDecision("yes", 0.8, "rules", "top/bottom-k ranking")
+        if SCALAR_PATTERN.search(question):
+            return RouteDecision("no", 0.8, "rules", "single aggregate value")
+        return RouteDecision(None, 0.5, "rules", "no visual cues")
+
+    def _log(self, kind: str, question: str, decision: RouteDecision, started: float):
+        elapsed_us = (time.perf_counter() - started) * 1_000_000
+        logger.info(
+            f"route kind={kind} label={decision.label} source={decision.source} "
+            f"confidence={decision.confidence:.2f} reason=\"{decision.reason}\" "
+            f"elapsed_us={elapsed_us:.0f} question={question[:80]!r}"
+        )
+
+    async def route_intent(self, question: str, llm_handler) -> str:
+        """Classify locally, falling back to ``llm_handler.aanalyze_intent`` when unsure."""
+        started = time.perf_counter()
+        decision = self.classify_intent(question)
+        if decision.ambiguous or decision.confidence < self.threshold:
+            label = await llm_handler.aanalyze_intent(question)
+            decision = RouteDecision(label, decision.confidence, "llm", decision.reason)
+        self._log("intent", question, decision, started)
+        return decision.label
+
+    async def route_visualization(self, question: str, llm_handler) -> bool:
+        """Decide whether to chart locally, falling back to the LLM when unsure."""
+        started = time.perf_counter()
+        decision = self.classify_visualization(question)
+        if decision.ambiguous or decision.confidence < self.threshold:
+            wants_chart = await llm_handler.acheck_visualization_intent(question)
+            decision = RouteDecision("yes" if wants_chart else "no", decision.confidence, "llm", decision.reason)
+        self._log("visualization", question, decision, started)
+        return decision.label == "yes"
@@ -0,0 +1,295 @@
+import os
+import re
+import abc
+import ast
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from my_agents.IntentRouter import GREETING_PATTERN, VISUALIZE_PATTERN
+from my_agents.SchemaRetriever import tokenize
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("groq", "record", "replay", "stub")
+
+SCHEMA_LINE = re.compile(r"^\s*(\w+)\((.*)\)\s*$")
+TOP_N = re.compile(r"\b(?:top|bottom|first|last)\s+(\d+)\b", re.IGNORECASE)
+
+
+def prompt_text(prompt: Any) -> str:
+    """The text of a prompt given as a string or as chat messages."""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n".join(str(getattr(m, "content", m)) for m in prompt)
+
+
+def prompt_key(prompt: Any) -> str:
+    """Cassette key of a prompt: a hash of its text with whitespace runs collapsed."""
+    return hashlib.sha256(" ".join(prompt_text(prompt).split()).encode()).hexdigest()[:32]
+
+
+def _usage(prompt: str, reply: str) -> Dict[str, int]:
+    # Same four-characters-per-token estimate the client reserves with.
+    prompt_tokens, reply_tokens = max(1, len(prompt) // 4), max(1, len(reply) // 4)
+    return {"input_tokens": prompt_tokens, "output_tokens": reply_tokens,
+            "total_tokens": prompt_tokens + reply_tokens}
+
+
+def _chunks(reply: str) -> List[str]:
+    """Split a reply into word-sized stream chunks that join back to it exactly."""
+    return re.findall(r"\S+\s*|\s+", reply) or [reply]
+
+
+class LocalBackend(abc.ABC):
+    """
+    Base for backends that answer without the provider.
+
+    Subclasses implement ``respond(prompt) -> (reply, latency_seconds)``; this
+    class turns that into the ``invoke``/``ainvoke``/``astream`` interface of a
+    LangChain chat model, sleeping for the latency before the reply (or its
+    first chunk) so timing behaves like a remote call.
+    """
+
+    name = "local"
+
+    @abc.abstractmethod
+    def respond(self, prompt: Any):
+        """Return ``(reply, latency_seconds)`` for ``prompt``."""
+
+    def invoke(self, prompt: Any):
+        from langchain_core.messages import AIMessage
+        reply, latency = self.respond(prompt)
+        time.sleep(latency)
+        return AIMessage(content=reply, usage_metadata=_usage(prompt_text(prompt), reply))
+
+    async def ainvoke(self, prompt: Any):
+        from langchain_core.messages import AIMessage
+        reply, latency = self.respond(prompt)
+        await asyncio.sleep(latency)
+        return AIMessage(content=reply, usage_metadata=_usage(prompt_text(prompt), reply))
+
+    async def astream(self, prompt: Any) -> AsyncIterator[Any]:
+        from langchain_core.messages import AIMessageChunk
+        reply, latency = self.respond(prompt)
+        await asyncio.sleep(latency)
+        chunks = _chunks(reply)
+        for i, chunk in enumerate(chunks):
+            # Usage rides on the last chunk, as the provider reports it.
+            usage = _usage(prompt_text(prompt), reply) if i == len(chunks) - 1 else None
+            yield AIMessageChunk(content=chunk, usage_metadata=usage)
+            await asyncio.sleep(0)
+
+
+class StubBackend(LocalBackend):
+    """
+    Deterministic canned answers for each prompt the service sends.
+
+    The prompt kind is recognised from its template: intent classification
+    answers SQL (CHAT for greetings), SQL generation picks the schema table
+    sharing most terms with the question and selects from it, corrections
+    return the original query, visualization checks answer yes when the
+    question asks for a chart, chart recommendations are JSON built from the
+    listed columns, and summaries and chat get a fixed sentence.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def respond(self, prompt: Any):
+        return self.reply(prompt_text(prompt)), self.latency
+
+    def reply(self, text: str) -> str:
+        if "Respond with one word: SQL, CHAT" in text:
+            question = self._field(text, "Question:")
+            return "CHAT" if GREETING_PATTERN.match(question) else "SQL"
+        if "Answer (yes/no)" in text:
+            question = self._field(text, "User question:").strip('"')
+            return "yes" if VISUALIZE_PATTERN.search(question) else "no"
+        if "visualization advisor" in text:
+            return self.chart_json(text)
+        if "Original Query:" in text:
+            return self._field(text, "Original Query:")
+        if "Given this MySQL database schema:" in text:
+            return self.sql(text)
+        if "Create a clear, concise summary" in text:
+            question = self._field(text, "Original Question:")
+            return f"Here is a summary of the results for \"{question}\": the rows above answer the question."
+        return "Hello! I can answer questions about student data. What would you like to know?"
+
+    @staticmethod
+    def _field(text: str, label: str) -> str:
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith(label):
+                return line[len(label):].strip()
+        return ""
+
+    def sql(self, text: str) -> str:
+        schema, _, rest = text.partition("Given this MySQL database schema:")[2].partition("Generate a safe")
+        question = rest.partition("question:")[2].strip().splitlines()[0] if "question:" in rest else ""
+        wanted = set(tokenize(question))
+        best, best_overlap = None, -1
+        for line in schema.splitlines():
+            match = SCHEMA_LINE.match(line)
+            if not match:
+                continue
+            table, columns = match.group(1), match.group(2)
+            overlap = len(wanted & set(tokenize(f"{table} {columns}")))
+            if overlap > best_overlap:
+                best, best_overlap = table, overlap
+        if best is None:
+            return "select 1"
+        top = TOP_N.search(question)
+        return f"select * from {best} limit {int(top.group(1)) if top else 100}"
+
+    @staticmethod
+    def chart_json(text: str) -> str:
+        def listed(label):
+            try:
+                return ast.literal_eval(StubBackend._field(text, label))
+            except (ValueError, SyntaxError):
+                return []
+        numeric, categorical = listed("- Numeric columns:"), listed("- Categorical columns:")
+        charts = []
+        if categorical and numeric:
+            charts.append({"type": "bar_chart", "title": f"{numeric[0]} by {categorical[0]}",
+                           "x_axis": categorical[0], "y_axis": numeric[0],
+                           "description": f"{numeric[0]} for each {categorical[0]}."})
+        if numeric:
+            charts.append({"type": "histogram", "title": f"Distribution of {numeric[0]}",
+                           "x_axis": numeric[0], "y_axis": None,
+                           "description": f"How {numeric[0]} values are distributed."})
+        return json.dumps({"visualizations": charts})
+
+
+class ReplayBackend(LocalBackend):
+    """
+    Answers from a cassette written by ``RecordingBackend``.
+
+    Each reply is delayed by ``latency`` seconds plus up to ``jitter``, or by
+    the latency recorded with it when ``latency`` is None. A prompt missing
+    from the cassette is answered by ``StubBackend`` and counted in ``misses``.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, latency: Optional[float] = None, jitter: float = 0.0):
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.fallback = StubBackend()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["key"]] = entry
+        logger.info(f"Replaying {len(self.entries)} recorded LLM responses from {path}")
+
+    def respond(self, prompt: Any):
+        entry = self.entries.get(prompt_key(prompt))
+        if entry is None:
+            self.misses += 1
+            reply, recorded = self.fallback.reply(prompt_text(prompt)), 0.0
+        else:
+            self.hits += 1
+            reply, recorded = entry["response"], entry.get("latency_ms", 0) / 1000
+        latency = recorded if self.latency is None else self.latency
+        return reply, latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+
+class RecordingBackend:
+    """
+    Passes calls to the real model and appends each prompt and reply, with
+    its latency, to a JSON-lines cassette that ``ReplayBackend`` can serve.
+    """
+
+    name = "record"
+
+    def __init__(self, model, path: str):
+        self.model = model
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _save(self, prompt: Any, reply: str, latency: float):
+        entry = {
+            "key": prompt_key(prompt),
+            "prompt": prompt_text(prompt),
+            "response": reply,
+            "latency_ms": round(latency * 1000, 1)
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def invoke(self, prompt: Any):
+        started = time.perf_counter()
+        response = self.model.invoke(prompt)
+        self._save(prompt, str(response.content), time.perf_counter() - started)
+        return response
+
+    async def ainvoke(self, prompt: Any):
+        started = time.perf_counter()
+        response = await self.model.ainvoke(prompt)
+        self._save(prompt, str(response.content), time.perf_counter() - started)
+        return response
+
+    async def astream(self, prompt: Any):
+        started = time.perf_counter()
+        first_chunk = None
+        parts = []
+        async for chunk in self.model.astream(prompt):
+            if first_chunk is None:
+                first_chunk = time.perf_counter()
+            parts.append(str(chunk.content))
+            yield chunk
+        # Replay delays the whole reply by the recorded latency, so record time to first chunk.
+        self._save(prompt, "".join(parts), (first_chunk or time.perf_counter()) - started)
+
+
+def create_backend(model_name: str, temperature: float, max_tokens: int, timeout: float,
+                   kind: Optional[str] = None):
+    """
+    Build the chat model selected by ``kind`` (default ``LLM_BACKEND``, "groq").
+
+    - ``groq``: the Groq API
+    - ``record``: the Groq API, saving every exchange to ``LLM_CASSETTE``
+    - ``replay``: answers from ``LLM_CASSETTE``, delayed by ``LLM_REPLAY_LATENCY_MS``
+      (default: the recorded latency) plus up to ``LLM_REPLAY_JITTER_MS``
+    - ``stub``: canned answers after ``LLM_STUB_LATENCY_MS``
+    """
+    kind = (kind or os.getenv("LLM_BACKEND", "groq")).lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {kind!r}; expected one of {', '.join(BACKENDS)}")
+    cassette = os.getenv("LLM_CASSETTE", "cassettes/llm.jsonl")
+
+    if kind == "stub":
+        return StubBackend(latency=float(os.getenv("LLM_STUB_LATENCY_MS", "0")) / 1000)
+    if kind == "replay":
+        latency = os.getenv("LLM_REPLAY_LATENCY_MS")
+        return ReplayBackend(
+            cassette,
+            latency=float(latency) / 1000 if latency else None,
+            jitter=float(os.getenv("LLM_REPLAY_JITTER_MS", "0")) / 1000
+        )
+
+    from langchain_groq import ChatGroq
+    # Retries are done by LLMClient, with backoff shared across callers, not inside the SDK.
+    model = ChatGroq(
+        model=model_name,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout,
+        max_retries=0
+    )
+    return RecordingBackend(model, cassette) if kind == "record" else model
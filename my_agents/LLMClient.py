@@ -0,0 +1,384 @@
+import os
+import time
+import heapq
+import functools
+import random
+import asyncio
+import logging
+import itertools
+import threading
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from my_agents.LLMBackend import create_backend
+from my_agents.Metrics import LLM_QUEUE_WAIT_SECONDS, record_tokens
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: interactive chat is admitted before background batch work.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Priority of LLM calls made from the current task; the batch endpoint sets
+# PRIORITY_BATCH before it starts a question's pipeline.
+request_priority: ContextVar[int] = ContextVar("llm_request_priority", default=PRIORITY_INTERACTIVE)
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    """
+    Errors worth retrying: provider rate limits, timeouts, dropped connections
+    and 5xx. Resolved on first use so the SDK is not imported at startup.
+    """
+    import groq
+    return (
+        groq.RateLimitError,
+        groq.APITimeoutError,
+        groq.APIConnectionError,
+        groq.InternalServerError,
+        asyncio.TimeoutError,
+        TimeoutError,
+    )
+
+
+def priority_name(priority: int) -> str:
+    return {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}.get(priority, str(priority))
+
+
+def estimate_tokens(prompt: Any) -> int:
+    """Rough prompt size in tokens (about four characters per token)."""
+    if isinstance(prompt, str):
+        text = prompt
+    else:
+        text = "".join(str(getattr(m, "content", m)) for m in prompt)
+    return max(1, len(text) // 4)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from a 429's ``retry-after`` header."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """A bucket of ``capacity`` units refilled evenly over one minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 if they are now)."""
+        self._refill(now)
+        # A single request larger than the bucket waits for a full bucket rather than forever.
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class LLMClient:
+    """
+    The process-wide gateway to the chat model (see ``create_backend``).
+
+    Every call is admitted through two token buckets sized to the provider's
+    quotas, ``requests_per_minute`` and ``tokens_per_minute`` (a call reserves
+    its estimated prompt tokens plus ``max_tokens``; the difference to the
+    reported usage is handed back afterwards), and through at most
+    ``max_concurrency`` calls in flight. Callers that have to wait are queued
+    by ``request_priority`` so interactive chat overtakes batch work.
+
+    Calls time out after ``timeout`` seconds and are retried up to
+    ``max_retries`` times on 429s, timeouts, connection errors and 5xx, with
+    full-jitter exponential backoff (or the provider's ``retry-after``).
+    Queue wait, retries and token usage are reported by ``stats``.
+    """
+
+    def __init__(self, model_name: str, temperature: float = 0.7, max_tokens: int = 512,
+                 timeout: float = 10, requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 max_retries: Optional[int] = None, backoff_base: float = 0.5, backoff_cap: float = 20.0,
+                 backend=None):
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.requests = TokenBucket(requests_per_minute or int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30")))
+        self.tokens = TokenBucket(tokens_per_minute or int(os.getenv("LLM_TOKENS_PER_MINUTE", "6000")))
+
+        self.temperature = temperature
+        # The Groq model, or a record/replay/stub stand-in selected by LLM_BACKEND;
+        # built on first use or by warm_up, so importing the API stays cheap.
+        self._llm = backend
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._sequence = itertools.count()
+        # (priority, sequence, future, tokens) of async callers waiting for admission
+        self._waiters: List[tuple] = []
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waits: Dict[int, List[float]] = {}
+        self.counters = {
+            "calls": 0, "failed": 0, "retries": 0, "rate_limited": 0, "timed_out": 0,
+            "prompt_tokens": 0, "completion_tokens": 0
+        }
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = create_backend(self.model_name, self.temperature, self.max_tokens, self.timeout)
+        return self._llm
+
+    def warm_up(self):
+        """Build the model client (and load the provider SDK) ahead of the first call."""
+        return self.llm
+
+    # -- admission -------------------------------------------------------
+
+    def _try_admit(self, tokens: int) -> float:
+        """Admit now and return 0, or return how long to wait. Caller holds the lock."""
+        if self._in_flight >= self.max_concurrency:
+            return -1.0
+        now = time.monotonic()
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._in_flight += 1
+        return 0.0
+
+    def _dispatch(self):
+        """Admit queued callers in priority order while capacity lasts."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._wake_handle is not None:
+                self._wake_handle.cancel()
+                self._wake_handle = None
+            while self._waiters:
+                priority, _, future, tokens = self._waiters[0]
+                if future.done():
+                    heapq.heappop(self._waiters)
+                    continue
+                wait = self._try_admit(tokens)
+                if wait != 0.0:
+                    # Head of the queue blocks everyone behind it; wake when it can go
+                    # (a concurrency slot freeing up calls _dispatch from _release).
+                    if wait > 0:
+                        self._wake_handle = loop.call_later(wait, self._dispatch)
+                    break
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+
+    async def _acquire(self, tokens: int):
+        priority = request_priority.get()
+        queued = time.perf_counter()
+        with self._lock:
+            admitted = not self._waiters and self._try_admit(tokens) == 0.0
+            if not admitted:
+                self._loop = asyncio.get_running_loop()
+                future = self._loop.create_future()
+                heapq.heappush(self._waiters, (priority, next(self._sequence), future, tokens))
+        if not admitted:
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Admitted just as we were cancelled: hand the slot back.
+                    self._release(tokens, 0)
+                raise
+        self._record_wait(priority, time.perf_counter() - queued)
+
+    def _acquire_sync(self, tokens: int):
+        """Blocking admission for synchronous callers (no priority ordering)."""
+        queued = time.perf_counter()
+        while True:
+            with self._lock:
+                wait = self._try_admit(tokens)
+            if wait == 0.0:
+                break
+            time.sleep(wait if wait > 0 else 0.05)
+        self._record_wait(request_priority.get(), time.perf_counter() - queued)
+
+    def _release(self, reserved: int, used: int):
+        with self._lock:
+            self._in_flight -= 1
+            if used and used < reserved:
+                self.tokens.give_back(reserved - used)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Released from a worker thread: wake queued async callers on their loop.
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._dispatch)
+            return
+        self._dispatch()
+
+    def _record_wait(self, priority: int, seconds: float):
+        LLM_QUEUE_WAIT_SECONDS.observe(seconds, priority=priority_name(priority))
+        with self._lock:
+            waits = self._waits.setdefault(priority, [])
+            waits.append(seconds * 1000)
+            if len(waits) > 1000:
+                del waits[:len(waits) - 1000]
+
+    # -- calls -----------------------------------------------------------
+
+    def _reserve(self, prompt: Any) -> int:
+        return estimate_tokens(prompt) + self.max_tokens
+
+    def _usage(self, message) -> int:
+        usage = getattr(message, "usage_metadata", None) or {}
+        prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        with self._lock:
+            self.counters["prompt_tokens"] += prompt_tokens
+            self.counters["completion_tokens"] += completion_tokens
+        record_tokens(prompt_tokens, completion_tokens)
+        return usage.get("total_tokens", 0)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        with self._lock:
+            self.counters["retries"] += 1
+            import groq
+            if isinstance(error, groq.RateLimitError):
+                self.counters["rate_limited"] += 1
+            elif isinstance(error, (groq.APITimeoutError, asyncio.TimeoutError, TimeoutError)):
+                self.counters["timed_out"] += 1
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        logger.warning(f"LLM call failed ({type(error).__name__}), retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def invoke(self, prompt: Any) -> str:
+        """Send ``prompt`` (a string or chat messages) and return the reply text, blocking the calling thread."""
+        reserved = self._reserve(prompt)
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            self._acquire_sync(reserved)
+            used = 0
+            try:
+                response = self.llm.invoke(prompt)
+                used = self._usage(response)
+                return str(response.content)
+            except retryable_errors() as e:
+                if attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                delay = self._backoff(attempt, e)
+            except Exception:
+                self._count("failed")
+                raise
+            finally:
+                self._release(reserved, used)
+            time.sleep(delay)
+
+    async def ainvoke(self, prompt: Any) -> str:
+        """Awaitable counterpart of ``invoke``."""
+        reserved = self._reserve(prompt)
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(reserved)
+            used = 0
+            try:
+                response = await asyncio.wait_for(self.llm.ainvoke(prompt), self.timeout)
+                used = self._usage(response)
+                return str(response.content)
+            except retryable_errors() as e:
+                if attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                delay = self._backoff(attempt, e)
+            except Exception:
+                self._count("failed")
+                raise
+            finally:
+                self._release(reserved, used)
+            await asyncio.sleep(delay)
+
+    async def astream(self, prompt: Any) -> AsyncIterator[str]:
+        """
+        Yield the reply chunk by chunk. ``timeout`` bounds the wait for the
+        first chunk, and failures are only retried before anything was yielded.
+        """
+        reserved = self._reserve(prompt)
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(reserved)
+            used = 0
+            started = False
+            try:
+                stream = self.llm.astream(prompt).__aiter__()
+                chunk = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                while True:
+                    started = True
+                    used += self._usage(chunk)
+                    if chunk.content:
+                        yield str(chunk.content)
+                    try:
+                        chunk = await stream.__anext__()
+                    except StopAsyncIteration:
+                        return
+            except StopAsyncIteration:
+                return
+            except retryable_errors() as e:
+                if started or attempt == self.max_retries:
+                    self._count("failed")
+                    raise
+                delay = self._backoff(attempt, e)
+            except Exception:
+                self._count("failed")
+                raise
+            finally:
+                self._release(reserved, used)
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            queue_wait = {}
+            for priority, waits in sorted(self._waits.items()):
+                ordered = sorted(waits)
+                queue_wait[priority_name(priority)] = {
+                    "samples": len(ordered),
+                    "avg_ms": round(sum(ordered) / len(ordered), 1),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+                    "max_ms": round(ordered[-1], 1)
+                }
+            stats = {
+                **self.counters,
+                "model": self.model_name,
+                "backend": getattr(self._llm, "name", "groq") if self._llm is not None else None,
+                "in_flight": self._in_flight,
+                "queued": sum(1 for w in self._waiters if not w[2].done()),
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level, 1),
+                "queue_wait": queue_wait
+            }
+        if hasattr(self._llm, "misses"):
+            stats["replay"] = {"hits": self._llm.hits, "misses": self._llm.misses}
+        return stats
@@ -1,18 +1,85 @@
-import json
-import requests
-from typing import Dict, Any, Optional, List, Tuple
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-import pandas as pd
+from typing import Dict, Any, AsyncIterator, Optional, List, Tuple
 import logging
+from my_agents.LLMClient import LLMClient
+from my_agents.Metrics import timed
+from my_agents.ResultDigest import ResultDigest
+from my_agents.SQLValidator import SQLValidator
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - [%(trace_id)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 
+INTENT_TEMPLATE = """
+            You are a helpful assistant. Determine the intent of the following user question.
+                - SQL: Structured banking data (e.g., customers, transactions, loans, account types, cities) top k or bottom k values.
+                - CHAT: Casual greetings only, don't try to answer any other thing look fo vector or sql can be capable or not.
+
+            Briefly identify the intent. Respond with one word: SQL, CHAT
+
+            Question: {question}
+            """
+
+QUERY_TEMPLATE = """Given this MySQL database schema:
+
+            {schema}
+
+            Don't use the 
+
+            Generate a safe, efficient SQL query to answer this question:
+            {question}
+
+            Return only the SQL query without any explanation or comments.
+            """
+
+CORRECTION_TEMPLATE = """
+            The following SQL query generated an error:
+            
+            Schema: {schema}
+            Question: {question}
+            Original Query: {original_query}
+            Error: {error}
+            
+            Please provide a corrected SQL query that resolves this error.
+            Return only the corrected SQL query without any explanation.
+            """
+
+CHAT_TEMPLATE = """
+            You are a helpful educational assistant. Respond professionally and engagingly to:
+            
+            {question}
+            """
+
+SUMMARY_TEMPLATE = """
+            Create a clear, concise summary of these database results:
+            
+            Original Question: {question}
+            Data: {data}
+            
+            Focus on key insights and patterns.
+            """
+
+def visualization_intent_prompt(question: str) -> str:
+    return f"""
+        Determine if the following user question would benefit from data visualization.
+        Answer with 'yes' if visualization would add value, or 'no' if not.
+        
+        User question: "{question}"
+        
+        Consider visualization appropriate for:
+        - if the question contains the word "visualize" or "visualization"
+        - Queries about trends over time
+        - Requests to compare multiple values
+        - Questions about distribution of data
+        - Requests for patterns or correlations
+        - Analysis of performance or metrics
+        
+        Answer (yes/no):
+        """
+
+
 def clean_llm_sql(raw_sql: str) -> str:
     raw_sql = raw_sql.lower()
     if not raw_sql:
@@ -29,6 +96,16 @@ def clean_llm_sql(raw_sql: str) -> str:
     return cleaned.replace("`", "").strip()
 
 class LLMHandler:
+    """
+    Wraps the Groq chat model behind the prompts used by the API.
+
+    Every public method has an awaitable twin prefixed with ``a`` (for example
+    ``aget_query_from_llm``) that goes through ``ainvoke`` so callers running
+    on the event loop never block on the provider round trip. All calls go
+    through one ``LLMClient``, which rate-limits, prioritises and retries
+    them; create a single handler per process and share it.
+    """
+
     def __init__(self, 
                  model_name: Optional[str] = None,
                  api_url: Optional[str] = None, 
@@ -37,7 +114,7 @@ class LLMHandler:
                  timeout: int = 10):
         
         # Load from env if not explicitly passed
-        self.model_name = "llama-3.3-70b-versatile"
+        self.model_name = model_name or "llama-3.3-70b-versatile"
         self.api_url = "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"
 
         if not self.model_name or not self.api_url:
@@ -49,99 +126,101 @@ class LLMHandler:
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.timeout = timeout
-        self.session = requests.Session()
 
-        self.llm = ChatGroq(
-            model=self.model_name,
+        self.client = LLMClient(
+            self.model_name,
             temperature=self.temperature,
-            max_tokens=self.max_tokens
+            max_tokens=self.max_tokens,
+            timeout=self.timeout
         )
 
+        # Large results are summarised from a statistical digest instead of raw rows.
+        self.result_digest = ResultDigest(token_budget=int(os.getenv("SUMMARY_TOKEN_BUDGET", "1500")))
+
+    @staticmethod
+    def _messages(template: str, inputs: Dict[str, Any]) -> str:
+        # A single user turn, as ChatPromptTemplate.from_template produced, without
+        # importing langchain's prompt machinery at startup.
+        return template.format(**inputs)
+
+    def _invoke(self, template: str, inputs: Dict[str, Any]) -> str:
+        """Render ``template`` with ``inputs`` and return the stripped model reply."""
+        return self.client.invoke(self._messages(template, inputs)).strip()
+
+    async def _ainvoke(self, template: str, inputs: Dict[str, Any]) -> str:
+        """Awaitable counterpart of ``_invoke`` built on ``ainvoke``."""
+        return (await self.client.ainvoke(self._messages(template, inputs))).strip()
+
+    async def _astream(self, template: str, inputs: Dict[str, Any]) -> AsyncIterator[str]:
+        """Yield the model reply chunk by chunk as it arrives (``astream``)."""
+        async for token in self.client.astream(self._messages(template, inputs)):
+            yield token
+
+    @timed("LLMHandler.analyze_intent")
     def analyze_intent(self, question: str) -> str:
         try:
-            prompt = ChatPromptTemplate.from_template("""
-            You are a helpful assistant. Determine the intent of the following user question.
-                - SQL: Structured banking data (e.g., customers, transactions, loans, account types, cities) top k or bottom k values.
-                - CHAT: Casual greetings only, don't try to answer any other thing look fo vector or sql can be capable or not.
-
-            Briefly identify the intent. Respond with one word: SQL, CHAT
+            return self._invoke(INTENT_TEMPLATE, {"question": question}).upper()
+        except Exception as e:
+            logger.error(f"Error analyzing intent: {e}")
+            return "CHAT"
 
-            Question: {question}
-            """)
-            
-            response = (prompt | self.llm).invoke({"question": question})
-            return str(response.content).strip().upper()
+    @timed("LLMHandler.aanalyze_intent")
+    async def aanalyze_intent(self, question: str) -> str:
+        try:
+            return (await self._ainvoke(INTENT_TEMPLATE, {"question": question})).upper()
         except Exception as e:
             logger.error(f"Error analyzing intent: {e}")
             return "CHAT"
 
+    @timed("LLMHandler.get_query_from_llm")
     def get_query_from_llm(self, schema: str, question: str) -> str:
         try:
-            template = """Given this MySQL database schema:
-
-            {schema}
-
-            Don't use the 
-
-            Generate a safe, efficient SQL query to answer this question:
-            {question}
-
-            Return only the SQL query without any explanation or comments.
-            """
+            result = self._invoke(QUERY_TEMPLATE, {"schema": schema, "question": question})
+            return clean_llm_sql(result)
+        except Exception as e:
+            logger.error(f"Error generating query: {e}")
+            return ""
 
-            prompt = ChatPromptTemplate.from_template(template)
-            response = (prompt | self.llm).invoke({"schema": schema, "question": question})
-            result =str(response.content).strip()
+    @timed("LLMHandler.aget_query_from_llm")
+    async def aget_query_from_llm(self, schema: str, question: str) -> str:
+        try:
+            result = await self._ainvoke(QUERY_TEMPLATE, {"schema": schema, "question": question})
             return clean_llm_sql(result)
         except Exception as e:
             logger.error(f"Error generating query: {e}")
             return ""
 
+    @timed("LLMHandler.correct_query")
     def correct_query(self, schema: str, question: str, original_query: str, error: str) -> str:
         try:
-            template = """
-            The following SQL query generated an error:
-            
-            Schema: {schema}
-            Question: {question}
-            Original Query: {original_query}
-            Error: {error}
-            
-            Please provide a corrected SQL query that resolves this error.
-            Return only the corrected SQL query without any explanation.
-            """
-            
-            prompt = ChatPromptTemplate.from_template(template)
-            response = (prompt | self.llm).invoke({
+            return self._invoke(CORRECTION_TEMPLATE, {
                 "schema": schema,
                 "question": question,
                 "original_query": original_query,
                 "error": error
             })
-            return str(response.content).strip()
         except Exception as e:
             logger.error(f"Error correcting query: {e}")
             return ""
 
-    def validate_generated_sql(self, sql_query: str) -> Dict[str, Any]:
+    @timed("LLMHandler.acorrect_query")
+    async def acorrect_query(self, schema: str, question: str, original_query: str, error: str) -> str:
         try:
-            template = """
-            Analyze this SQL query for safety and correctness:
-            
-            {sql}
-            
-            Return a JSON object with this exact structure:
-            {{
-                "is_valid": boolean,
-                "issues": [list of strings describing any problems],
-                "risk_level": "low"|"medium"|"high"
-            }}
-            """
-            
-            prompt = ChatPromptTemplate.from_template(template)
-            response = (prompt | self.llm).invoke({"sql": sql_query})
-            validation_result = json.loads(str(response.content).strip())
-            return validation_result
+            return await self._ainvoke(CORRECTION_TEMPLATE, {
+                "schema": schema,
+                "question": question,
+                "original_query": original_query,
+                "error": error
+            })
+        except Exception as e:
+            logger.error(f"Error correcting query: {e}")
+            return ""
+
+    @timed("LLMHandler.validate_generated_sql")
+    def validate_generated_sql(self, sql_query: str, schema: Optional[dict] = None) -> Dict[str, Any]:
+        """Validate SQL locally (no LLM call); see ``SQLValidator``."""
+        try:
+            return SQLValidator(schema).validate(sql_query)
         except Exception as e:
             logger.error(f"Error validating SQL: {e}")
             return {
@@ -150,41 +229,73 @@ class LLMHandler:
                 'risk_level': 'high'
             }
 
+    @timed("LLMHandler.avalidate_generated_sql")
+    async def avalidate_generated_sql(self, sql_query: str, schema: Optional[dict] = None) -> Dict[str, Any]:
+        # Local validation takes well under a millisecond, so there is nothing to await.
+        return self.validate_generated_sql(sql_query, schema)
+
+    @timed("LLMHandler.generate_chat_response")
     def generate_chat_response(self, question: str) -> str:
         try:
-            prompt = ChatPromptTemplate.from_template("""
-            You are a helpful educational assistant. Respond professionally and engagingly to:
-            
-            {question}
-            """)
-            
-            response = (prompt | self.llm).invoke({"question": question})
-            return str(response.content).strip()
+            return self._invoke(CHAT_TEMPLATE, {"question": question})
+        except Exception as e:
+            logger.error(f"Error generating chat response: {e}")
+            return "I apologize, but I'm having trouble processing your request. Could you please try again?"
+
+    @timed("LLMHandler.agenerate_chat_response")
+    async def agenerate_chat_response(self, question: str) -> str:
+        try:
+            return await self._ainvoke(CHAT_TEMPLATE, {"question": question})
         except Exception as e:
             logger.error(f"Error generating chat response: {e}")
             return "I apologize, but I'm having trouble processing your request. Could you please try again?"
 
+    @timed("LLMHandler.astream_chat_response")
+    async def astream_chat_response(self, question: str) -> AsyncIterator[str]:
+        """Stream the chat reply token by token."""
+        try:
+            async for token in self._astream(CHAT_TEMPLATE, {"question": question}):
+                yield token
+        except Exception as e:
+            logger.error(f"Error generating chat response: {e}")
+            yield "I apologize, but I'm having trouble processing your request. Could you please try again?"
+
+    @timed("LLMHandler.generate_summary")
     def generate_summary(self, question: str, result: List[Dict[str, Any]]) -> str:
         try:
-            template = """
-            Create a clear, concise summary of these database results:
-            
-            Original Question: {question}
-            Data: {data}
-            
-            Focus on key insights and patterns.
-            """
-            
-            prompt = ChatPromptTemplate.from_template(template)
-            response = (prompt | self.llm).invoke({
+            return self._invoke(SUMMARY_TEMPLATE, {
+                "question": question,
+                "data": self.result_digest.build(result)
+            })
+        except Exception as e:
+            logger.error(f"Error generating summary: {e}")
+            return "Unable to generate summary due to an error."
+
+    @timed("LLMHandler.agenerate_summary")
+    async def agenerate_summary(self, question: str, result: List[Dict[str, Any]]) -> str:
+        try:
+            return await self._ainvoke(SUMMARY_TEMPLATE, {
                 "question": question,
-                "data": json.dumps(result, indent=2)
+                "data": self.result_digest.build(result)
             })
-            return str(response.content).strip()
         except Exception as e:
             logger.error(f"Error generating summary: {e}")
             return "Unable to generate summary due to an error."
     
+    @timed("LLMHandler.astream_summary")
+    async def astream_summary(self, question: str, result: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Stream the result summary token by token."""
+        try:
+            async for token in self._astream(SUMMARY_TEMPLATE, {
+                "question": question,
+                "data": self.result_digest.build(result)
+            }):
+                yield token
+        except Exception as e:
+            logger.error(f"Error generating summary: {e}")
+            yield "Unable to generate summary due to an error."
+
+    @timed("LLMHandler.check_visualization_intent")
     def check_visualization_intent(self, question):
         """
         Check if the user's question would benefit from visualization.
@@ -199,22 +310,7 @@ class LLMHandler:
         bool
             True if visualization would be helpful, False otherwise
         """
-        prompt = f"""
-        Determine if the following user question would benefit from data visualization.
-        Answer with 'yes' if visualization would add value, or 'no' if not.
-        
-        User question: "{question}"
-        
-        Consider visualization appropriate for:
-        - if the question contains the word "visualize" or "visualization"
-        - Queries about trends over time
-        - Requests to compare multiple values
-        - Questions about distribution of data
-        - Requests for patterns or correlations
-        - Analysis of performance or metrics
-        
-        Answer (yes/no):
-        """
+        prompt = visualization_intent_prompt(question)
         
         try:
             # Looking at your code, you likely use one of these methods to get responses
@@ -224,4 +320,28 @@ class LLMHandler:
         except Exception as e:
             # Default to not visualizing on error
             logger.warning(f"Error determining visualization intent: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    @timed("LLMHandler.acheck_visualization_intent")
+    async def acheck_visualization_intent(self, question):
+        """
+        Awaitable variant of ``check_visualization_intent``.
+        
+        Parameters:
+        -----------
+        question : str
+            The user's question or query
+            
+        Returns:
+        --------
+        bool
+            True if visualization would be helpful, False otherwise
+        """
+        prompt = visualization_intent_prompt(question)
+        
+        try:
+            response = await self.agenerate_chat_response(prompt)
+            return response.lower().strip().startswith('yes')
+        except Exception as e:
+            logger.warning(f"Error determining visualization intent: {str(e)}")
+            return False
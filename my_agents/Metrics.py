@@ -0,0 +1,278 @@
+import time
+import uuid
+import asyncio
+import inspect
+import logging
+import functools
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans a cached lookup (~1 ms) up to a slow LLM call or render (~30 s).
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Id of the request being served; every log line carries it (see ``install_log_context``).
+trace_id: ContextVar[str] = ContextVar("trace_id", default="-")
+# Token totals of the request being served, filled from provider response metadata.
+request_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("request_usage", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels, in the Prometheus text format."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, in the Prometheus text format."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., sum, count]
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets + (float("inf"),), series[:len(self.buckets)] + [series[-1]]):
+                    le = f'le="{_format_value(float(bound))}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(float(series[-2]))}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Values read from ``callback`` at scrape time: ``[(label_values, value), ...]``."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...],
+                 callback: Callable[[], Iterable[Tuple[Tuple, float]]], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in self.callback()]
+
+
+class MetricsRegistry:
+    """
+    A minimal Prometheus registry: counters and histograms updated in
+    place, plus callback metrics that read existing ``stats()`` dicts when
+    scraped. ``render`` produces the text exposition format (version 0.0.4).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, labels: Tuple[str, ...],
+              callback: Callable[[], Iterable[Tuple[Tuple, float]]], kind: str = "gauge") -> Gauge:
+        """Register a callback metric; ``kind="counter"`` for totals kept elsewhere."""
+        with self._lock:
+            self._metrics[name] = Gauge(name, documentation, labels, callback, kind)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Metric {metric.name} failed to collect: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Duration of each request pipeline stage.", ("stage", "status")
+)
+OPERATION_SECONDS = REGISTRY.histogram(
+    "operation_duration_seconds", "Duration of instrumented LLM, database and visualization calls.",
+    ("operation", "outcome")
+)
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "llm_queue_wait_seconds", "Time LLM calls waited for rate-limit admission.", ("priority",)
+)
+DB_CHECKOUT_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a database connection from a pool, including opening one.",
+    ("pool",)
+)
+DB_CHECKOUT_TIMEOUTS = REGISTRY.counter(
+    "db_pool_checkout_timeouts_total", "Connection checkouts that gave up after the pool timeout.", ("pool",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "LLM tokens reported in provider response metadata.", ("type",)
+)
+
+
+def new_trace(incoming: Optional[str] = None) -> str:
+    """Start a trace for the current request (reusing a client-supplied id) and reset its usage."""
+    value = (incoming or uuid.uuid4().hex[:16])[:64]
+    trace_id.set(value)
+    begin_usage()
+    return value
+
+
+def begin_usage() -> Dict[str, int]:
+    """Start counting tokens for the current task and the tasks it creates."""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    request_usage.set(usage)
+    return usage
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int):
+    """Count tokens reported by the provider, process-wide and for the current request."""
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, type="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, type="completion")
+    usage = request_usage.get()
+    if usage is not None:
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+        usage["total_tokens"] += prompt_tokens + completion_tokens
+
+
+def current_usage() -> Dict[str, int]:
+    return dict(request_usage.get() or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+
+
+def timed(operation: str):
+    """
+    Decorator recording a function's duration in ``operation_duration_seconds``.
+
+    Works on plain functions, coroutines and async generators (timed until
+    the generator is exhausted or closed); ``outcome`` is ``ok`` or ``error``.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started, outcome = time.perf_counter(), "error"
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+        elif inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started, outcome = time.perf_counter(), "error"
+                try:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                    outcome = "ok"
+                finally:
+                    OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started, outcome = time.perf_counter(), "error"
+                try:
+                    result = func(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    OPERATION_SECONDS.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+        return wrapper
+    return decorator
+
+
+def install_log_context():
+    """Give every log record a ``trace_id`` attribute so formats can include ``%(trace_id)s``."""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, "adds_trace_id", False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.trace_id = trace_id.get()
+        return record
+
+    record_factory.adds_trace_id = True
+    logging.setLogRecordFactory(record_factory)
+
+
+install_log_context()
@@ -0,0 +1,79 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, unify quotes, collapse whitespace and drop trailing punctuation."""
+    normalized = question.lower().replace("’", "'").replace("“", '"').replace("”", '"')
+    normalized = re.sub(r"\s+", " ", normalized).strip()
+    return normalized.rstrip("?.! ")
+
+
+class QueryCache:
+    """
+    Bounded LRU/TTL cache of validated SQL keyed by question and schema fingerprint.
+
+    Entries are only added once the SQL has executed successfully and should be
+    evicted by the caller as soon as a cached query fails, so the cache never
+    keeps serving SQL the database rejects.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(question: str, fingerprint: str):
+        return (normalize_question(question), fingerprint)
+
+    def get(self, question: str, fingerprint: str) -> Optional[str]:
+        """Return the cached SQL for ``question`` under ``fingerprint``, if still fresh."""
+        key = self.make_key(question, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, question: str, fingerprint: str, sql: str):
+        """Store SQL that has just executed successfully."""
+        key = self.make_key(question, fingerprint)
+        with self._lock:
+            self._entries[key] = (sql, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def evict(self, question: str, fingerprint: str):
+        """Drop the entry for ``question``, e.g. after its SQL failed."""
+        with self._lock:
+            if self._entries.pop(self.make_key(question, fingerprint), None) is not None:
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,161 @@
+import re
+import threading
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import text
+from my_agents.SQLValidator import TOKEN_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# MySQL error codes for a statement stopped by MAX_EXECUTION_TIME / KILL QUERY.
+ER_QUERY_TIMEOUT = 3024
+ER_QUERY_INTERRUPTED = 1317
+
+# A LIMIT stops a scan early only when every row read can be returned: one table,
+# nothing filtered, joined, sorted, grouped or de-duplicated.
+EARLY_STOP_BLOCKERS = re.compile(
+    r"\b(where|join|straight_join|order\s+by|group\s+by|distinct|having|union)\b|\(\s*select\b",
+    re.IGNORECASE
+)
+AGGREGATE_CALL = re.compile(r"\b(count|sum|avg|min|max|group_concat)\s*\(", re.IGNORECASE)
+SINGLE_TABLE_SCAN = re.compile(r"^\s*select\b.*?\bfrom\s+[^,()]+?\s+limit\s+\d+(\s*(,|offset)\s*\d+)?\s*$",
+                               re.IGNORECASE | re.DOTALL)
+
+
+def with_time_limit(query: str, timeout_ms: int) -> str:
+    """Add a ``MAX_EXECUTION_TIME`` optimizer hint to the top-level SELECT of ``query``."""
+    depth = 0
+    position = 0
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if match is None:
+            position += 1
+            continue
+        value = match.group()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif depth == 0 and match.lastgroup == "word" and value.lower() == "select":
+            return f"{query[:match.end()]} /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{query[match.end():]}"
+        position = match.end()
+    return query
+
+
+class QueryRejectedError(Exception):
+    """Raised when EXPLAIN estimates a query would examine too many rows."""
+
+
+class QueryTimeoutError(Exception):
+    """Raised when MySQL stops a query at its execution time limit."""
+
+
+class QueryCancelledError(Exception):
+    """Raised when a running query was killed because its client went away."""
+
+
+@dataclass
+class QueryHandle:
+    """Identifies the server connection running a query so it can be killed."""
+    connection_id: Optional[int] = None
+    cancelled: bool = False
+    # Name of the pool (primary or replica) whose server runs the query.
+    pool: Optional[str] = None
+
+
+class QueryGovernor:
+    """
+    Guards execution of LLM-generated SQL on MySQL.
+
+    Before running a query it asks ``EXPLAIN`` for the estimated rows examined
+    and rejects queries over ``max_estimated_rows`` unless they can stop early
+    (a LIMIT over a single table with no WHERE, JOIN, ORDER BY, GROUP BY,
+    DISTINCT or aggregate). ``prepare`` adds a ``MAX_EXECUTION_TIME`` hint to
+    the statement, and ``cancel`` issues ``KILL QUERY`` for a handle whose
+    client disconnected. Counters for
+    rejected, timed-out and cancelled queries are available from ``stats``.
+    """
+
+    def __init__(self, max_estimated_rows: int = 5_000_000, timeout_ms: int = 10_000):
+        self.max_estimated_rows = max_estimated_rows
+        self.timeout_ms = timeout_ms
+        self._lock = threading.Lock()
+        self.counters = {"explained": 0, "rejected": 0, "timed_out": 0, "cancelled": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def applies_to(connection) -> bool:
+        return connection.dialect.name == "mysql"
+
+    def estimate_rows(self, connection, query: str) -> int:
+        """Estimated rows examined: product of ``rows`` per SELECT id, summed over ids."""
+        per_select = defaultdict(lambda: 1)
+        for row in connection.execute(text(f"EXPLAIN {query}")).mappings():
+            rows = row.get("rows")
+            if rows is not None:
+                per_select[row.get("id")] *= max(1, int(rows))
+        self._count("explained")
+        return sum(per_select.values()) if per_select else 0
+
+    @staticmethod
+    def can_stop_early(query: str) -> bool:
+        return bool(SINGLE_TABLE_SCAN.match(query)) and not EARLY_STOP_BLOCKERS.search(query) \
+            and not AGGREGATE_CALL.search(query)
+
+    def check(self, connection, query: str):
+        """Raise ``QueryRejectedError`` if the plan is too expensive."""
+        estimated = self.estimate_rows(connection, query)
+        if estimated > self.max_estimated_rows and not self.can_stop_early(query):
+            self._count("rejected")
+            logger.warning(f"Rejected query, estimated {estimated} rows examined: {query[:200]}")
+            raise QueryRejectedError(
+                f"Query would examine about {estimated:,} rows (limit {self.max_estimated_rows:,}); "
+                "add a more selective filter or aggregate."
+            )
+        return estimated
+
+    @staticmethod
+    def connection_id(connection) -> int:
+        """Server id of ``connection``, looked up once per pooled DBAPI connection."""
+        # ``info`` lives as long as the DBAPI connection and is cleared when it is replaced.
+        if "connection_id" not in connection.info:
+            connection.info["connection_id"] = connection.execute(text("SELECT CONNECTION_ID()")).scalar()
+        return connection.info["connection_id"]
+
+    def prepare(self, connection, query: str, handle: Optional[QueryHandle] = None) -> str:
+        """Record the connection id on ``handle`` and return ``query`` with its execution time limit."""
+        if handle is not None:
+            handle.connection_id = self.connection_id(connection)
+        return with_time_limit(query, self.timeout_ms)
+
+    def translate_error(self, error: Exception, handle: Optional[QueryHandle] = None) -> Exception:
+        """Map MySQL timeout/interrupt errors onto governor exceptions and count them."""
+        errno = getattr(getattr(error, "orig", None), "errno", None)
+        if errno == ER_QUERY_TIMEOUT or "maximum statement execution time exceeded" in str(error).lower():
+            self._count("timed_out")
+            return QueryTimeoutError(f"Query exceeded the {self.timeout_ms} ms execution limit")
+        if errno == ER_QUERY_INTERRUPTED and handle is not None and handle.cancelled:
+            return QueryCancelledError("Query was cancelled because the client disconnected")
+        return error
+
+    def cancel(self, engine, handle: QueryHandle):
+        """Kill the server-side query identified by ``handle`` from a separate connection."""
+        if handle.connection_id is None or handle.cancelled:
+            return
+        handle.cancelled = True
+        try:
+            with engine.connect() as connection:
+                connection.execute(text(f"KILL QUERY {int(handle.connection_id)}"))
+            self._count("cancelled")
+            logger.info(f"Killed query on connection {handle.connection_id}")
+        except Exception as e:
+            logger.warning(f"Could not kill query on connection {handle.connection_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
@@ -0,0 +1,156 @@
+import re
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Rough per-row and per-value overhead of Python tuples/objects, used for the memory bound.
+ROW_OVERHEAD = 56
+VALUE_OVERHEAD = 16
+# Results of queries calling these depend on more than table contents.
+NONDETERMINISTIC_PATTERN = re.compile(
+    r"\b(now|sysdate|curdate|curtime|unix_timestamp|rand|uuid|uuid_short|connection_id|"
+    r"last_insert_id|found_rows|user|current_user|database)\s*\(|"
+    r"\b(current_date|current_time|current_timestamp|localtime|localtimestamp|"
+    r"utc_date|utc_time|utc_timestamp)\b",
+    re.IGNORECASE,
+)
+
+
+def is_cacheable(sql: str) -> bool:
+    """False for queries whose result can change without any table changing."""
+    return not NONDETERMINISTIC_PATTERN.search(sql)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and drop a trailing semicolon so equivalent SQL shares a key."""
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+def estimate_result_bytes(result) -> int:
+    size = sys.getsizeof(result.columns)
+    for row in result.rows:
+        size += ROW_OVERHEAD
+        for value in row:
+            size += VALUE_OVERHEAD + (len(value) if isinstance(value, (str, bytes)) else 8)
+    return size
+
+
+class ResultCache:
+    """
+    Memory-bounded LRU cache of query results with table-level invalidation.
+
+    Entries are keyed by normalized SQL and remember the version of every table
+    the query read. Table versions come from ``version_probe`` (by default
+    ``information_schema.TABLES.UPDATE_TIME``), which is called at most once per
+    ``probe_interval`` seconds for all tables, so a burst of repeated dashboard
+    queries is answered without touching the database. An entry is dropped as
+    soon as any of its tables reports a different version.
+
+    Probing happens outside the cache lock, under a lock of its own: a slow
+    probe holds up only the lookups that need fresh versions, not misses,
+    stats or eviction.
+    """
+
+    def __init__(self,
+                 version_probe: Callable[[], Dict[str, object]],
+                 max_bytes: int = 64 * 1024 * 1024,
+                 probe_interval: float = 2.0):
+        self.version_probe = version_probe
+        self.max_bytes = max_bytes
+        self.probe_interval = probe_interval
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._versions: Dict[str, object] = {}
+        self._probed_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def table_versions(self) -> Dict[str, object]:
+        """Current table versions, re-probed at most every ``probe_interval`` seconds."""
+        with self._probe_lock:
+            now = time.monotonic()
+            if now - self._probed_at >= self.probe_interval:
+                try:
+                    versions = {name.lower(): version for name, version in self.version_probe().items()}
+                except Exception as e:
+                    logger.warning(f"Table version probe failed, bypassing result cache: {e}")
+                    versions = {}
+                self._versions = versions
+                self._probed_at = now
+            return self._versions
+
+    def get(self, sql: str):
+        """Return the cached result for ``sql`` if none of its tables changed, else ``None``."""
+        key = normalize_sql(sql)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+        versions = self.table_versions()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            result, tables, cached_versions, size = entry
+            if any(t not in versions or versions[t] != cached_versions[t] for t in tables):
+                del self._entries[key]
+                self._bytes -= size
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, sql: str, tables: Sequence[str], result):
+        """Cache ``result`` for ``sql``, which read ``tables``."""
+        size = estimate_result_bytes(result)
+        if size > self.max_bytes:
+            return
+        key = normalize_sql(sql)
+        tables = [t.lower() for t in tables]
+        versions = self.table_versions()
+        if not tables or any(t not in versions for t in tables):
+            return  # cannot tell when it would go stale
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[3]
+            self._entries[key] = (result, tables, {t: versions[t] for t in tables}, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[3]
+                self.evictions += 1
+
+    def invalidate_tables(self, tables: Optional[Sequence[str]] = None):
+        """Drop entries reading any of ``tables`` (all entries when ``None``)."""
+        with self._lock:
+            wanted = {t.lower() for t in tables} if tables is not None else None
+            for key in list(self._entries):
+                if wanted is None or wanted & set(self._entries[key][1]):
+                    self._bytes -= self._entries.pop(key)[3]
+                    self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,116 @@
+import json
+from decimal import Decimal
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from my_agents.SchemaRetriever import estimate_tokens
+
+
+def _to_jsonable(value):
+    """Make numpy/pandas/Decimal/datetime values JSON serialisable."""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if hasattr(value, "item"):
+        try:
+            value = value.item()
+        except (TypeError, ValueError):
+            pass
+        if isinstance(value, (str, bool, int, float)):
+            return value
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def dumps_rows(rows: List[Dict[str, Any]], indent=None) -> str:
+    return json.dumps(rows, indent=indent, default=str)
+
+
+class ResultDigest:
+    """
+    Compact, token-budgeted description of a query result for the summary prompt.
+
+    When the raw rows fit in ``token_budget`` they are sent as-is. Otherwise the
+    digest carries the row count, per-column dtype, numeric min/max/mean and
+    quantiles, the top-k values of categorical columns and a small sample of
+    rows spread across the result, trimmed until it fits the budget.
+    """
+
+    def __init__(self, token_budget: int = 1500, top_k: int = 5, sample_rows: int = 5):
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.sample_rows = sample_rows
+
+    def describe_column(self, series: pd.Series, top_k: int) -> Dict[str, Any]:
+        info = {"dtype": str(series.dtype), "nulls": int(series.isna().sum())}
+        is_text = pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+        numeric = pd.to_numeric(series, errors="coerce") if is_text else series
+        if pd.api.types.is_numeric_dtype(numeric) and not pd.api.types.is_bool_dtype(numeric) \
+                and numeric.notna().sum() > 0 and numeric.notna().sum() >= series.notna().sum() * 0.9:
+            quantiles = numeric.quantile([0.25, 0.5, 0.75])
+            info.update({
+                "min": _to_jsonable(numeric.min()),
+                "max": _to_jsonable(numeric.max()),
+                "mean": round(float(numeric.mean()), 4),
+                "p25": _to_jsonable(quantiles.loc[0.25]),
+                "median": _to_jsonable(quantiles.loc[0.5]),
+                "p75": _to_jsonable(quantiles.loc[0.75]),
+            })
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            info.update({"min": str(series.min()), "max": str(series.max())})
+        else:
+            counts = series.astype(str).value_counts()
+            info["distinct"] = int(counts.size)
+            info["top_values"] = {k: int(v) for k, v in counts.head(top_k).items()}
+        return info
+
+    def sample(self, df: pd.DataFrame, n: int) -> List[Dict[str, Any]]:
+        """Evenly spaced rows, always including the first and last."""
+        if len(df) <= n:
+            picked = df
+        else:
+            step = (len(df) - 1) / max(1, n - 1)
+            picked = df.iloc[sorted({round(i * step) for i in range(n)})]
+        return [{k: _to_jsonable(v) for k, v in row.items()} for row in picked.to_dict(orient="records")]
+
+    def build(self, result: List[Dict[str, Any]]) -> str:
+        """
+        Return the text to send as ``Data`` in the summary prompt.
+
+        Parameters:
+        -----------
+        result : list of dict
+            Query rows as dictionaries
+
+        Returns:
+        --------
+        str
+            Full rows as JSON when they fit the budget, otherwise a JSON digest
+        """
+        full = dumps_rows(result, indent=2)
+        if estimate_tokens(full) <= self.token_budget:
+            return full
+
+        df = pd.DataFrame(result)
+        columns = {col: self.describe_column(df[col], self.top_k) for col in df.columns}
+        top_k, sample_rows = self.top_k, self.sample_rows
+        while True:
+            digest = {
+                "note": "Result too large to send in full; this is a statistical digest.",
+                "row_count": len(df),
+                "columns": {
+                    col: {**info, "top_values": dict(list(info["top_values"].items())[:top_k])}
+                    if "top_values" in info else info
+                    for col, info in columns.items()
+                },
+                "sample_rows": self.sample(df, sample_rows) if sample_rows else [],
+            }
+            text = json.dumps(digest, default=str)
+            if estimate_tokens(text) <= self.token_budget or (top_k <= 1 and sample_rows == 0):
+                return text
+            # Shrink the sample first, then the categorical top-k lists.
+            if sample_rows:
+                sample_rows -= 1
+            else:
+                top_k -= 1
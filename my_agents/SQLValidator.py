@@ -0,0 +1,400 @@
+import re
+from typing import Any, Dict, List, Optional, Set
+
+# Single pass tokenizer: comments, strings, quoted identifiers, numbers, words, punctuation.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<number>\d+(?:\.\d+)?(?:e[+-]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><=>|<=|>=|<>|!=|\|\||&&|:=|[-+*/%=<>!(),.;@~^&|])
+  | (?P<space>\s+)
+""", re.VERBOSE | re.DOTALL | re.IGNORECASE)
+
+WRITE_KEYWORDS = {
+    "insert", "update", "delete", "drop", "alter", "create", "truncate", "replace", "grant",
+    "revoke", "rename", "call", "load", "handler", "lock", "unlock", "set", "do", "merge",
+    "outfile", "dumpfile", "into", "execute", "prepare", "deallocate", "kill", "shutdown",
+    "flush", "reset", "purge", "install", "uninstall", "use", "analyze", "optimize", "repair",
+}
+DANGEROUS_FUNCTIONS = {"sleep", "benchmark", "load_file", "get_lock", "release_lock", "sys_exec", "sys_eval"}
+CLAUSE_KEYWORDS = {
+    "where", "group", "order", "having", "limit", "union", "on", "using", "join", "inner", "left",
+    "right", "full", "outer", "cross", "natural", "straight_join", "window", "for", "lock", "into",
+    "except", "intersect",
+}
+AGGREGATE_FUNCTIONS = {"count", "sum", "avg", "min", "max", "group_concat", "std", "stddev", "variance"}
+# Words that may appear bare in a SELECT without being a column reference.
+KEYWORDS = {
+    "select", "distinct", "all", "from", "where", "and", "or", "not", "xor", "as", "on", "using",
+    "join", "inner", "left", "right", "full", "outer", "cross", "natural", "group", "by", "order",
+    "asc", "desc", "having", "limit", "offset", "union", "intersect", "except", "in", "is", "null",
+    "like", "regexp", "rlike", "between", "exists", "case", "when", "then", "else", "end", "true",
+    "false", "unknown", "with", "recursive", "interval", "div", "mod", "escape", "binary", "collate",
+    "over", "partition", "rows", "range", "preceding", "following", "unbounded", "current", "row",
+    "separator", "any", "some", "rollup", "window", "lateral", "straight_join", "sql_no_cache",
+    "sql_calc_found_rows", "high_priority", "signed", "unsigned", "char", "decimal", "date",
+    "datetime", "time", "timestamp", "year", "month", "week", "day", "hour", "minute", "second",
+    "quarter", "microsecond", "current_date", "current_time", "current_timestamp", "localtime",
+    "localtimestamp", "utc_date", "utc_time", "utc_timestamp", "integer", "int", "float", "double",
+    "json", "nulls", "first", "last", "mode", "share", "for", "of", "nowait", "skip", "locked",
+    "leading", "trailing", "both", "character", "charset",
+}
+# Character sets named bare in CONVERT(x USING utf8mb4) or _utf8mb4'...' casts.
+CHARSETS = {
+    "utf8", "utf8mb3", "utf8mb4", "latin1", "ascii", "ucs2", "utf16", "utf16le", "utf32", "cp1250",
+    "cp1251", "cp1252", "gbk", "gb2312", "gb18030", "big5", "sjis", "euckr", "binary",
+}
+
+
+class UnsafeQueryError(ValueError):
+    """Raised when a query fails local validation; ``validation`` holds the result dict."""
+
+    def __init__(self, validation: Dict[str, Any]):
+        super().__init__("; ".join(validation["issues"]) or "Query failed validation")
+        self.validation = validation
+
+
+def tokenize_sql(sql: str) -> List[tuple]:
+    """Return ``(kind, value)`` tokens, dropping whitespace; unknown characters become ``op``."""
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            tokens.append(("op", sql[position]))
+            position += 1
+            continue
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "quoted":
+            kind, value = "word", value[1:-1].replace("``", "`")
+        if kind != "space":
+            tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+def strip_trailing_comments(sql: str) -> str:
+    """``sql`` without the comments and whitespace after its last token."""
+    end = 0
+    position = 0
+    while position < len(sql):
+        match = TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            position += 1
+            end = position
+            continue
+        if match.lastgroup not in ("comment", "space"):
+            end = match.end()
+        position = match.end()
+    return sql[:end]
+
+
+class SQLValidator:
+    """
+    Local, parser-based safety check for LLM-generated SQL.
+
+    Accepts a single read-only ``SELECT`` (optionally with CTEs), checks that the
+    referenced tables and qualified columns exist in the cached schema, and
+    rejects cross joins and queries without a top-level ``LIMIT`` or aggregate.
+    Returns the same ``is_valid``/``issues``/``risk_level`` structure as the old
+    LLM validator.
+    """
+
+    def __init__(self, schema: Optional[dict] = None):
+        self.tables: Dict[str, Set[str]] = {}
+        self.all_columns: Set[str] = set()
+        for table, columns in (schema or {}).items():
+            names = {(c["name"] if isinstance(c, dict) else c).lower() for c in columns}
+            self.tables[table.lower()] = names
+            self.all_columns |= names
+
+    def validate(self, sql: str, require_limit: bool = True) -> Dict[str, Any]:
+        issues: List[str] = []
+        high = False
+
+        tokens = tokenize_sql(sql or "")
+        if any(kind == "comment" and value.startswith("/*!") for kind, value in tokens):
+            issues.append("Executable comments are not allowed")
+            high = True
+        tokens = [t for t in tokens if t[0] != "comment"]
+
+        if not tokens:
+            return {"is_valid": False, "issues": ["Query is empty"], "risk_level": "high"}
+
+        # Exactly one statement, optionally terminated by a semicolon.
+        semicolons = [i for i, t in enumerate(tokens) if t == ("op", ";")]
+        if semicolons and semicolons != [len(tokens) - 1]:
+            issues.append("Multiple statements are not allowed")
+            high = True
+        tokens = [t for t in tokens if t != ("op", ";")]
+
+        words = [(i, v.lower()) for i, (k, v) in enumerate(tokens) if k == "word"]
+        first = tokens[0][1].lower() if tokens[0][0] == "word" else ""
+        if first not in ("select", "with"):
+            issues.append("Only SELECT queries are allowed")
+            high = True
+
+        for i, word in words:
+            is_call = self._next(tokens, i) == ("op", "(")
+            # REPLACE(), INSERT() etc. are also string functions; only the bare keyword is a write.
+            if word in WRITE_KEYWORDS and not is_call and not self._is_qualified(tokens, i):
+                issues.append(f"Forbidden keyword: {word.upper()}")
+                high = True
+            if word in DANGEROUS_FUNCTIONS and is_call:
+                issues.append(f"Forbidden function: {word.upper()}")
+                high = True
+            if word == "share" and i > 0 and tokens[i - 1][1].lower() == "in":
+                issues.append("Locking reads are not allowed")
+                high = True
+
+        if high:
+            return {"is_valid": False, "issues": self._dedupe(issues), "risk_level": "high"}
+
+        tables, aliases, derived = self._collect_tables(tokens)
+        issues.extend(self._check_tables(tables))
+        issues.extend(self._check_joins(tokens))
+        issues.extend(self._check_columns(tokens, tables, aliases, derived))
+        if require_limit and not self._is_bounded(tokens):
+            issues.append("Query has no LIMIT and no aggregate; it could return the whole table")
+
+        issues = self._dedupe(issues)
+        return {
+            "is_valid": not issues,
+            "issues": issues,
+            "risk_level": "medium" if issues else "low"
+        }
+
+    def referenced_tables(self, sql: str) -> List[str]:
+        """Real tables read by ``sql`` (CTEs and derived tables excluded), lowercased."""
+        tokens = [t for t in tokenize_sql(sql or "") if t[0] != "comment" and t != ("op", ";")]
+        tables, _, _ = self._collect_tables(tokens)
+        return sorted(set(tables))
+
+    @staticmethod
+    def _dedupe(issues: List[str]) -> List[str]:
+        return list(dict.fromkeys(issues))
+
+    @staticmethod
+    def _next(tokens, i):
+        return tokens[i + 1] if i + 1 < len(tokens) else None
+
+    @staticmethod
+    def _is_qualified(tokens, i) -> bool:
+        """True when the word is part of ``a.word``, i.e. used as an identifier."""
+        return i > 0 and tokens[i - 1] == ("op", ".")
+
+    def _collect_tables(self, tokens):
+        """Find table references after FROM/JOIN, plus their aliases and CTE/derived names."""
+        tables: List[str] = []
+        aliases: Dict[str, Optional[str]] = {}
+        derived: Set[str] = set()
+
+        # CTE names: WITH name AS ( ... ), name AS ( ... )
+        for i, (kind, value) in enumerate(tokens):
+            if kind == "word" and self._next(tokens, i) and self._next(tokens, i)[1].lower() == "as" \
+                    and i + 2 < len(tokens) and tokens[i + 2] == ("op", "(") \
+                    and i > 0 and (tokens[i - 1][1].lower() in ("with", "recursive") or tokens[i - 1] == ("op", ",")):
+                derived.add(value.lower())
+
+        # One entry per open parenthesis: True once a SELECT starts inside it. A FROM
+        # only starts a table list at the level of its own SELECT, not inside a call
+        # such as EXTRACT(year FROM d) or TRIM(LEADING 'a' FROM name).
+        selects: List[bool] = []
+        for i, (kind, value) in enumerate(tokens):
+            if tokens[i] == ("op", "("):
+                selects.append(False)
+            elif tokens[i] == ("op", ")"):
+                if selects:
+                    selects.pop()
+            elif kind == "word":
+                lowered = value.lower()
+                if lowered == "select" and selects:
+                    selects[-1] = True
+                elif lowered in ("from", "join", "straight_join") and (not selects or selects[-1]):
+                    # Derived tables are read for their alias here; the scan still
+                    # walks into them, so the tables they read are collected too.
+                    self._read_table_refs(tokens, i + 1, lowered != "from", tables, aliases, derived)
+        return tables, aliases, derived
+
+    def _read_table_refs(self, tokens, i, single, tables, aliases, derived):
+        while i < len(tokens):
+            kind, value = tokens[i]
+            if tokens[i] == ("op", "("):
+                # Derived table or subquery: skip to the matching parenthesis, then read its alias.
+                depth = 0
+                while i < len(tokens):
+                    if tokens[i] == ("op", "("):
+                        depth += 1
+                    elif tokens[i] == ("op", ")"):
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    i += 1
+                i += 1
+                alias, i = self._read_alias(tokens, i)
+                if alias:
+                    derived.add(alias)
+                    aliases[alias] = None
+            elif kind == "word" and value.lower() not in CLAUSE_KEYWORDS:
+                name = value.lower()
+                if self._next(tokens, i) == ("op", "."):
+                    # schema.table: keep the table part
+                    i += 2
+                    name = tokens[i][1].lower() if i < len(tokens) else name
+                i += 1
+                alias, i = self._read_alias(tokens, i)
+                if name not in derived:
+                    tables.append(name)
+                aliases[name] = None if name in derived else name
+                if alias:
+                    aliases[alias] = None if name in derived else name
+            else:
+                return i
+            if single or i >= len(tokens) or tokens[i] != ("op", ","):
+                return i
+            i += 1
+        return i
+
+    @staticmethod
+    def _read_alias(tokens, i):
+        if i < len(tokens) and tokens[i][0] == "word" and tokens[i][1].lower() == "as":
+            i += 1
+        if i < len(tokens) and tokens[i][0] == "word" \
+                and tokens[i][1].lower() not in CLAUSE_KEYWORDS and tokens[i][1].lower() not in KEYWORDS:
+            return tokens[i][1].lower(), i + 1
+        return None, i
+
+    def _check_tables(self, tables: List[str]) -> List[str]:
+        if not self.tables:
+            return []
+        return [f"Unknown table: {t}" for t in tables if t not in self.tables]
+
+    def _check_joins(self, tokens) -> List[str]:
+        issues = []
+        lowered = [v.lower() if k == "word" else v for k, v in tokens]
+        for i, word in enumerate(lowered):
+            if word == "cross" and i + 1 < len(lowered) and lowered[i + 1] == "join":
+                issues.append("CROSS JOIN is not allowed")
+            if word == "join" and (i == 0 or lowered[i - 1] not in ("natural",)):
+                # A JOIN needs ON or USING before the next clause, otherwise it is a Cartesian product.
+                depth = 0
+                has_condition = False
+                for j in range(i + 1, len(lowered)):
+                    token = lowered[j]
+                    if token == "(":
+                        depth += 1
+                    elif token == ")":
+                        if depth == 0:
+                            break
+                        depth -= 1
+                    elif depth == 0 and token in ("on", "using"):
+                        has_condition = True
+                        break
+                    elif depth == 0 and token in CLAUSE_KEYWORDS - {"on", "using", "outer"}:
+                        break
+                if not has_condition:
+                    issues.append("JOIN without ON/USING produces a cross join")
+
+        # FROM a, b with no WHERE at the same nesting level is a Cartesian product.
+        depth = 0
+        for i, token in enumerate(lowered):
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth -= 1
+            elif token == "from":
+                level = depth
+                comma = False
+                has_where = False
+                inner = 0
+                for j in range(i + 1, len(lowered)):
+                    t = lowered[j]
+                    if t == "(":
+                        inner += 1
+                    elif t == ")":
+                        if inner == 0:
+                            break
+                        inner -= 1
+                    elif inner == 0 and t == ",":
+                        comma = True
+                    elif inner == 0 and t == "where":
+                        has_where = True
+                        break
+                    elif inner == 0 and t in ("group", "order", "having", "limit", "union"):
+                        break
+                if comma and not has_where:
+                    issues.append("Comma join without WHERE produces a cross join")
+                depth = level
+        return issues
+
+    def _check_columns(self, tokens, tables, aliases, derived) -> List[str]:
+        if not self.tables:
+            return []
+        issues = []
+        select_aliases = set()
+        for i, (kind, value) in enumerate(tokens):
+            if kind == "word" and value.lower() == "as" and i + 1 < len(tokens) and tokens[i + 1][0] in ("word", "string"):
+                select_aliases.add(tokens[i + 1][1].strip("'\"").lower())
+            elif kind == "word" and i > 0 and (tokens[i - 1] == ("op", ")") or tokens[i - 1][0] in ("string", "number")) \
+                    and value.lower() not in KEYWORDS and value.lower() not in CLAUSE_KEYWORDS:
+                # Implicit alias such as ``count(*) total``.
+                select_aliases.add(value.lower())
+
+        known_tables = set(aliases) | set(self.tables) | derived
+        for i, (kind, value) in enumerate(tokens):
+            if kind != "word":
+                continue
+            word = value.lower()
+            nxt = self._next(tokens, i)
+            if nxt == ("op", "."):
+                continue  # qualifier, checked with its column below
+            if self._is_qualified(tokens, i):
+                qualifier = tokens[i - 2][1].lower() if i >= 2 else ""
+                table = aliases.get(qualifier, qualifier if qualifier in self.tables else None)
+                if table and table in self.tables and word not in self.tables[table]:
+                    issues.append(f"Unknown column: {qualifier}.{word}")
+                continue
+            if nxt == ("op", "(") or word in KEYWORDS or word in CLAUSE_KEYWORDS or word in CHARSETS:
+                continue
+            if word in known_tables or word in select_aliases:
+                continue
+            # Only flag names that are not a column anywhere in the schema, so a
+            # legitimate query is never blocked by a parsing blind spot.
+            if word not in self.all_columns and not derived:
+                issues.append(f"Unknown column: {word}")
+        return issues
+
+    def _is_bounded(self, tokens) -> bool:
+        """True when the outermost query has a LIMIT or aggregates its rows."""
+        depth = 0
+        has_group = False
+        for i, (kind, value) in enumerate(tokens):
+            if tokens[i] == ("op", "("):
+                depth += 1
+            elif tokens[i] == ("op", ")"):
+                depth -= 1
+            elif depth == 0 and kind == "word":
+                word = value.lower()
+                if word == "limit":
+                    return True
+                if word == "group":
+                    has_group = True
+        if has_group:
+            return False
+        # A top-level aggregate without GROUP BY returns a single row.
+        depth = 0
+        for i, (kind, value) in enumerate(tokens):
+            if tokens[i] == ("op", "("):
+                depth += 1
+            elif tokens[i] == ("op", ")"):
+                depth -= 1
+            elif depth == 0 and kind == "word":
+                word = value.lower()
+                if word == "from":
+                    break
+                if word in AGGREGATE_FUNCTIONS and self._next(tokens, i) == ("op", "("):
+                    return True
+        return False
@@ -0,0 +1,131 @@
+import hashlib
+import threading
+import time
+from sqlalchemy import inspect, text
+
+# One round trip for the whole schema instead of SHOW TABLES + SHOW COLUMNS per table.
+COLUMNS_QUERY = text("""
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY, COLUMN_COMMENT
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+""")
+
+# Single-row probe that changes whenever a table, column or column type changes.
+PROBE_QUERY = text("""
+    SELECT COUNT(*),
+           COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE))), 0)
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+""")
+
+
+def compute_fingerprint(schema):
+    """Hash table names, column names and column types into a short stable id."""
+    digest = hashlib.sha256()
+    for table in sorted(schema):
+        for column in sorted(schema[table], key=lambda c: c["name"]):
+            digest.update(f"{table}.{column['name']}:{column['type']}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def format_schema_for_prompt(schema):
+    """Render a detailed schema as one ``table(column type KEY, ...)`` line per table."""
+    lines = []
+    for table, columns in schema.items():
+        parts = []
+        for column in columns:
+            part = f"{column['name']} {column['type']}"
+            if column.get("key"):
+                part += f" {column['key']}"
+            parts.append(part)
+        lines.append(f"{table}({', '.join(parts)})")
+    return "\n".join(lines)
+
+
+class SchemaCache:
+    """
+    Keeps the column-level schema of the connected database in memory.
+
+    The full schema is loaded with a single ``information_schema.COLUMNS`` query.
+    After that, at most once every ``check_interval`` seconds a one-row checksum
+    probe is run and the schema is only reloaded when that checksum moves.
+    """
+
+    def __init__(self, engine, check_interval=30.0):
+        self.engine = engine
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._schema = None
+        self._probe = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+
+    def _run_probe(self, connection):
+        if connection.dialect.name != "mysql":
+            schema = self._inspect(connection)
+            return (sum(len(columns) for columns in schema.values()), compute_fingerprint(schema))
+        row = connection.execute(PROBE_QUERY).fetchone()
+        return (int(row[0]), int(row[1]))
+
+    def _inspect(self, connection):
+        """Schema of a non-MySQL database (e.g. the SQLite benchmark fixture) from the SQLAlchemy inspector."""
+        inspector = inspect(connection)
+        schema = {}
+        for table in inspector.get_table_names():
+            primary = set(inspector.get_pk_constraint(table).get("constrained_columns") or [])
+            schema[table] = [{
+                "name": column["name"],
+                "type": str(column["type"]).lower(),
+                "key": "PRI" if column["name"] in primary else "",
+                "comment": column.get("comment") or ""
+            } for column in inspector.get_columns(table)]
+        return schema
+
+    def _load(self, connection):
+        if connection.dialect.name != "mysql":
+            return self._inspect(connection)
+        schema = {}
+        for table, column, column_type, key, comment in connection.execute(COLUMNS_QUERY):
+            schema.setdefault(table, []).append({
+                "name": column,
+                "type": column_type,
+                "key": key or "",
+                "comment": comment or ""
+            })
+        return schema
+
+    def get(self):
+        """
+        Return the cached schema, refreshing it if the checksum probe says it changed.
+
+        Returns:
+        --------
+        dict
+            ``{table_name: [{"name", "type", "key", "comment"}, ...]}``
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._schema is not None and now - self._checked_at < self.check_interval:
+                return self._schema
+
+            with self.engine.connect() as connection:
+                probe = self._run_probe(connection)
+                if self._schema is None or probe != self._probe:
+                    self._schema = self._load(connection)
+                    self._fingerprint = compute_fingerprint(self._schema)
+                    self._probe = probe
+            self._checked_at = now
+            return self._schema
+
+    @property
+    def fingerprint(self):
+        """Fingerprint of the schema currently held in the cache."""
+        if self._fingerprint is None:
+            self.get()
+        return self._fingerprint
+
+    def invalidate(self):
+        """Force the next ``get`` to run the probe."""
+        with self._lock:
+            self._checked_at = 0.0
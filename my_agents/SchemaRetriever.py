@@ -0,0 +1,194 @@
+import math
+import re
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from my_agents.SchemaCache import format_schema_for_prompt
+
+logger = logging.getLogger(__name__)
+
+# Words that carry no signal about which table a question is about.
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "in", "on", "by", "to", "and", "or", "with", "from",
+    "is", "are", "was", "were", "be", "what", "which", "who", "whose", "how", "many",
+    "much", "show", "me", "list", "give", "get", "find", "all", "each", "per", "their",
+    "top", "bottom", "highest", "lowest", "most", "least", "than", "that", "this", "those",
+    "id", "please", "can", "you", "i", "we", "do", "does", "have", "has", "value", "values",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English and SQL identifiers)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def tokenize(text: str) -> List[str]:
+    """Split identifiers and prose into lowercase terms, breaking snake_case and camelCase."""
+    if not text:
+        return []
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    terms = []
+    for raw in re.split(r"[^A-Za-z0-9]+", text.lower()):
+        if not raw or raw in STOPWORDS:
+            continue
+        terms.append(raw)
+        # Crude plural folding so "students" matches "student".
+        if len(raw) > 3 and raw.endswith("s"):
+            terms.append(raw[:-1])
+    return terms
+
+
+@dataclass
+class RetrievalResult:
+    schema: Dict[str, list]
+    tables: List[str]
+    fallback: bool
+    full_tokens: int
+    prompt_tokens: int
+    scores: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.full_tokens - self.prompt_tokens)
+
+
+class SchemaRetriever:
+    """
+    Picks the tables and columns relevant to a question with a BM25 index.
+
+    Each table is one document made of its name (weighted up), its column
+    names and any column comments. The index is rebuilt only when the schema
+    fingerprint changes. When the best match is weak the full schema is
+    returned so SQL generation never loses context it actually needed.
+    """
+
+    def __init__(self,
+                 max_tables: int = 4,
+                 min_score: float = 0.8,
+                 max_columns: int = 15,
+                 table_name_weight: int = 3,
+                 k1: float = 1.5,
+                 b: float = 0.75):
+        self.max_tables = max_tables
+        self.min_score = min_score
+        self.max_columns = max_columns
+        self.table_name_weight = table_name_weight
+        self.k1 = k1
+        self.b = b
+        self._fingerprint = None
+        self._documents: Dict[str, Counter] = {}
+        self._doc_freq: Counter = Counter()
+        self._avg_len = 0.0
+        self._full_tokens = 0
+
+    def _build_index(self, schema: Dict[str, list], fingerprint: Optional[str]):
+        self._documents = {}
+        self._doc_freq = Counter()
+        for table, columns in schema.items():
+            terms = tokenize(table) * self.table_name_weight
+            for column in columns:
+                terms.extend(tokenize(column["name"]))
+                terms.extend(tokenize(column.get("comment", "")))
+            document = Counter(terms)
+            self._documents[table] = document
+            self._doc_freq.update(document.keys())
+        lengths = [sum(doc.values()) for doc in self._documents.values()]
+        self._avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+        self._full_tokens = estimate_tokens(format_schema_for_prompt(schema))
+        self._fingerprint = fingerprint
+
+    def score(self, question: str) -> Dict[str, float]:
+        """BM25 score of every indexed table against ``question``."""
+        query_terms = set(tokenize(question))
+        total_docs = len(self._documents)
+        scores = {}
+        for table, document in self._documents.items():
+            doc_len = sum(document.values())
+            score = 0.0
+            for term in query_terms:
+                tf = document.get(term, 0)
+                if not tf:
+                    continue
+                df = self._doc_freq[term]
+                idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * doc_len / (self._avg_len or 1))
+                score += idf * tf * (self.k1 + 1) / (tf + norm)
+            scores[table] = score
+        return scores
+
+    def _prune_columns(self, columns: list, query_terms: set) -> list:
+        if len(columns) <= self.max_columns:
+            return columns
+        kept = []
+        for column in columns:
+            terms = set(tokenize(column["name"])) | set(tokenize(column.get("comment", "")))
+            if column.get("key") or terms & query_terms:
+                kept.append(column)
+        # Top up with leading columns, which are usually names and identifiers.
+        for column in columns:
+            if len(kept) >= self.max_columns:
+                break
+            if column not in kept:
+                kept.append(column)
+        return [column for column in columns if column in kept]
+
+    def retrieve(self, question: str, schema: Dict[str, list], fingerprint: Optional[str] = None) -> RetrievalResult:
+        """
+        Return the schema subset to send with ``question``.
+
+        Parameters:
+        -----------
+        question : str
+            The user's question
+        schema : dict
+            Detailed schema as returned by ``DatabaseManager.get_schema_details``
+        fingerprint : str, optional
+            Schema fingerprint; the index is rebuilt when it changes
+
+        Returns:
+        --------
+        RetrievalResult
+            Pruned schema, chosen tables and the prompt tokens saved
+        """
+        if fingerprint is None or fingerprint != self._fingerprint or not self._documents:
+            self._build_index(schema, fingerprint)
+
+        scores = self.score(question)
+        ranked = sorted((t for t in scores if scores[t] > 0), key=lambda t: scores[t], reverse=True)
+
+        if not ranked or scores[ranked[0]] < self.min_score or len(ranked) >= len(schema):
+            result = RetrievalResult(schema, list(schema), True, self._full_tokens, self._full_tokens, scores)
+        else:
+            # Keep tables scoring within half of the best match, up to max_tables.
+            best = scores[ranked[0]]
+            tables = [t for t in ranked if scores[t] >= best * 0.5][:self.max_tables]
+            tables = self._add_join_partners(tables, schema)
+            query_terms = set(tokenize(question))
+            pruned = {t: self._prune_columns(schema[t], query_terms) for t in schema if t in tables}
+            prompt_tokens = estimate_tokens(format_schema_for_prompt(pruned))
+            result = RetrievalResult(pruned, list(pruned), False, self._full_tokens, prompt_tokens, scores)
+
+        logger.info(
+            f"Schema retrieval: tables={result.tables} fallback={result.fallback} "
+            f"prompt_tokens={result.prompt_tokens} tokens_saved={result.tokens_saved}"
+        )
+        return result
+
+    def _add_join_partners(self, tables: List[str], schema: Dict[str, list]) -> List[str]:
+        """Add tables whose primary key is referenced by a column of a selected table."""
+        selected = list(tables)
+        primary_keys = {
+            table: {c["name"] for c in columns if c.get("key") == "PRI"}
+            for table, columns in schema.items()
+        }
+        for table in tables:
+            referenced = {c["name"] for c in schema[table] if c.get("key") == "MUL"}
+            for other, keys in primary_keys.items():
+                if other in selected or len(selected) >= self.max_tables + 2:
+                    continue
+                singular = other[:-1] if other.endswith("s") else other
+                if referenced & keys or referenced & {f"{singular}_{key}" for key in keys}:
+                    selected.append(other)
+        return selected
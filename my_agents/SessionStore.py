@@ -0,0 +1,107 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_key(model: str, messages: List[Any]) -> str:
+    """
+    Stable id for a conversation whose client sent no ``conversation_id``:
+    the model plus the conversation's first user message, which every later
+    turn repeats.
+    """
+    first = next((m.content for m in messages if m.role == "user"), "")
+    return hashlib.sha256(f"{model}\n{first}".encode()).hexdigest()[:16]
+
+
+@dataclass
+class ConversationState:
+    """The last result of a conversation, kept so follow-ups can reuse it."""
+    frame: pd.DataFrame
+    sql: str
+    question: str
+    # Tables the SQL read, with their columns, in the SchemaCache shape.
+    schema: Dict[str, list] = field(default_factory=dict)
+    # Local refinements applied on top of ``sql`` (e.g. "top 3 by score").
+    refinements: List[str] = field(default_factory=list)
+    nbytes: int = 0
+    updated: float = 0.0
+
+
+class SessionStore:
+    """
+    Per-conversation store of the last result DataFrame, SQL and schema subset.
+
+    Bounded by ``max_sessions`` and by the frames' total ``max_bytes``
+    (measured with ``memory_usage(deep=True)``); the least recently used
+    conversations are evicted first, and entries idle for ``ttl`` seconds
+    expire. A frame larger than the whole budget is not stored.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 256 * 1024 * 1024, ttl: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.local_answers = 0
+
+    def _drop(self, key: str):
+        state = self._entries.pop(key)
+        self._bytes -= state.nbytes
+        self.evictions += 1
+
+    def get(self, key: str) -> Optional[ConversationState]:
+        with self._lock:
+            state = self._entries.get(key)
+            if state is not None and time.monotonic() - state.updated > self.ttl:
+                self._drop(key)
+                state = None
+            if state is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return state
+
+    def put(self, key: str, state: ConversationState):
+        state.nbytes = int(state.frame.memory_usage(deep=True).sum())
+        state.updated = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).nbytes
+            if state.nbytes > self.max_bytes:
+                logger.info(f"Not keeping a {state.nbytes}-byte result for conversation {key}")
+                return
+            self._entries[key] = state
+            self._bytes += state.nbytes
+            while len(self._entries) > self.max_sessions or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def record_local_answer(self):
+        with self._lock:
+            self.local_answers += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "local_answers": self.local_answers,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
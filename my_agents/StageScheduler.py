@@ -0,0 +1,133 @@
+import asyncio
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from my_agents.Metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageRecord:
+    name: str
+    deps: Tuple[str, ...]
+    speculative: bool
+    started: float
+    ended: Optional[float] = None
+    status: str = "running"
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.ended if self.ended is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+
+class StageScheduler:
+    """
+    Runs the stages of one request as asyncio tasks and records their timings.
+
+    Independent stages are started with ``start`` and run concurrently; a stage
+    that is only useful for one outcome (for example SQL generation while the
+    intent is still being decided) is started with ``speculative=True`` and
+    cancelled with ``cancel`` when it turns out not to be needed.
+    ``critical_path`` walks back from the last stage to finish through the
+    dependency that released it, which is the chain that set the latency.
+    """
+
+    def __init__(self):
+        self.created = time.perf_counter()
+        self.stages: Dict[str, StageRecord] = {}
+
+    def start(self, name: str, func: Callable[..., Awaitable], deps: Tuple[str, ...] = (),
+              speculative: bool = False) -> asyncio.Task:
+        """
+        Schedule stage ``name`` and return its task.
+
+        ``func`` is called with the results of ``deps`` (in order) once they
+        have all finished, so a stage's timing starts when it can actually run.
+        """
+        record = StageRecord(name, tuple(deps), speculative, time.perf_counter())
+        dep_tasks = [self.stages[d].task for d in deps]
+
+        async def runner():
+            dep_results = [await task for task in dep_tasks]
+            record.started = time.perf_counter()
+            try:
+                result = await func(*dep_results)
+                record.status = "done"
+                return result
+            except Exception:
+                record.status = "failed"
+                raise
+            finally:
+                record.ended = time.perf_counter()
+
+        record.task = asyncio.ensure_future(runner())
+        record.task.add_done_callback(lambda task: self._on_done(record, task))
+        self.stages[name] = record
+        return record.task
+
+    def _on_done(self, record: StageRecord, task: asyncio.Task):
+        if record.ended is None:
+            record.ended = time.perf_counter()
+        if task.cancelled():
+            record.status = "cancelled"
+        elif task.exception() is not None:
+            # Speculative stages may never be awaited; reading the exception
+            # here keeps asyncio from warning about it.
+            record.status = "failed"
+        STAGE_SECONDS.observe(record.duration_ms / 1000, stage=record.name, status=record.status)
+
+    async def run(self, name: str, func: Callable[..., Awaitable], deps: Tuple[str, ...] = ()):
+        """Run stage ``name`` and wait for its result."""
+        return await self.start(name, func, deps)
+
+    def cancel(self, *names: str):
+        """Cancel unfinished stages, e.g. speculative work that is no longer needed."""
+        for name in names:
+            record = self.stages.get(name)
+            if record is not None and record.task is not None and not record.task.done():
+                record.task.cancel()
+
+    def cancel_pending(self):
+        """Cancel every stage that is still running."""
+        self.cancel(*self.stages)
+
+    def critical_path(self) -> Tuple[float, List[str]]:
+        """Return the critical-path latency in milliseconds and the stages on it."""
+        finished = [r for r in self.stages.values() if r.status == "done" and r.ended is not None]
+        if not finished:
+            return 0.0, []
+        current = max(finished, key=lambda r: r.ended)
+        end = current.ended
+        path = [current.name]
+        while True:
+            deps = [self.stages[d] for d in current.deps
+                    if d in self.stages and self.stages[d].ended is not None]
+            if not deps:
+                break
+            current = max(deps, key=lambda r: r.ended)
+            path.append(current.name)
+        return (end - self.stages[path[-1]].started) * 1000, list(reversed(path))
+
+    def report(self) -> dict:
+        """Per-stage durations plus the critical path, suitable for logging or JSON."""
+        critical_ms, path = self.critical_path()
+        report = {
+            "total_ms": round((time.perf_counter() - self.created) * 1000, 1),
+            "critical_path_ms": round(critical_ms, 1),
+            "critical_path": path,
+            "stages": {
+                name: {
+                    "ms": round(record.duration_ms, 1),
+                    "status": record.status,
+                    "speculative": record.speculative
+                }
+                for name, record in self.stages.items()
+            }
+        }
+        logger.info(f"Pipeline timings: {report}")
+        return report
@@ -1,27 +1,43 @@
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from io import BytesIO
 import os
+import re
 import json
 import base64
+import asyncio
 import logging
 from my_agents.LLMHandler import LLMHandler
+from my_agents.ChartRecommender import ChartRecommender
+from my_agents.ChartRenderer import ChartRenderer, CHART_TYPES
+from my_agents.DataReducer import DataReducer
+from my_agents.ImageStore import ImageStore, chart_key
+from my_agents.Metrics import timed
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class VisualizationHandler:
-    """Handles data visualization using LLM suggestions and Seaborn."""
+    """Handles data visualization using rule-based chart recommendations and Seaborn."""
 
-    def __init__(self):
-        """Initialize LLM handler."""
+    def __init__(self, llm_handler: LLMHandler = None):
+        """
+        Initialize the chart rendering pool and the image store.
+
+        ``llm_handler`` should be the process's shared handler so the LLM
+        fallback goes through the same rate limits; one is created if omitted.
+        """
         try:
-            self.llm_handler = LLMHandler()
+            self.llm_handler = llm_handler or LLMHandler()
         except Exception as e:
             logger.error(f"Failed to initialize LLM handler: {str(e)}")
             raise
+        self.recommender = ChartRecommender()
+        # Ask the LLM only when the rules find nothing to chart, and only if enabled.
+        self.llm_fallback = os.getenv("VISUALIZATION_LLM_FALLBACK", "false").lower() in ("1", "true", "yes")
+        self.reducer = DataReducer()
+        self.renderer = ChartRenderer()
+        self.image_store = ImageStore()
+        self.image_url_prefix = os.getenv("IMAGE_URL_PREFIX", "/v1/images")
 
     def is_visualizable(self, df):
         """
@@ -58,90 +74,16 @@ class VisualizationHandler:
         # If we have at least some numeric data with multiple rows, we can visualize
         return True, "Dataframe is suitable for visualization"
 
-    def analyze_student_data(self, df, model_name="llama3"):
-        """
-        Analyzes a dataframe and returns appropriate visualizations.
-        
-        Parameters:
-        -----------
-        df : pandas.DataFrame
-            Dataframe containing data to visualize
-        model_name : str, optional
-            LLM model to use for analysis, default is 'llama3'
-            
-        Returns:
-        --------
-        dict
-            A dictionary containing visualization outputs and analysis
-        """
-        # First check if dataframe is visualizable
-        is_visual, reason = self.is_visualizable(df)
-        if not is_visual:
-            return {"error": reason, "visualizable": False}
-            
-        # Get dataframe information
+    def visualization_prompt(self, df):
+        """Build the chart recommendation prompt for ``df``."""
         df_info = {
             "columns": list(df.columns),
             "shape": df.shape,
-            "dtypes": {col: str(dtype) for col, dtype in zip(df.columns, df.dtypes)},
-            "sample": df.head(3).to_dict(orient='records'),
+            "sample": df.head(2).to_dict(orient='records'),
             "numeric_columns": list(df.select_dtypes(include=['number']).columns),
-            "categorical_columns": list(df.select_dtypes(include=['object', 'category']).columns),
-            "summary": df.describe().to_dict()
-        }
-        
-        # Define visualization templates for common plot types
-        templates = {
-            "bar_chart": """
-# Bar chart
-plt.figure(figsize=(10, 6))
-sns.barplot(x=df['{x_col}'], y=df['{y_col}'])
-plt.xlabel('{x_col}')
-plt.ylabel('{y_col}')
-if len(df) > 10:
-    plt.xticks(rotation=45)
-plt.tight_layout()
-""",
-            "line_chart": """
-# Line chart
-plt.figure(figsize=(10, 6))
-sns.lineplot(x=df['{x_col}'], y=df['{y_col}'])
-plt.xlabel('{x_col}')
-plt.ylabel('{y_col}')
-if len(df) > 10:
-    plt.xticks(rotation=45)
-plt.tight_layout()
-""",
-            "scatter_plot": """
-# Scatter plot
-plt.figure(figsize=(10, 6))
-sns.scatterplot(x=df['{x_col}'], y=df['{y_col}'])
-plt.xlabel('{x_col}')
-plt.ylabel('{y_col}')
-plt.tight_layout()
-""",
-            "histogram": """
-# Histogram
-plt.figure(figsize=(10, 6))
-sns.histplot(df['{x_col}'])
-plt.xlabel('{x_col}')
-plt.ylabel('Count')
-plt.tight_layout()
-""",
-            "boxplot": """
-# Box plot
-plt.figure(figsize=(10, 6))
-sns.boxplot(x=df['{x_col}'], y=df['{y_col}'])
-plt.xlabel('{x_col}')
-plt.ylabel('{y_col}')
-if len(df) > 10:
-    plt.xticks(rotation=45)
-plt.tight_layout()
-"""
+            "categorical_columns": list(df.select_dtypes(include=['object', 'string', 'category']).columns)
         }
-        
-        # Create a prompt for visualization recommendation
-        visualization_prompt = f"""
+        return f"""
         You are an expert data visualization advisor. Based on the following dataframe information,
         recommend up to 3 appropriate visualization types that would provide valuable insights.
         
@@ -150,10 +92,10 @@ plt.tight_layout()
         - Shape: {df_info['shape']}
         - Numeric columns: {df_info['numeric_columns']}
         - Categorical columns: {df_info['categorical_columns']}
-        - Sample data: {json.dumps(df_info['sample'][:2], indent=2)}
+        - Sample data: {json.dumps(df_info['sample'], indent=2, default=str)}
         
         IMPORTANT: DO NOT write actual visualization code. Instead, for each visualization, specify:
-        1. The type (choose from: bar_chart, line_chart, scatter_plot, histogram, boxplot)
+        1. The type (choose from: {', '.join(CHART_TYPES)})
         2. Which column to use for x-axis
         3. Which column to use for y-axis (except for histogram)
         4. A title and description
@@ -171,98 +113,271 @@ plt.tight_layout()
             ]
         }}
         """
-        
-        # Get visualization recommendations from LLM
+
+    def parse_recommendations(self, response):
+        """Extract the JSON recommendations from an LLM response (handles extra text)."""
+        json_match = re.search(r'({.*})', response.replace('\n', ' '), re.DOTALL)
         try:
-            response = self.llm_handler.generate_chat_response(visualization_prompt)
-            
-            # Extract JSON from response (handles cases where LLM adds extra text)
-            import re
-            json_match = re.search(r'({.*})', response.replace('\n', ' '), re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                recommendations = json.loads(json_str)
-            else:
-                try:
-                    recommendations = json.loads(response)
-                except json.JSONDecodeError:
-                    # Handle case where response isn't valid JSON
-                    logger.error(f"Failed to parse LLM response as JSON: {response[:100]}...")
-                    return {
-                        "error": "Failed to generate valid visualization recommendations",
-                        "visualizable": True
-                    }
+            return json.loads(json_match.group(1) if json_match else response)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse LLM response as JSON: {response[:100]}...")
+            return None
+
+    def recommend_visualizations(self, df):
+        """
+        Recommend charts for ``df`` from its column types and shape.
+        
+        Parameters:
+        -----------
+        df : pandas.DataFrame
+            Dataframe to chart
             
-            # Generate visualizations
-            results = {"analysis": recommendations, "visualizations": [], "visualizable": True}
+        Returns:
+        --------
+        dict or None
+            ``{"visualizations": [...]}``; None only if the LLM fallback ran
+            and its reply could not be parsed
+        """
+        recommendations = self.recommender.recommend(df)
+        if recommendations["visualizations"] or not self.llm_fallback:
+            return recommendations
+        logger.info("No rule-based charts; asking the LLM")
+        return self.parse_recommendations(self.llm_handler.generate_chat_response(self.visualization_prompt(df)))
+
+    async def arecommend_visualizations(self, df):
+        """Async ``recommend_visualizations``; only the LLM fallback awaits anything."""
+        recommendations = self.recommender.recommend(df)
+        if recommendations["visualizations"] or not self.llm_fallback:
+            return recommendations
+        logger.info("No rule-based charts; asking the LLM")
+        response = await self.llm_handler.agenerate_chat_response(self.visualization_prompt(df))
+        return self.parse_recommendations(response)
+
+    def build_chart_specs(self, df, recommendations):
+        """
+        Keep the recommended charts that can be drawn from ``df``.
+        
+        Parameters:
+        -----------
+        df : pandas.DataFrame
+            Dataframe the charts will be drawn from
+        recommendations : dict
+            Parsed recommendations with a ``visualizations`` list
             
-            for viz in recommendations.get("visualizations", []):
-                try:
-                    viz_type = viz.get("type", "").lower()
-                    x_col = viz.get("x_axis")
-                    y_col = viz.get("y_axis")
-                    title = viz.get("title", "Visualization")
-                    
-                    # Skip if required fields are missing
-                    if not viz_type or not x_col:
-                        logger.warning(f"Skipping visualization due to missing parameters: {viz}")
-                        continue
-                        
-                    # Check if columns exist in dataframe
-                    if x_col not in df.columns:
-                        logger.warning(f"Column '{x_col}' not found in dataframe")
-                        continue
-                        
-                    if y_col and y_col not in df.columns:
-                        logger.warning(f"Column '{y_col}' not found in dataframe")
-                        continue
-                    
-                    # Apply template based on visualization type
-                    if viz_type in templates:
-                        if viz_type == "histogram":
-                            code = templates[viz_type].format(x_col=x_col)
-                        else:
-                            if not y_col:
-                                logger.warning(f"Y-axis required for {viz_type}")
-                                continue
-                            code = templates[viz_type].format(x_col=x_col, y_col=y_col)
-                    else:
-                        logger.warning(f"Unsupported visualization type: {viz_type}")
-                        continue
-                    
-                    # Execute the visualization code with proper context
-                    plt.figure(figsize=(10, 6))
-                    local_vars = {"df": df, "plt": plt, "sns": sns}
-                    exec(code, globals(), local_vars)
-                    
-                    # Add title
-                    plt.title(title)
-                    
-                    # Capture the plot
-                    buffer = BytesIO()
-                    plt.savefig(buffer, format='png')
-                    buffer.seek(0)
-                    
-                    # Convert to base64 for embedding
-                    img_str = base64.b64encode(buffer.read()).decode('utf-8')
-                    results["visualizations"].append({
-                        "title": title,
-                        "description": viz.get("description", ""),
-                        "image": img_str,
-                        "type": viz_type
-                    })
-                    
-                    plt.close()
-                except Exception as e:
-                    logger.error(f"Error generating visualization: {str(e)}")
-                    plt.close()
+        Returns:
+        --------
+        list
+            Chart specs with type, title, x_axis, y_axis and description
+        """
+        specs = []
+        for viz in recommendations.get("visualizations", [])[:3]:
+            viz_type = (viz.get("type") or "").lower()
+            x_col = viz.get("x_axis")
+            y_col = viz.get("y_axis")
+
+            # Skip if required fields are missing
+            if not viz_type or not x_col:
+                logger.warning(f"Skipping visualization due to missing parameters: {viz}")
+                continue
+            if viz_type not in CHART_TYPES:
+                logger.warning(f"Unsupported visualization type: {viz_type}")
+                continue
+            if x_col not in df.columns:
+                logger.warning(f"Column '{x_col}' not found in dataframe")
+                continue
+            if viz_type == "histogram":
+                y_col = None
+            elif not y_col:
+                logger.warning(f"Y-axis required for {viz_type}")
+                continue
+            elif y_col not in df.columns:
+                logger.warning(f"Column '{y_col}' not found in dataframe")
+                continue
+
+            specs.append({
+                "type": viz_type,
+                "title": viz.get("title", "Visualization"),
+                "x_axis": x_col,
+                "y_axis": y_col,
+                "description": viz.get("description", "")
+            })
+        return specs
+
+    def prepare_charts(self, df, specs):
+        """
+        Reduce each spec's data and attach the chart's content address.
+        
+        Parameters:
+        -----------
+        df : pandas.DataFrame
+            Dataframe the charts are drawn from
+        specs : list
+            Chart specs from ``build_chart_specs``
             
-            return results
+        Returns:
+        --------
+        list
+            ``(frame, spec)`` pairs; each spec carries ``reduction`` and ``image_id``
+        """
+        charts = []
+        for spec in specs:
+            try:
+                frame, reduced_spec = self.reducer.reduce(df, spec)
+            except Exception as e:
+                logger.error(f"Error preparing visualization '{spec['title']}': {str(e)}")
+                continue
+            charts.append((frame, {**reduced_spec, "image_id": chart_key(frame, reduced_spec)}))
+        return charts
+
+    def charts_to_render(self, charts):
+        """Charts whose image is not in the store yet; identical charts render once."""
+        pending = {}
+        for frame, spec in charts:
+            if spec["image_id"] not in pending and not self.image_store.contains(spec["image_id"]):
+                pending[spec["image_id"]] = (frame, spec)
+        return list(pending.values())
+
+    def _collect_results(self, recommendations, charts, rendered, include_images=False):
+        pngs = {spec["image_id"]: png for spec, png, error in rendered if png is not None}
+        failed = {spec["image_id"] for spec, png, error in rendered if png is None}
+        for key, png in pngs.items():
+            self.image_store.put(key, png)
+
+        results = {"analysis": recommendations, "visualizations": [], "visualizable": True}
+        seen = set()
+        for _, spec in charts:
+            key = spec["image_id"]
+            if key in failed or key in seen:
+                continue
+            seen.add(key)
+            viz = {
+                "title": spec["title"],
+                "description": spec["description"],
+                "type": spec["type"],
+                "image_id": key,
+                "image_url": f"{self.image_url_prefix}/{key}.png"
+            }
+            if include_images:
+                png = pngs.get(key) or self.image_store.read(key)
+                viz["image"] = base64.b64encode(png).decode('utf-8') if png else ""
+            results["visualizations"].append(viz)
+        return results
+
+    def chart_spec(self, frame, spec):
+        """
+        Declarative description of one chart for clients that draw it themselves.
+        
+        ``data`` is the reduced frame as records; ``encoding`` names the
+        fields to plot, which depend on how the data was reduced (e.g. a
+        binned scatter carries a ``count`` weight, a box plot its quartiles).
+        """
+        x_col, y_col = spec["x_axis"], spec.get("y_axis")
+        method = spec["reduction"]["method"]
+        if spec["type"] == "boxplot" and method == "box_stats":
+            encoding = {"x": x_col, "q1": "q1", "median": "med", "q3": "q3",
+                        "whisker_low": "whislo", "whisker_high": "whishi"}
+        elif spec["type"] == "histogram" and method == "bins":
+            encoding = {"x_start": "left", "x_end": "right", "y": "count"}
+        elif spec["type"] == "histogram":
+            encoding = {"x": x_col, "y": "count"}
+        elif method == "hexbin":
+            encoding = {"x": x_col, "y": y_col, "weight": "count"}
+        else:
+            encoding = {"x": x_col, "y": y_col}
+        return {
+            "type": spec["type"],
+            "title": spec["title"],
+            "x_label": x_col,
+            "y_label": "Count" if spec["type"] == "histogram" else y_col,
+            "encoding": encoding,
+            "reduction": spec["reduction"],
+            # to_json handles numpy, NaN and datetime values the JSON encoder would reject.
+            "data": json.loads(frame.to_json(orient="records", date_format="iso"))
+        }
+
+    def _collect_specs(self, recommendations, charts):
+        results = {"analysis": recommendations, "visualizations": [], "visualizable": True}
+        for frame, spec in charts:
+            results["visualizations"].append({
+                "title": spec["title"],
+                "description": spec["description"],
+                "type": spec["type"],
+                "chart": self.chart_spec(frame, spec)
+            })
+        return results
+
+    @timed("VisualizationHandler.analyze_student_data")
+    def analyze_student_data(self, df, model_name="llama3", include_images=False, chart_format="png"):
+        """
+        Analyzes a dataframe and returns appropriate visualizations.
         
+        Parameters:
+        -----------
+        df : pandas.DataFrame
+            Dataframe containing data to visualize
+        model_name : str, optional
+            Unused; kept for callers of the LLM-based version, default is 'llama3'
+        include_images : bool, optional
+            Also return each image inline as base64, default is False
+        chart_format : str, optional
+            'png' renders images; 'spec' returns declarative chart specs with
+            reduced data for the client to draw and renders nothing
+            
+        Returns:
+        --------
+        dict
+            A dictionary containing visualization outputs and analysis
+        """
+        # First check if dataframe is visualizable
+        is_visual, reason = self.is_visualizable(df)
+        if not is_visual:
+            return {"error": reason, "visualizable": False}
+
+        try:
+            recommendations = self.recommend_visualizations(df)
+            if recommendations is None:
+                return {
+                    "error": "Failed to generate valid visualization recommendations",
+                    "visualizable": True
+                }
+            charts = self.prepare_charts(df, self.build_chart_specs(df, recommendations))
+            if chart_format == "spec":
+                return self._collect_specs(recommendations, charts)
+            rendered = self.renderer.render_many(self.charts_to_render(charts))
+            return self._collect_results(recommendations, charts, rendered, include_images)
         except Exception as e:
             logger.error(f"Error in visualization analysis: {str(e)}")
             return {"error": str(e), "visualizable": is_visual}
 
+    @timed("VisualizationHandler.aanalyze_student_data")
+    async def aanalyze_student_data(self, df, include_images=False, chart_format="png"):
+        """Async ``analyze_student_data``: the charts render in parallel in the renderer's pool."""
+        is_visual, reason = self.is_visualizable(df)
+        if not is_visual:
+            return {"error": reason, "visualizable": False}
+
+        try:
+            recommendations = await self.arecommend_visualizations(df)
+            if recommendations is None:
+                return {
+                    "error": "Failed to generate valid visualization recommendations",
+                    "visualizable": True
+                }
+            charts = self.prepare_charts(df, self.build_chart_specs(df, recommendations))
+            if chart_format == "spec":
+                return self._collect_specs(recommendations, charts)
+            rendered = await self.renderer.arender_many(self.charts_to_render(charts))
+            return await asyncio.to_thread(
+                self._collect_results, recommendations, charts, rendered, include_images
+            )
+        except Exception as e:
+            logger.error(f"Error in visualization analysis: {str(e)}")
+            return {"error": str(e), "visualizable": is_visual}
+
+    def render_stats(self):
+        """Render timings, failures and queue depth of the chart renderer, plus image store usage."""
+        return {**self.renderer.stats(), "image_store": self.image_store.stats()}
+
     def save_visualizations(self, results, output_dir="visualizations"):
         """
         Save generated visualizations to files.
@@ -296,10 +411,11 @@ plt.tight_layout()
             filename = f"{i+1}_{safe_title}.png"
             filepath = os.path.join(output_dir, filename)
             
-            # Decode and save image
+            # Decode (or read from the image store) and save image
             try:
+                png = base64.b64decode(viz["image"]) if viz.get("image") else self.image_store.read(viz["image_id"])
                 with open(filepath, "wb") as f:
-                    f.write(base64.b64decode(viz["image"]))
+                    f.write(png)
                 saved_files.append(filepath)
                 logger.info(f"Saved visualization to {filepath}")
             except Exception as e:
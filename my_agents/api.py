@@ -1,20 +1,58 @@
 from my_agents.DatabaseManager import DatabaseManager, format_result_as_table
 from my_agents.LLMHandler import LLMHandler
+from my_agents.LLMClient import PRIORITY_BATCH, request_priority
+from my_agents.Metrics import REGISTRY, HTTP_REQUEST_SECONDS, new_trace, begin_usage, current_usage
+from my_agents.SchemaCache import format_schema_for_prompt
+from my_agents.SchemaRetriever import SchemaRetriever
+from my_agents.QueryCache import QueryCache, normalize_question
+from my_agents.IntentRouter import IntentRouter
+from my_agents.StageScheduler import StageScheduler
+from my_agents.SQLValidator import UnsafeQueryError
+from my_agents.QueryGovernor import QueryHandle
 from my_agents.VisualizationHandler import VisualizationHandler
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse, StreamingResponse
+from my_agents.SessionStore import SessionStore, ConversationState, conversation_key
+from my_agents.FollowUpPlanner import FollowUpPlanner, FollowUpPlan, refers_back
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Tuple, Optional
+from contextlib import asynccontextmanager
+from typing import Callable, List, Literal, Tuple, Optional
 import pandas as pd
+import os
 import base64
 import time
 import uuid
 import json
 import asyncio
+import logging
 
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Startup progress reported by /health/ready; filled in by prewarm().
+startup_state = {"started": time.time(), "prewarmed": False, "components": {}}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Pre-warm in the background once the server is up, so liveness answers
+    straight away and readiness turns green when the warm-up is done.
+    """
+    warm_task = None
+    if os.getenv("STARTUP_PREWARM", "true").lower() in ("1", "true", "yes"):
+        warm_task = asyncio.create_task(prewarm())
+    else:
+        startup_state["prewarmed"] = True
+    replica_task = asyncio.create_task(check_replicas()) if db_manager.replica_urls else None
+    try:
+        yield
+    finally:
+        for task in (warm_task, replica_task):
+            if task is not None:
+                task.cancel()
+        visualization_handler.renderer.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS
 app.add_middleware(
@@ -28,7 +66,78 @@ app.add_middleware(
 # Initialize components
 db_manager = DatabaseManager()
 llm_handler = LLMHandler()
-visualization_handler = VisualizationHandler()
+visualization_handler = VisualizationHandler(llm_handler)
+schema_retriever = SchemaRetriever()
+sql_cache = QueryCache()
+intent_router = IntentRouter()
+session_store = SessionStore(
+    max_sessions=int(os.getenv("SESSION_STORE_MAX_SESSIONS", "1000")),
+    max_bytes=int(os.getenv("SESSION_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+)
+follow_up_planner = FollowUpPlanner()
+
+def cache_samples(field: str):
+    """``(cache,), value`` samples of one stats field across the hit/miss caches."""
+    caches = {
+        "sql": sql_cache.stats(),
+        "results": db_manager.result_cache.stats(),
+        "sessions": session_store.stats()
+    }
+    return [((name, ), stats[field]) for name, stats in caches.items()]
+
+REGISTRY.gauge("cache_hits_total", "Cache lookups that hit.", ("cache",),
+               lambda: cache_samples("hits"), kind="counter")
+REGISTRY.gauge("cache_misses_total", "Cache lookups that missed.", ("cache",),
+               lambda: cache_samples("misses"), kind="counter")
+REGISTRY.gauge("cache_hit_ratio", "Hits over lookups since start.", ("cache",),
+               lambda: cache_samples("hit_ratio"))
+REGISTRY.gauge("image_store_events_total", "Chart image store hits, stores and evictions.", ("event",),
+               lambda: [((k, ), v) for k, v in visualization_handler.image_store.stats().items()
+                        if k in ("hits", "stored", "evicted")], kind="counter")
+REGISTRY.gauge("llm_calls_total", "LLM calls, failures and retries by kind.", ("event",),
+               lambda: [((k, ), v) for k, v in llm_handler.client.stats().items()
+                        if k in ("calls", "failed", "retries", "rate_limited", "timed_out")], kind="counter")
+REGISTRY.gauge("llm_in_flight", "LLM calls admitted and not yet finished.", (),
+               lambda: [((), llm_handler.client.stats()["in_flight"])])
+REGISTRY.gauge("llm_queued", "LLM calls waiting for rate-limit admission.", (),
+               lambda: [((), llm_handler.client.stats()["queued"])])
+REGISTRY.gauge("render_queue_depth", "Charts submitted to the renderer and not yet finished.", (),
+               lambda: [((), visualization_handler.renderer.stats()["queue_depth"])])
+REGISTRY.gauge("db_pool_checked_out", "Connections currently checked out of each pool.", ("pool",),
+               lambda: [((name, ), stats["checked_out"]) for name, stats in db_manager.pool_stats().items()])
+REGISTRY.gauge("db_pool_capacity", "Pool size plus overflow: the most connections a pool hands out.", ("pool",),
+               lambda: [((name, ), stats["capacity"]) for name, stats in db_manager.pool_stats().items()])
+REGISTRY.gauge("db_pool_saturation", "Checked-out connections over capacity.", ("pool",),
+               lambda: [((name, ), stats["saturation"]) for name, stats in db_manager.pool_stats().items()])
+REGISTRY.gauge("db_reads_total", "LLM-generated queries run on each database.", ("pool",),
+               lambda: [((name, ), stats["reads"]) for name, stats in db_manager.pool_stats().items()
+                        if "reads" in stats], kind="counter")
+REGISTRY.gauge("db_healthy", "1 while a database is reachable, 0 while it is skipped.", ("pool",),
+               lambda: [((name, ), int(stats["healthy"])) for name, stats in db_manager.pool_stats().items()
+                        if "healthy" in stats])
+REGISTRY.gauge("query_governor_events_total", "Queries explained, rejected, timed out or cancelled.", ("event",),
+               lambda: [((k, ), v) for k, v in db_manager.governor.stats().items()
+                        if isinstance(v, (int, float))], kind="counter")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Give each request a trace id (the client's ``X-Request-ID`` if sent) that
+    every log line of the request carries, and time it. For streamed
+    responses the time is to the first byte.
+    """
+    trace = new_trace(request.headers.get("x-request-id"))
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                     route=getattr(route, "path", "unmatched"), status=str(status))
+    response.headers["X-Request-ID"] = trace
+    return response
 
 # Request/response schemas
 class Message(BaseModel):
@@ -39,20 +148,159 @@ class ChatRequest(BaseModel):
     model: str
     messages: List[Message]
     stream: bool = False
+    # Charts are returned as image_url links; set to also inline them as base64.
+    inline_images: bool = False
+    # "spec" returns chart specs with reduced data for the client to draw instead of images.
+    chart_format: Literal["png", "spec"] = "png"
+    # Identifies the conversation for follow-up reuse; derived from the first message if omitted.
+    conversation_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    model: str
+    questions: List[str]
+    # Multiplex results as SSE events in completion order instead of one JSON response.
+    stream: bool = False
+    # Capped at BATCH_MAX_CONCURRENCY.
+    max_concurrency: Optional[int] = None
+    inline_images: bool = False
+    chart_format: Literal["png", "spec"] = "png"
+
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+# Questions of one batch run at most this many at a time; keep it within the DB pool size.
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
 
 # Task classifier
 async def classify_task(user_message: str) -> str:
-    intent = llm_handler.analyze_intent(user_message)
-    print(intent)
+    intent = await intent_router.route_intent(user_message, llm_handler)
+    logger.info(f"Intent: {intent}")
     return intent
 
-# Format final output
-def format_output(sql: str, table_html: str, summary: str) -> str:
-    return f"""
+async def render_visualizations(df: pd.DataFrame, inline_images: bool = False,
+                                chart_format: str = "png") -> list:
+    """
+    Render charts for ``df`` (skipping any already in the image store) and link
+    them by URL, or with ``chart_format="spec"`` return chart specs to draw client-side.
+    """
+    visualizations = []
+    vis_results = await visualization_handler.aanalyze_student_data(
+        df, include_images=inline_images, chart_format=chart_format
+    )
+    if vis_results.get('visualizable', False) and 'visualizations' in vis_results:
+        for i, viz in enumerate(vis_results['visualizations']):
+            item = {
+                'title': viz.get('title', f'Visualization {i+1}'),
+                'description': viz.get('description', '')
+            }
+            if chart_format == "spec":
+                item['chart'] = viz['chart']
+            else:
+                item['image_url'] = viz['image_url']
+                if inline_images:
+                    item['image_base64'] = viz.get('image', '')
+            visualizations.append(item)
+    return visualizations
 
-{summary}
+async def load_schema() -> dict:
+    """Load the cached schema and its prompt rendering."""
+    schema_details = await asyncio.to_thread(db_manager.get_schema_details)
+    fingerprint = None
+    if isinstance(schema_details, dict):
+        fingerprint = db_manager.get_schema_fingerprint()
+        schema = format_schema_for_prompt(schema_details)
+        intent_router.update_schema_terms(schema_details, fingerprint)
+    else:
+        schema = schema_details
+    return {"details": schema_details, "schema": schema, "fingerprint": fingerprint}
+
+async def generate_sql(user_message: str, schema_ctx: dict,
+                       context: Optional[ConversationState] = None) -> Tuple[str, bool]:
+    """
+    Return ``(sql_query, from_cache)`` for ``user_message``.
+
+    ``context`` is the conversation's previous result when the message refers
+    back to it; its question, SQL and tables are added to the prompt, and the
+    SQL cache is bypassed because the answer depends on the conversation.
+    """
+    fingerprint = schema_ctx["fingerprint"]
+    sql_query = sql_cache.get(user_message, fingerprint) if fingerprint and context is None else None
+    if sql_query is not None:
+        return sql_query, True
+
+    prompt_schema = schema_ctx["schema"]
+    question = user_message
+    if fingerprint:
+        retrieval = schema_retriever.retrieve(user_message, schema_ctx["details"], fingerprint)
+        tables = retrieval.schema if context is None else {**context.schema, **retrieval.schema}
+        prompt_schema = format_schema_for_prompt(tables)
+        logger.info(f"Schema tokens saved: {retrieval.tokens_saved}")
+    if context is not None:
+        question = (f"{user_message}\n\nThis follows up the previous question \"{context.question}\", "
+                    f"which was answered with:\n{context.sql}")
+    return await llm_handler.aget_query_from_llm(prompt_schema, question), False
 
-<details>
+async def run_governed_query(sql_query: str):
+    """Run a bounded query off the loop; if the request is cancelled, kill it server-side too."""
+    handle = QueryHandle()
+    try:
+        if db_manager.async_enabled:
+            return await db_manager.aexecute_bounded_query(sql_query, handle=handle)
+        return await asyncio.to_thread(db_manager.execute_bounded_query, sql_query, handle=handle)
+    except asyncio.CancelledError:
+        asyncio.get_running_loop().run_in_executor(None, db_manager.cancel_query, handle)
+        raise
+
+async def watch_disconnect(http_request: Request, cancel: Callable[[], None], interval: float = 0.5):
+    """Call ``cancel`` (e.g. to cancel pending stages and so the running query) once the client goes away."""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(interval)
+    logger.info("Client disconnected; cancelling pending work")
+    cancel()
+
+async def execute_sql(user_message: str, schema_ctx: dict, sql_query: str, from_cache: bool,
+                      cacheable: bool = True):
+    """Run ``sql_query`` with bounded fetching, asking the LLM for one correction on failure."""
+    schema = schema_ctx["schema"]
+    fingerprint = schema_ctx["fingerprint"]
+    try:
+        query_result = await run_governed_query(sql_query)
+    except Exception as exec_error:
+        if from_cache:
+            sql_cache.evict(user_message, fingerprint)
+        corrected_query = await llm_handler.acorrect_query(schema, user_message, sql_query, str(exec_error))
+        if corrected_query:
+            try:
+                query_result = await run_governed_query(corrected_query)
+                
+                sql_query = corrected_query
+            except Exception as corr_error:
+                if isinstance(corr_error, UnsafeQueryError):
+                    issues = corr_error.validation
+                else:
+                    details = schema_ctx["details"] if isinstance(schema_ctx["details"], dict) else None
+                    issues = llm_handler.validate_generated_sql(corrected_query, details)
+                raise Exception(f"Validation failed: {', '.join(issues['issues']) or corr_error}")
+        else:
+            raise Exception(f"Execution failed: {exec_error}")
+
+    if fingerprint and cacheable:
+        sql_cache.put(user_message, fingerprint, sql_query)
+    return sql_query, query_result
+
+async def build_visualizations(user_message: str, df: pd.DataFrame, inline_images: bool = False,
+                               chart_format: str = "png") -> list:
+    """Decide whether to chart and, if so, render the charts."""
+    try:
+        if await intent_router.route_visualization(user_message, llm_handler):
+            return await render_visualizations(df, inline_images, chart_format)
+    except Exception as vis_error:
+        logger.error(f"Visualization error: {vis_error}")
+    return []
+
+# Format final output
+def format_table_block(table_html: str, truncated: bool = False) -> str:
+    if truncated:
+        table_html += "\n\n_The result was capped; only the rows shown above were fetched._"
+    return f"""<details>
 <summary>📊 Click to view data</summary>
 
 {table_html}
@@ -61,6 +309,242 @@ def format_output(sql: str, table_html: str, summary: str) -> str:
 
 """
 
+def format_output(sql: str, table_html: str, summary: str, truncated: bool = False) -> str:
+    return f"""
+
+{summary}
+
+""" + format_table_block(table_html, truncated)
+
+def make_chunk(completion_id: str, created: int, model: str, delta: dict,
+               finish_reason: Optional[str] = None, **extra) -> str:
+    """Serialize one OpenAI-style ``chat.completion.chunk`` SSE event."""
+    choice = {'delta': delta, 'index': 0}
+    if finish_reason is not None:
+        choice['finish_reason'] = finish_reason
+    chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+             'model': model, 'choices': [choice], **extra}
+    return f"data: {json.dumps(chunk, default=str)}\n\n"
+
+async def pump_tokens(token_stream, queue: asyncio.Queue) -> str:
+    """Forward streamed tokens into ``queue`` (``None`` marks the end) and return the full text."""
+    parts = []
+    try:
+        async for token in token_stream:
+            parts.append(token)
+            await queue.put(token)
+    finally:
+        await queue.put(None)
+    return "".join(parts)
+
+def start_pipeline(user_message: str, context: Optional[ConversationState] = None,
+                   shared_schema: Optional[asyncio.Task] = None):
+    """
+    Start intent classification and, unless clearly chat, speculative SQL drafting.
+
+    ``shared_schema`` is a schema load already started for a whole batch; the
+    schema stage then just waits for it instead of loading its own.
+    """
+    scheduler = StageScheduler()
+
+    # Unless the question is clearly chat, load the schema and draft the SQL
+    # while the intent is still being decided; cancelled if it turns out CHAT.
+    local_intent = intent_router.classify_intent(user_message)
+    speculate = not (local_intent.label == "CHAT" and local_intent.confidence >= intent_router.threshold)
+    intent_task = scheduler.start("intent", lambda: classify_task(user_message))
+    if shared_schema is not None:
+        # shield: cancelling this question's stage must not cancel the batch's load.
+        scheduler.start("schema", lambda: asyncio.shield(shared_schema))
+    elif speculate:
+        scheduler.start("schema", load_schema, speculative=True)
+    if speculate:
+        scheduler.start("sql_generation", lambda ctx: generate_sql(user_message, ctx, context),
+                        deps=("schema",), speculative=True)
+    return scheduler, intent_task
+
+async def run_query(user_message: str, scheduler: StageScheduler,
+                    context: Optional[ConversationState] = None):
+    """Wait for (or start) SQL generation, then execute; returns ``(sql, QueryResult)``."""
+    if "schema" not in scheduler.stages:
+        scheduler.start("schema", load_schema)
+    if "sql_generation" not in scheduler.stages:
+        scheduler.start("sql_generation", lambda ctx: generate_sql(user_message, ctx, context), deps=("schema",))
+    return await scheduler.run(
+        "execute",
+        lambda _intent, ctx, generated: execute_sql(user_message, ctx, *generated, cacheable=context is None),
+        deps=("intent", "schema", "sql_generation")
+    )
+
+def conversation_context(conversation_id: str, user_message: str):
+    """
+    Look up the conversation's previous result.
+
+    Returns ``(state, plan)``: ``plan`` is set when the message can be
+    answered from ``state.frame`` alone; ``state`` is only returned when the
+    message refers back to the previous result.
+    """
+    state = session_store.get(conversation_id)
+    if state is None:
+        return None, None
+    plan = follow_up_planner.plan(user_message, state.frame)
+    if plan is None and not refers_back(user_message):
+        return None, None
+    return state, plan
+
+async def remember_result(conversation_id: str, user_message: str, sql_query: str,
+                          df: pd.DataFrame, scheduler: StageScheduler):
+    """Keep this answer's frame, SQL and the schema of the tables it read for follow-ups."""
+    schema_ctx = await scheduler.stages["schema"].task
+    details = schema_ctx["details"] if isinstance(schema_ctx["details"], dict) else {}
+    tables = {t.lower(): t for t in details}
+    # Off the loop: the validator checks the schema cache, which may probe the database.
+    validator = await asyncio.to_thread(db_manager.get_validator)
+    schema = {tables[t]: details[tables[t]] for t in validator.referenced_tables(sql_query) if t in tables}
+    session_store.put(conversation_id, ConversationState(
+        frame=df, sql=sql_query, question=user_message, schema=schema
+    ))
+
+async def answer_follow_up(request: ChatRequest, conversation_id: str, state: ConversationState,
+                           plan: FollowUpPlan, scheduler: StageScheduler) -> dict:
+    """Answer a refine/sort/filter/chart follow-up from the cached frame, without the LLM or the database."""
+    df = await scheduler.run("follow_up", lambda: asyncio.to_thread(plan.apply, state.frame))
+    description = plan.describe()
+    if plan.steps:
+        summary = f"From the previous result: {description}. {len(df)} of {len(state.frame)} rows."
+        session_store.put(conversation_id, ConversationState(
+            frame=df, sql=state.sql, question=state.question, schema=state.schema,
+            refinements=state.refinements + [description]
+        ))
+    else:
+        summary = "Charts for the previous result."
+    visualizations = []
+    if plan.visualize:
+        visualizations = await scheduler.run(
+            "visualization", lambda _: render_visualizations(df, request.inline_images, request.chart_format),
+            deps=("follow_up",)
+        )
+        if not visualizations:
+            summary += " There is nothing in it that can be charted."
+    session_store.record_local_answer()
+    result = df.to_dict(orient="records")
+    return {"summary": summary, "table_html": format_result_as_table(result),
+            "visualizations": visualizations}
+
+async def run_pipeline(request, user_message: str, scheduler: StageScheduler,
+                       intent_task: Optional[asyncio.Task], conversation_id: Optional[str] = None,
+                       state: Optional[ConversationState] = None, plan: Optional[FollowUpPlan] = None) -> dict:
+    """
+    Answer one question on ``scheduler`` and return its content, visualizations and truncation flag.
+
+    ``request`` supplies the output options (``inline_images``, ``chart_format``).
+    With a ``plan`` the previous result is refined locally; otherwise the
+    intent decides between the SQL pipeline and a chat reply.
+    """
+    task_type = "FOLLOW_UP" if plan is not None else await intent_task
+    logger.info(f"User message: {user_message}")
+    logger.info(f"Classified as: {task_type}")
+
+    if task_type == "FOLLOW_UP":
+        answer = await answer_follow_up(request, conversation_id, state, plan, scheduler)
+        output_str = format_output(state.sql, answer["table_html"], answer["summary"])
+        visualizations = answer["visualizations"]
+        truncated = False
+
+    elif task_type == "SQL":
+        sql_query, query_result = await run_query(user_message, scheduler, state)
+        columns, data = query_result.columns, query_result.rows
+        result = [dict(zip(columns, row)) for row in data]
+        table_html = format_result_as_table(result)
+
+        df = pd.DataFrame(data, columns=columns)
+        if conversation_id and not query_result.truncated:
+            await remember_result(conversation_id, user_message, sql_query, df, scheduler)
+
+        # Summary and visualization only need the query result, so run them together.
+        summary_task = scheduler.start(
+            "summary", lambda _: llm_handler.agenerate_summary(user_message, result), deps=("execute",)
+        )
+        visualization_task = scheduler.start(
+            "visualization",
+            lambda _: build_visualizations(user_message, df, request.inline_images, request.chart_format),
+            deps=("execute",)
+        )
+        summary, visualizations = await asyncio.gather(summary_task, visualization_task)
+
+        output_str = format_output(sql_query, table_html, summary, query_result.truncated)
+        truncated = query_result.truncated
+
+    elif task_type == "CHAT":
+        scheduler.cancel("schema", "sql_generation")
+        # Chat fallback
+        output_str = await scheduler.run(
+            "chat", lambda _: llm_handler.agenerate_chat_response(user_message), deps=("intent",)
+        )
+        visualizations = []
+        truncated = False
+    return {"content": output_str, "visualizations": visualizations, "truncated": truncated}
+
+async def warm_component(name: str, func):
+    started = time.perf_counter()
+    try:
+        await func()
+        status = "ok"
+    except Exception as e:
+        logger.error(f"Pre-warming {name} failed: {e}")
+        status = f"failed: {e}"
+    startup_state["components"][name] = {"status": status, "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+async def prewarm():
+    """
+    Open the DB pool, load the schema cache, build the LLM client and start
+    one chart render process, concurrently, before reporting ready. The
+    other render processes are started after that: each imports matplotlib,
+    which takes about a second of CPU, so starting them all up front would
+    hold readiness up and compete with the first requests on small hosts.
+    """
+    started = time.perf_counter()
+
+    async def database():
+        await asyncio.to_thread(db_manager.warm_up, int(os.getenv("DB_WARM_CONNECTIONS", "2")))
+        await load_schema()
+
+    await asyncio.gather(
+        warm_component("database", database),
+        warm_component("llm", lambda: asyncio.to_thread(llm_handler.client.warm_up)),
+        warm_component("renderer", lambda: asyncio.to_thread(visualization_handler.renderer.warm_up, 1))
+    )
+    startup_state["prewarmed"] = True
+    startup_state["prewarm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Ready after {startup_state['prewarm_ms']} ms: {startup_state['components']}")
+    await warm_component("renderer_pool", lambda: asyncio.to_thread(visualization_handler.renderer.warm_up))
+
+async def check_replicas():
+    """Ping the read replicas every ``DB_REPLICA_CHECK_INTERVAL`` seconds so failed ones rejoin."""
+    interval = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "15"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(db_manager.check_replicas)
+        except Exception as e:
+            logger.error(f"Replica health check failed: {e}")
+
+@app.get("/health/live")
+async def liveness():
+    """The process is up and the event loop is responsive."""
+    return {"status": "alive", "uptime_s": round(time.time() - startup_state["started"], 1)}
+
+@app.get("/health/ready")
+async def readiness():
+    """Ready once pre-warming has finished, the LLM client was built and the database answers."""
+    body = {**startup_state, "database": "ok"}
+    try:
+        await asyncio.wait_for(asyncio.to_thread(db_manager.ping), float(os.getenv("READINESS_DB_TIMEOUT", "2")))
+    except Exception as e:
+        body["database"] = f"unreachable: {e or type(e).__name__}"
+    llm_ok = startup_state["components"].get("llm", {}).get("status", "ok") == "ok"
+    ready = startup_state["prewarmed"] and llm_ok and body["database"] == "ok"
+    return JSONResponse(status_code=200 if ready else 503, content={**body, "status": "ready" if ready else "starting"})
+
 # Route models
 @app.get("/v1/models")
 async def list_models():
@@ -76,84 +560,84 @@ async def list_models():
         ]
     }
 
-@app.post("/v1/chat/completions")
-async def chat_with_agent(request: ChatRequest):
-    try:
-        user_message = next((m.content for m in reversed(request.messages) if m.role == "user"), "")
-        task_type = await classify_task(user_message)
-        print(f"User message: {user_message}")
-        print(f"Classified as: {task_type}")
-
-        if task_type == "SQL":
-            schema = db_manager.get_database_schema()
-            sql_query = llm_handler.get_query_from_llm(schema, user_message)
-            
-            try:
-                columns, data = db_manager.execute_read_query(sql_query)
-                result = [dict(zip(columns, row)) for row in data]
-            except Exception as exec_error:
-                corrected_query = llm_handler.correct_query(schema, user_message, sql_query, str(exec_error))
-                if corrected_query:
-                    try:
-                        columns, data = db_manager.execute_read_query(corrected_query)
-                        
-                        sql_query = corrected_query
-                    except Exception as corr_error:
-                        issues = llm_handler.validate_generated_sql(corrected_query)
-                        raise Exception(f"Validation failed: {', '.join(issues['issues'])}")
-                else:
-                    raise Exception(f"Execution failed: {exec_error}")
-            
-            table_html = format_result_as_table(result)
+@app.get("/v1/cache/stats")
+async def cache_stats():
+    return {"sql": sql_cache.stats(), "results": db_manager.result_cache.stats()}
 
-            summary = llm_handler.generate_summary(
-                user_message,
-                [dict(zip(columns, row)) for row in data]
-            )
+@app.get("/v1/governor/stats")
+async def governor_stats():
+    return db_manager.governor.stats()
 
-            output_str = format_output(sql_query, table_html, summary)
+@app.get("/v1/db/stats")
+async def db_stats():
+    return db_manager.pool_stats()
 
-            # --- Visualization logic ---
-            visualizations = []
-            # Use a unique user/session id (from frontend or fallback to uuid)
-            user_id = request.model if hasattr(request, 'model') else 'anonymous'
-            session_id = str(uuid.uuid4())
-            df = pd.DataFrame(data, columns=columns)
-            try:
-                if llm_handler.check_visualization_intent(user_message):
-                    vis_results = visualization_handler.analyze_student_data(df)
-                    if vis_results.get('visualizable', False) and 'visualizations' in vis_results:
-                        # Save images to disk per user/session
-                        output_dir = f"visualizations/{user_id}/{session_id}"
-                        visualization_handler.save_visualizations(vis_results, output_dir=output_dir)
-                        for i, viz in enumerate(vis_results['visualizations']):
-                            visualizations.append({
-                                'title': viz.get('title', f'Visualization {i+1}'),
-                                'description': viz.get('description', ''),
-                                'image_base64': viz.get('image', ''),
-                                # Optionally, add file path if you want to serve images statically
-                                # 'image_path': f"/{output_dir}/{i+1}_{viz.get('title', '').replace(' ', '_')}.png"
-                            })
-            except Exception as vis_error:
-                print(f"Visualization error: {vis_error}")
+@app.get("/v1/sessions/stats")
+async def sessions_stats():
+    return session_store.stats()
 
-        elif task_type == "CHAT":
-            # Chat fallback
-            output_str = llm_handler.generate_chat_response(user_message)
-            visualizations = []
+@app.get("/v1/render/stats")
+async def render_stats():
+    return visualization_handler.render_stats()
 
-        # Build OpenAI-compatible response
+@app.get("/v1/llm/stats")
+async def llm_stats():
+    return llm_handler.client.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of stage histograms, token counters and cache ratios."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/v1/images/{image_id}.png")
+async def get_image(image_id: str, http_request: Request):
+    """Serve a stored chart. Images are content-addressed, so they never change."""
+    etag = f'"{image_id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if http_request.headers.get("if-none-match") == etag and visualization_handler.image_store.contains(image_id):
+        return Response(status_code=304, headers=headers)
+    try:
+        path = visualization_handler.image_store.path_for(image_id)
+    except ValueError:
+        return JSONResponse(status_code=404, content={"error": "Image not found"})
+    if not visualization_handler.image_store.contains(image_id) or not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"error": "Image not found"})
+    return FileResponse(path, media_type="image/png", headers=headers)
+
+@app.post("/v1/chat/completions")
+async def chat_with_agent(request: ChatRequest, http_request: Request):
+    try:
+        user_message = next((m.content for m in reversed(request.messages) if m.role == "user"), "")
         completion_id = f"chatcmpl-{uuid.uuid4()}"
         created = int(time.time())
 
+        conversation_id = request.conversation_id or conversation_key(request.model, request.messages)
+        state, plan = conversation_context(conversation_id, user_message)
+
         if request.stream:
-            async def stream():
-                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': request.model, 'choices': [{'delta': {'role': 'assistant'}, 'index': 0}]})}\n\n"
-                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': request.model, 'choices': [{'delta': {'content': output_str}, 'index': 0}]})}\n\n"
-                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': request.model, 'choices': [{'delta': {}, 'finish_reason': 'stop', 'index': 0}]})}\n\n"
-                yield "data: [DONE]\n\n"
-            return StreamingResponse(stream(), media_type="text/event-stream")
+            return StreamingResponse(
+                stream_completion(request, user_message, completion_id, created, conversation_id, state, plan),
+                media_type="text/event-stream"
+            )
+
+        if plan is not None:
+            scheduler, intent_task = StageScheduler(), None
+        else:
+            scheduler, intent_task = start_pipeline(user_message, state)
+        disconnect_watcher = asyncio.create_task(watch_disconnect(http_request, scheduler.cancel_pending))
+        try:
+            answer = await run_pipeline(request, user_message, scheduler, intent_task,
+                                        conversation_id, state, plan)
+        except asyncio.CancelledError:
+            if not disconnect_watcher.done():
+                raise
+            return JSONResponse(status_code=499, content={"error": "Client disconnected"})
+        finally:
+            disconnect_watcher.cancel()
+            scheduler.cancel_pending()
+        timings = scheduler.report()
 
+        # Build OpenAI-compatible response
         return {
             "id": completion_id,
             "object": "chat.completion",
@@ -163,18 +647,214 @@ async def chat_with_agent(request: ChatRequest):
                 "index": 0,
                 "message": {
                     "role": "assistant",
-                    "content": output_str
+                    "content": answer["content"]
                 },
                 "finish_reason": "stop"
             }],
-            "usage": {
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "total_tokens": 0
-            },
-            "visualizations": visualizations
+            "usage": current_usage(),
+            "visualizations": answer["visualizations"],
+            "truncated": answer["truncated"],
+            "timings": timings
         }
 
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+async def stream_completion(request: ChatRequest, user_message: str, completion_id: str, created: int,
+                            conversation_id: str, state: Optional[ConversationState] = None,
+                            plan: Optional[FollowUpPlan] = None):
+    """
+    Incremental SSE for ``stream=true``.
+
+    Sends the role and a status chunk straight away, then summary (or chat)
+    tokens as the model produces them, then the data table, and finally the
+    visualizations once rendering finishes. Status and visualization chunks
+    carry an empty delta plus a ``status``/``visualizations`` field, which
+    OpenAI-compatible clients ignore.
+    """
+    def chunk(delta, finish_reason=None, **extra):
+        return make_chunk(completion_id, created, request.model, delta, finish_reason, **extra)
+
+    if plan is not None:
+        scheduler, intent_task = StageScheduler(), None
+    else:
+        scheduler, intent_task = start_pipeline(user_message, state)
+    yield chunk({'role': 'assistant'}, status="classifying")
+    try:
+        task_type = "FOLLOW_UP" if plan is not None else await intent_task
+        tokens: asyncio.Queue = asyncio.Queue()
+
+        if task_type == "FOLLOW_UP":
+            yield chunk({}, status="refining")
+            answer = await answer_follow_up(request, conversation_id, state, plan, scheduler)
+            yield chunk({'content': "\n\n" + answer["summary"] + "\n\n" + format_table_block(answer["table_html"])})
+            if answer["visualizations"]:
+                yield chunk({}, visualizations=answer["visualizations"])
+
+        elif task_type == "SQL":
+            yield chunk({}, status="querying")
+            sql_query, query_result = await run_query(user_message, scheduler, state)
+            columns, data = query_result.columns, query_result.rows
+            result = [dict(zip(columns, row)) for row in data]
+            df = pd.DataFrame(data, columns=columns)
+            if not query_result.truncated:
+                await remember_result(conversation_id, user_message, sql_query, df, scheduler)
+
+            visualization_task = scheduler.start(
+                "visualization",
+                lambda _: build_visualizations(user_message, df, request.inline_images, request.chart_format),
+                deps=("execute",)
+            )
+            summary_task = scheduler.start(
+                "summary", lambda _: pump_tokens(llm_handler.astream_summary(user_message, result), tokens),
+                deps=("execute",)
+            )
+            yield chunk({}, status="summarizing")
+            yield chunk({'content': "\n\n"})
+            while (token := await tokens.get()) is not None:
+                yield chunk({'content': token})
+            await summary_task
+
+            table_block = format_table_block(format_result_as_table(result), query_result.truncated)
+            yield chunk({'content': "\n\n" + table_block}, truncated=query_result.truncated)
+
+            visualizations = await visualization_task
+            if visualizations:
+                yield chunk({}, visualizations=visualizations)
+
+        elif task_type == "CHAT":
+            scheduler.cancel("schema", "sql_generation")
+            chat_task = scheduler.start(
+                "chat", lambda _: pump_tokens(llm_handler.astream_chat_response(user_message), tokens),
+                deps=("intent",)
+            )
+            while (token := await tokens.get()) is not None:
+                yield chunk({'content': token})
+            await chat_task
+
+    except Exception as e:
+        yield chunk({'content': f"\n\nError: {e}"})
+    finally:
+        scheduler.cancel_pending()
+
+    yield chunk({}, "stop", timings=scheduler.report(), usage=current_usage())
+    yield "data: [DONE]\n\n"
+
+def dedupe_questions(questions: List[str]) -> Tuple[List[str], List[int]]:
+    """Unique questions (first spelling kept) and, for each input, the index of its unique question."""
+    unique, positions, mapping = [], {}, []
+    for question in questions:
+        key = normalize_question(question)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(question)
+        mapping.append(positions[key])
+    return unique, mapping
+
+async def answer_batch_question(request: BatchRequest, question: str, shared_schema: asyncio.Task,
+                                semaphore: asyncio.Semaphore) -> dict:
+    """Run one batch question once a concurrency slot is free; errors are returned, not raised."""
+    # Its LLM calls queue behind interactive requests' (inherited by the stage tasks).
+    request_priority.set(PRIORITY_BATCH)
+    begin_usage()
+    async with semaphore:
+        scheduler, intent_task = start_pipeline(question, shared_schema=shared_schema)
+        try:
+            answer = await run_pipeline(request, question, scheduler, intent_task)
+        except Exception as e:
+            answer = {"error": str(e)}
+        finally:
+            scheduler.cancel_pending()
+        return {**answer, "timings": scheduler.report(), "usage": current_usage()}
+
+@app.post("/v1/batch/completions")
+async def batch_completions(request: BatchRequest, http_request: Request):
+    """
+    Answer many questions in one request, e.g. the panels of a dashboard.
+
+    Duplicate questions (after normalisation) run once and share a result.
+    The schema is loaded once for the whole batch, and at most
+    ``max_concurrency`` questions run at a time over the shared DB pool.
+    """
+    if not request.questions:
+        return JSONResponse(status_code=400, content={"error": "No questions given"})
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        return JSONResponse(status_code=400, content={
+            "error": f"At most {BATCH_MAX_QUESTIONS} questions per batch"
+        })
+
+    batch_id = f"batch-{uuid.uuid4()}"
+    created = int(time.time())
+    started = time.perf_counter()
+    unique, mapping = dedupe_questions(request.questions)
+    concurrency = max(1, min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+    shared_schema = asyncio.create_task(load_schema())
+    tasks = [asyncio.create_task(answer_batch_question(request, q, shared_schema, semaphore)) for q in unique]
+    logger.info(f"Batch {batch_id}: {len(request.questions)} questions, {len(unique)} unique, concurrency {concurrency}")
+
+    def cancel_all():
+        for task in tasks + [shared_schema]:
+            task.cancel()
+
+    header = {"id": batch_id, "created": created, "model": request.model}
+    if request.stream:
+        return StreamingResponse(
+            stream_batch(header, request.questions, mapping, tasks, cancel_all, started),
+            media_type="text/event-stream"
+        )
+
+    disconnect_watcher = asyncio.create_task(watch_disconnect(http_request, cancel_all))
+    try:
+        answers = await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        if not disconnect_watcher.done():
+            raise
+        return JSONResponse(status_code=499, content={"error": "Client disconnected"})
+    finally:
+        disconnect_watcher.cancel()
+        cancel_all()
+
+    return {
+        **header,
+        "object": "batch.completion",
+        "results": [
+            {"index": i, "question": question, **answers[mapping[i]]}
+            for i, question in enumerate(request.questions)
+        ],
+        "unique_questions": len(unique),
+        "usage": {key: sum(a["usage"][key] for a in answers) for key in answers[0]["usage"]},
+        "concurrency": concurrency,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+async def stream_batch(header: dict, questions: List[str], mapping: List[int], tasks: List[asyncio.Task],
+                       cancel_all: Callable[[], None], started: float):
+    """
+    Multiplexed SSE for ``stream=true`` batches: one ``batch.result`` event per
+    question, in completion order and tagged with the question's ``index``,
+    then ``batch.done``.
+    """
+    def event(payload: dict) -> str:
+        return f"data: {json.dumps({**header, **payload}, default=str)}\n\n"
+
+    inputs_of = {}
+    for i, position in enumerate(mapping):
+        inputs_of.setdefault(position, []).append(i)
+    position_of = {task: position for position, task in enumerate(tasks)}
+
+    yield event({"object": "batch.started", "total": len(questions), "unique_questions": len(tasks)})
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                answer = task.result()
+                for i in inputs_of[position_of[task]]:
+                    yield event({"object": "batch.result", "index": i, "question": questions[i], **answer})
+    finally:
+        # Also runs when the client disconnects and the generator is closed.
+        cancel_all()
+
+    yield event({"object": "batch.done", "total_ms": round((time.perf_counter() - started) * 1000, 1)})
+    yield "data: [DONE]\n\n"
@@ -25,10 +25,14 @@ import {
 import { Pencil, Trash2, Plus, Check, X, ChevronLeft, ChevronRight, Eye, EyeOff, History } from "lucide-react";
 import { Sheet, SheetContent } from "@/components/ui/sheet";
 
+const API_BASE_URL = "http://localhost:8000";
+
 interface Visualization {
   title: string;
   description: string;
-  image_base64: string;
+  image_url?: string;
+  // Only present on responses requested with inline_images, or saved before charts were served by URL.
+  image_base64?: string;
 }
 
 interface Message {
@@ -121,13 +125,14 @@ const ChatbotPage = () => {
       { role: "user", content: input },
     ];
     try {
-      const res = await fetch("http://localhost:8000/v1/chat/completions", {
+      const res = await fetch(`${API_BASE_URL}/v1/chat/completions`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           model: "LMS-MODEL",
           messages: apiMessages,
           stream: false,
+          conversation_id: activeSession.id,
         }),
       });
       const data = await res.json();
@@ -462,7 +467,7 @@ const ChatbotPage = () => {
                               {message.visualizations.map((viz, idx) => (
                                 <div key={idx} className="flex flex-col items-center border rounded-lg p-2 bg-white/70">
                                   <img
-                                    src={`data:image/png;base64,${viz.image_base64}`}
+                                    src={viz.image_url ? `${API_BASE_URL}${viz.image_url}` : `data:image/png;base64,${viz.image_base64}`}
                                     alt={viz.title}
                                     className="max-w-full max-h-64 rounded shadow"
                                   />
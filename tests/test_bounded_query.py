@@ -0,0 +1,46 @@
+import pytest
+
+from benchmarks.fixture import seed_database
+from my_agents.DatabaseManager import DatabaseManager, inject_limit
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM students;", "SELECT * FROM students LIMIT 101"),
+    ("SELECT * FROM students LIMIT 50", "SELECT * FROM students LIMIT 50"),
+    ("SELECT * FROM students LIMIT 100000", "SELECT * FROM students LIMIT 101"),
+    ("SELECT * FROM students LIMIT 20, 100000", "SELECT * FROM students LIMIT 20, 101"),
+    ("SELECT * FROM students LIMIT 100000 OFFSET 20", "SELECT * FROM students LIMIT 101 OFFSET 20"),
+    ("SELECT * FROM (SELECT * FROM students LIMIT 5) s", "SELECT * FROM (SELECT * FROM students LIMIT 5) s LIMIT 101"),
+    ("SELECT * FROM students -- all", "SELECT * FROM students LIMIT 101"),
+    ("SELECT * FROM students LIMIT 100000; # everyone", "SELECT * FROM students LIMIT 101"),
+    ("SELECT * FROM students /* all */\n;", "SELECT * FROM students LIMIT 101"),
+    ("SELECT '-- not a comment' AS note FROM students", "SELECT '-- not a comment' AS note FROM students LIMIT 101"),
+    ("SHOW TABLES", "SHOW TABLES"),
+])
+def test_inject_limit_caps_the_top_level_select(query, expected):
+    assert inject_limit(query, 101) == expected
+
+
+def test_bounded_query_caps_a_large_limit_of_its_own(monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", seed_database(str(tmp_path / "school.db"), students=50))
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", "")
+    manager = DatabaseManager()
+    executed = []
+    fetch_bounded = manager.fetch_bounded
+
+    def recording_fetch(connection, query, *args):
+        executed.append(query)
+        return fetch_bounded(connection, query, *args)
+
+    monkeypatch.setattr(manager, "fetch_bounded", recording_fetch)
+    result = manager.execute_bounded_query("SELECT name FROM students LIMIT 100000", max_rows=10,
+                                           use_cache=False)
+    assert executed == ["SELECT name FROM students LIMIT 11"]
+    assert len(result.rows) == 10 and result.truncated
+
+
+def test_query_ending_in_a_comment_passes_validation(monkeypatch, tmp_path):
+    monkeypatch.setenv("DATABASE_URL", seed_database(str(tmp_path / "school.db"), students=5))
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", "")
+    result = DatabaseManager().execute_bounded_query("select name from students -- all", use_cache=False)
+    assert len(result.rows) == 5
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from my_agents.ChartRecommender import ChartRecommender, _looks_temporal
+from my_agents.ResultDigest import ResultDigest
+
+DATES = ["2024-07-01", "2024-08-05", "2024-09-02", "2024-10-07"] * 3
+
+
+@pytest.mark.parametrize("dtype", [object, "string", None])
+def test_date_strings_are_temporal_whatever_the_text_dtype(dtype):
+    assert _looks_temporal(pd.Series(DATES, name="assessed_on", dtype=dtype))
+
+
+def test_text_that_is_not_a_date_is_not_temporal():
+    assert not _looks_temporal(pd.Series(["CSE", "IT", "ECE"], name="department"))
+    assert not _looks_temporal(pd.Series(["1", "2", "3"], name="code"))
+
+
+def test_scores_over_time_get_a_line_chart():
+    df = pd.DataFrame({"assessed_on": DATES, "score": [70.5, 80, 65, 90] * 3})
+    charts = ChartRecommender().recommend(df)["visualizations"]
+    assert charts[0]["type"] == "line_chart"
+    assert (charts[0]["x_axis"], charts[0]["y_axis"]) == ("assessed_on", "score")
+
+
+def test_category_and_measure_get_a_bar_chart():
+    df = pd.DataFrame({"department": ["CSE", "IT", "ECE"] * 4, "score": range(12)})
+    types = [chart["type"] for chart in ChartRecommender().recommend(df)["visualizations"]]
+    assert "bar_chart" in types
+
+
+@pytest.mark.parametrize("dtype", [object, "string", None])
+def test_digest_coerces_numeric_text(dtype):
+    info = ResultDigest().describe_column(pd.Series(["1.5", "2", "3"], dtype=dtype), top_k=3)
+    assert (info["min"], info["max"], info["median"]) == (1.5, 3.0, 2.0)
+
+
+def test_digest_counts_top_values_of_text():
+    info = ResultDigest().describe_column(pd.Series(["a", "b", "a"]), top_k=1)
+    assert info["distinct"] == 2 and info["top_values"] == {"a": 2}
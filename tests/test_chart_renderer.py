@@ -0,0 +1,84 @@
+import threading
+
+from my_agents.ChartRenderer import ChartRenderer
+
+
+class FakeConnection:
+    """Answers a chart instantly unless its title is "hang", which never replies."""
+
+    def __init__(self):
+        self.task = None
+
+    def send(self, task):
+        self.task = task
+
+    def poll(self, timeout):
+        if self.task[1]["title"] == "hang":
+            threading.Event().wait(timeout)
+            return False
+        return True
+
+    def recv(self):
+        return "ok", (b"png:" + self.task[1]["title"].encode(), 1.0)
+
+
+class FakeSlot:
+    def __init__(self):
+        self.connection = None
+        self.started = 0
+        self.stopped = 0
+
+    def ensure_started(self):
+        if self.connection is None:
+            self.connection = FakeConnection()
+            self.started += 1
+
+    def stop(self):
+        self.connection = None
+        self.stopped += 1
+
+
+def make_renderer(timeout=0.3):
+    renderer = ChartRenderer(max_workers=2, timeout=timeout)
+    renderer._slots = [FakeSlot(), FakeSlot()]
+    return renderer
+
+
+def chart(title):
+    return None, {"title": title}
+
+
+def test_hung_chart_times_out_without_failing_other_charts():
+    renderer = make_renderer()
+    try:
+        results = renderer.render_many([chart("hang"), chart("a"), chart("b"), chart("c")])
+        by_title = {spec["title"]: (png, error) for spec, png, error in results}
+        assert by_title["hang"][0] is None and "timed out" in by_title["hang"][1]
+        assert all(by_title[t] == (b"png:" + t.encode(), None) for t in "abc")
+
+        stats = renderer.stats()
+        assert (stats["rendered"], stats["timed_out"], stats["restarted"]) == (3, 1, 1)
+        # Only the hung worker was replaced.
+        assert sorted(slot.stopped for slot in renderer._slots) == [0, 1]
+        assert renderer.render_many([chart("d")])[0][1] == b"png:d"
+    finally:
+        renderer.shutdown()
+
+
+def test_timeout_counts_from_when_rendering_starts(monkeypatch):
+    # Each chart takes ~0.2 s of a 0.3 s budget; queued behind others they would
+    # exceed it if waiting in the queue counted.
+    answer = FakeConnection.poll
+
+    def slow_poll(self, timeout):
+        threading.Event().wait(0.2)
+        return answer(self, timeout)
+
+    monkeypatch.setattr(FakeConnection, "poll", slow_poll)
+    renderer = make_renderer(timeout=0.3)
+    try:
+        results = renderer.render_many([chart(str(i)) for i in range(6)])
+        assert [error for _, _, error in results] == [None] * 6
+        assert renderer.stats()["queue_depth"] == 0
+    finally:
+        renderer.shutdown()
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from my_agents.DataReducer import DataReducer, lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_the_spike():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 50.0
+    picked = lttb_indices(x, y, 20)
+    assert len(picked) == 20
+    assert picked[0] == 0 and picked[-1] == 999
+    assert 437 in picked
+    assert np.all(np.diff(picked) > 0)
+
+
+def test_lttb_returns_everything_below_the_threshold():
+    assert list(lttb_indices(np.arange(5.0), np.arange(5.0), 10)) == [0, 1, 2, 3, 4]
+
+
+def test_long_line_is_downsampled_and_duplicates_are_averaged():
+    reducer = DataReducer(max_points=100)
+    df = pd.DataFrame({"t": np.arange(5000), "v": np.sin(np.arange(5000) / 50)})
+    reduced, spec = reducer.reduce(df, {"type": "line_chart", "x_axis": "t", "y_axis": "v"})
+    assert spec["reduction"] == {"method": "lttb", "rows_in": 5000, "rows_out": 100}
+
+    dupes = pd.DataFrame({"t": [1, 1, 2, 2], "v": [1.0, 3.0, 5.0, 7.0]})
+    reduced, spec = reducer.reduce(dupes, {"type": "line_chart", "x_axis": "t", "y_axis": "v"})
+    assert spec["reduction"]["method"] == "x_mean"
+    assert reduced["v"].tolist() == [2.0, 6.0]
+
+
+def test_large_scatter_becomes_hexbin_counts_that_preserve_rows():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"a": rng.normal(size=20000), "b": rng.normal(size=20000)})
+    reducer = DataReducer(max_scatter_points=1000, bins=20)
+    reduced, spec = reducer.reduce(df, {"type": "scatter_plot", "x_axis": "a", "y_axis": "b"})
+    assert spec["reduction"]["method"] == "hexbin"
+    assert reduced["count"].sum() == 20000
+    assert len(reduced) <= 40 * 40
+
+
+def test_small_scatter_is_untouched():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": [4, 5, 6]})
+    reduced, spec = DataReducer().reduce(df, {"type": "scatter_plot", "x_axis": "a", "y_axis": "b"})
+    assert spec["reduction"]["method"] == "none" and len(reduced) == 3
+
+
+def test_bars_are_means_of_the_most_frequent_categories():
+    df = pd.DataFrame({"g": ["a"] * 3 + ["b"] * 2 + ["c"], "v": [1, 2, 3, 10, 20, 100]})
+    reduced, _ = DataReducer(max_categories=2).reduce(df, {"type": "bar_chart", "x_axis": "g", "y_axis": "v"})
+    assert dict(zip(reduced["g"], reduced["v"])) == {"a": 2.0, "b": 15.0}
+
+
+def test_numeric_histogram_is_binned():
+    df = pd.DataFrame({"v": np.arange(100)})
+    reduced, spec = DataReducer(bins=10).reduce(df, {"type": "histogram", "x_axis": "v"})
+    assert spec["reduction"]["method"] == "bins"
+    assert reduced["count"].tolist() == [10] * 10
@@ -0,0 +1,132 @@
+import os
+import asyncio
+import shutil
+
+import pytest
+
+from benchmarks.fixture import seed_database
+from my_agents.DatabaseManager import DatabaseManager
+from my_agents.QueryGovernor import QueryHandle
+
+QUERY = "SELECT name FROM students WHERE student_id <= 3 LIMIT 10"
+
+
+@pytest.fixture
+def database(tmp_path):
+    return seed_database(str(tmp_path / "primary.db"), students=20)
+
+
+def unreachable(tmp_path, name):
+    """A SQLite URL that cannot be opened until its directory is created."""
+    path = tmp_path / "missing" / name
+    return f"sqlite:///{path}", path
+
+
+def make_manager(monkeypatch, primary, replicas=()):
+    monkeypatch.setenv("DATABASE_URL", primary)
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", ",".join(replicas))
+    monkeypatch.setenv("DB_REPLICA_RETRY_INTERVAL", "0")
+    return DatabaseManager()
+
+
+def test_reads_go_round_robin_over_replicas(monkeypatch, tmp_path, database):
+    replica = seed_database(str(tmp_path / "replica.db"), students=20)
+    manager = make_manager(monkeypatch, database, [replica, replica])
+    pools = []
+    for _ in range(4):
+        handle = QueryHandle()
+        assert len(manager.execute_bounded_query(QUERY, handle=handle, use_cache=False).rows) == 3
+        pools.append(handle.pool)
+    assert pools == ["replica-1", "replica-2", "replica-1", "replica-2"]
+    assert manager.pool_stats()["primary"]["reads"] == 0
+
+
+def test_failed_replica_falls_back_and_recovers_on_a_trial_read(monkeypatch, tmp_path, database):
+    replica_url, replica_path = unreachable(tmp_path, "replica.db")
+    manager = make_manager(monkeypatch, database, [replica_url])
+
+    handle = QueryHandle()
+    assert len(manager.execute_bounded_query(QUERY, handle=handle, use_cache=False).rows) == 3
+    assert handle.pool == "primary"
+    assert manager.pool_stats()["replica-1"]["healthy"] is False
+
+    os.makedirs(replica_path.parent)
+    shutil.copy(database.replace("sqlite:///", ""), replica_path)
+    handle = QueryHandle()
+    manager.execute_bounded_query(QUERY, handle=handle, use_cache=False)
+    assert handle.pool == "replica-1"
+    stats = manager.pool_stats()["replica-1"]
+    assert stats["healthy"] is True
+    assert stats["reads"] == 1
+
+
+def test_check_replicas_marks_recovery(monkeypatch, tmp_path, database):
+    replica_url, replica_path = unreachable(tmp_path, "replica.db")
+    manager = make_manager(monkeypatch, database, [replica_url])
+    assert manager.check_replicas() == {"replica-1": False}
+    os.makedirs(replica_path.parent)
+    shutil.copy(database.replace("sqlite:///", ""), replica_path)
+    assert manager.check_replicas() == {"replica-1": True}
+
+
+def test_primary_is_marked_healthy_again_after_a_failed_checkout(monkeypatch, tmp_path, database):
+    primary_url, primary_path = unreachable(tmp_path, "primary.db")
+    manager = make_manager(monkeypatch, primary_url)
+    with pytest.raises(Exception):
+        manager.ping()
+    assert manager.pool_stats()["primary"]["healthy"] is False
+
+    os.makedirs(primary_path.parent)
+    shutil.copy(database.replace("sqlite:///", ""), primary_path)
+    manager.ping()
+    assert manager.pool_stats()["primary"]["healthy"] is True
+
+
+def test_pool_settings_come_from_the_environment(monkeypatch, database):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "2")
+    manager = make_manager(monkeypatch, database)
+    manager.warm_up(2)
+    stats = manager.pool_stats()["primary"]
+    assert manager.engine.pool.size() == 3
+    assert stats["capacity"] == 5
+    assert stats["idle"] == 2
+    assert stats["saturation"] == 0.0
+
+
+def test_async_driver_runs_bounded_queries(monkeypatch, tmp_path, database):
+    pytest.importorskip("aiosqlite")
+    replica = seed_database(str(tmp_path / "replica.db"), students=20)
+    monkeypatch.setenv("DATABASE_ASYNC", "true")
+    manager = make_manager(monkeypatch, database, [replica])
+
+    async def run():
+        handle = QueryHandle()
+        result = await manager.aexecute_bounded_query(QUERY, handle=handle, use_cache=False)
+        capped = await manager.aexecute_bounded_query("SELECT name FROM students", max_rows=5, use_cache=False)
+        await manager.replicas.replicas[0].async_engine.dispose()
+        await manager.primary.async_engine.dispose()
+        return handle, result, capped
+
+    handle, result, capped = asyncio.run(run())
+    assert handle.pool == "replica-1"
+    assert result.columns == ["name"] and len(result.rows) == 3
+    assert len(capped.rows) == 5 and capped.truncated
+    assert "replica-1:async" in manager.pool_stats()
+
+
+def test_async_driver_fails_over_to_the_primary(monkeypatch, tmp_path, database):
+    pytest.importorskip("aiosqlite")
+    replica_url, _ = unreachable(tmp_path, "replica.db")
+    monkeypatch.setenv("DATABASE_ASYNC", "true")
+    manager = make_manager(monkeypatch, database, [replica_url])
+
+    async def run():
+        handle = QueryHandle()
+        result = await manager.aexecute_bounded_query(QUERY, handle=handle, use_cache=False)
+        await manager.primary.async_engine.dispose()
+        return handle, result
+
+    handle, result = asyncio.run(run())
+    assert handle.pool == "primary" and len(result.rows) == 3
+    assert manager.pool_stats()["replica-1"]["healthy"] is False
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from my_agents.FollowUpPlanner import FollowUpPlanner, refers_back
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "name": ["Asha", "Bala", "Chitra", "Dev"],
+        "subject": ["Math", "Physics", "Math", "Chemistry"],
+        "score": [91.0, 72.5, 64.0, 88.0],
+    })
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("now visualize that", True),
+    ("plot it", True),
+    ("sort those by name", True),
+    ("what is it like in Chennai", False),
+    ("show all courses", False),
+])
+def test_refers_back(message, expected):
+    assert refers_back(message) is expected
+
+
+def test_filter_on_a_numeric_column(frame):
+    plan = FollowUpPlanner().plan("only those with score above 80", frame)
+    assert plan.apply(frame)["name"].tolist() == ["Asha", "Dev"]
+
+
+def test_only_a_category_value(frame):
+    plan = FollowUpPlanner().plan("just Math", frame)
+    assert plan.apply(frame)["name"].tolist() == ["Asha", "Chitra"]
+
+
+def test_top_n_sorts_by_the_measure(frame):
+    plan = FollowUpPlanner().plan("only the top 2 of those", frame)
+    assert plan.apply(frame)["name"].tolist() == ["Asha", "Dev"]
+
+
+def test_sort_by_a_named_column_descending(frame):
+    plan = FollowUpPlanner().plan("sort them by name descending", frame)
+    assert plan.apply(frame)["name"].tolist() == ["Dev", "Chitra", "Bala", "Asha"]
+
+
+def test_chart_request_keeps_the_rows(frame):
+    plan = FollowUpPlanner().plan("now visualize that", frame)
+    assert plan.visualize and plan.steps == []
+
+
+def test_unresolvable_follow_up_goes_back_to_sql(frame):
+    assert FollowUpPlanner().plan("those with attendance above 80", frame) is None
+    assert FollowUpPlanner().plan("how many courses are there", frame) is None
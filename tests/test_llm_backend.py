@@ -0,0 +1,17 @@
+import pytest
+
+from my_agents.LLMBackend import LocalBackend, StubBackend
+
+
+def test_backend_without_respond_cannot_be_created():
+    class Incomplete(LocalBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_stub_backend_answers_intent_prompts():
+    backend = StubBackend(latency=0.25)
+    prompt = "Respond with one word: SQL, CHAT\nQuestion: hello"
+    assert backend.respond(prompt) == ("CHAT", 0.25)
@@ -0,0 +1,45 @@
+import time
+
+from my_agents.QueryCache import QueryCache, normalize_question
+
+
+def test_questions_differing_in_case_spacing_and_punctuation_share_an_entry():
+    assert normalize_question("  Show the TOP 10   students?! ") == "show the top 10 students"
+    cache = QueryCache()
+    cache.put("Show the top 10 students", "fp1", "SELECT 1")
+    assert cache.get("show the top 10 students?", "fp1") == "SELECT 1"
+
+
+def test_entries_are_scoped_to_the_schema_fingerprint():
+    cache = QueryCache()
+    cache.put("q", "fp1", "SELECT 1")
+    assert cache.get("q", "fp2") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = QueryCache(ttl=60)
+    cache.put("q", "fp", "SELECT 1")
+    now[0] += 61
+    assert cache.get("q", "fp") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", "fp", "SELECT 'a'")
+    cache.put("b", "fp", "SELECT 'b'")
+    cache.get("a", "fp")
+    cache.put("c", "fp", "SELECT 'c'")
+    assert cache.get("b", "fp") is None
+    assert cache.get("a", "fp") == "SELECT 'a'"
+    assert cache.stats()["size"] == 2
+
+
+def test_evict_removes_sql_that_failed():
+    cache = QueryCache()
+    cache.put("q", "fp", "SELECT broken")
+    cache.evict("q", "fp")
+    assert cache.get("q", "fp") is None
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+from my_agents.QueryGovernor import QueryGovernor, QueryHandle, QueryRejectedError, with_time_limit
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self.rows
+
+    def scalar(self):
+        return self.rows
+
+
+class FakeMySQLConnection:
+    """Answers EXPLAIN with one plan row per table and CONNECTION_ID() with 42."""
+
+    dialect = SimpleNamespace(name="mysql")
+
+    def __init__(self, rows_per_table=1_000_000):
+        self.rows_per_table = rows_per_table
+        self.info = {}
+        self.executed = []
+
+    def execute(self, statement):
+        sql = str(statement)
+        self.executed.append(sql)
+        if sql.startswith("EXPLAIN"):
+            tables = 2 if " JOIN " in sql.upper() else 1
+            return FakeResult([{"id": 1, "rows": self.rows_per_table}] * tables)
+        return FakeResult(42)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM scores s JOIN students st ON st.student_id = s.student_id LIMIT 101",
+    "SELECT * FROM scores WHERE score > 99 LIMIT 101",
+    "SELECT * FROM scores, students LIMIT 101",
+    "SELECT * FROM (SELECT * FROM scores) s LIMIT 101",
+    "SELECT * FROM scores ORDER BY score DESC LIMIT 101",
+])
+def test_limit_does_not_exempt_filtered_or_joined_scans(query):
+    governor = QueryGovernor(max_estimated_rows=10_000)
+    with pytest.raises(QueryRejectedError):
+        governor.check(FakeMySQLConnection(), query)
+    assert governor.stats()["rejected"] == 1
+
+
+def test_limit_exempts_a_plain_single_table_scan():
+    governor = QueryGovernor(max_estimated_rows=10_000)
+    assert governor.check(FakeMySQLConnection(), "SELECT name, city FROM students s LIMIT 101") == 1_000_000
+
+
+def test_time_limit_hint_goes_on_the_top_level_select():
+    assert with_time_limit("SELECT name FROM students LIMIT 5", 2000) == \
+        "SELECT /*+ MAX_EXECUTION_TIME(2000) */ name FROM students LIMIT 5"
+    assert with_time_limit("WITH s AS (SELECT 1 AS x) SELECT x FROM s", 2000) == \
+        "WITH s AS (SELECT 1 AS x) SELECT /*+ MAX_EXECUTION_TIME(2000) */ x FROM s"
+
+
+def test_prepare_adds_no_round_trips_after_the_first_connection_id_lookup():
+    governor = QueryGovernor(timeout_ms=500)
+    connection = FakeMySQLConnection()
+    for _ in range(3):
+        handle = QueryHandle()
+        statement = governor.prepare(connection, "SELECT 1", handle)
+        assert handle.connection_id == 42
+    assert statement == "SELECT /*+ MAX_EXECUTION_TIME(500) */ 1"
+    assert connection.executed == ["SELECT CONNECTION_ID()"]
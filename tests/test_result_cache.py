@@ -0,0 +1,100 @@
+import threading
+
+from my_agents.DatabaseManager import QueryResult
+from my_agents.ResultCache import ResultCache, is_cacheable
+
+
+class VersionProbe:
+    """Table versions a test can change; counts how often the cache probes."""
+
+    def __init__(self, **versions):
+        self.versions = versions
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.versions)
+
+
+def result(*rows):
+    return QueryResult(["name"], [(row,) for row in rows])
+
+
+def test_hit_until_a_read_table_changes():
+    probe = VersionProbe(students=1, scores=1)
+    cache = ResultCache(probe, probe_interval=0)
+    cache.put("SELECT name FROM students LIMIT 5", ["students"], result("a"))
+
+    assert cache.get("SELECT name  FROM students\n LIMIT 5;").rows == [("a",)]
+    probe.versions["scores"] = 2
+    assert cache.get("SELECT name FROM students LIMIT 5") is not None
+    probe.versions["students"] = 2
+    assert cache.get("SELECT name FROM students LIMIT 5") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_probes_at_most_once_per_interval():
+    probe = VersionProbe(students=1)
+    cache = ResultCache(probe, probe_interval=60)
+    cache.put("SELECT 1 FROM students LIMIT 1", ["students"], result("a"))
+    for _ in range(10):
+        assert cache.get("SELECT 1 FROM students LIMIT 1") is not None
+    assert probe.calls == 1
+
+
+def test_not_cached_without_a_version_for_every_table():
+    cache = ResultCache(VersionProbe(students=1), probe_interval=0)
+    cache.put("SELECT * FROM view_x LIMIT 1", ["view_x"], result("a"))
+    cache.put("SELECT 1", [], result("a"))
+    assert cache.stats()["entries"] == 0
+
+
+def test_failed_probe_bypasses_the_cache():
+    def failing():
+        raise RuntimeError("server gone")
+
+    cache = ResultCache(failing, probe_interval=0)
+    cache.put("SELECT name FROM students LIMIT 1", ["students"], result("a"))
+    assert cache.get("SELECT name FROM students LIMIT 1") is None
+
+
+def test_evicts_least_recently_used_over_the_byte_bound():
+    cache = ResultCache(VersionProbe(t=1), max_bytes=600, probe_interval=60)
+    for i in range(3):
+        cache.put(f"SELECT {i} FROM t LIMIT 1", ["t"], result("x" * 100))
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["bytes"] <= 600
+    assert cache.get("SELECT 2 FROM t LIMIT 1") is not None
+
+
+def test_slow_probe_does_not_block_misses_or_stats():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_probe():
+        started.set()
+        release.wait(5)
+        return {"students": 1}
+
+    cache = ResultCache(slow_probe, probe_interval=0)
+    writer = threading.Thread(target=cache.put, args=("SELECT 1 FROM students LIMIT 1", ["students"], result("a")))
+    writer.start()
+    assert started.wait(5)
+    try:
+        # The probe is in flight; neither call needs versions, so neither waits for it.
+        lookups = []
+        reader = threading.Thread(target=lambda: lookups.append(
+            (cache.get("SELECT 2 FROM students LIMIT 1"), cache.stats()["misses"])))
+        reader.start()
+        reader.join(1)
+        assert lookups == [(None, 1)]
+    finally:
+        release.set()
+        writer.join(5)
+    assert cache.stats()["entries"] == 1
+
+
+def test_nondeterministic_queries_are_not_cacheable():
+    assert is_cacheable("SELECT name FROM students LIMIT 1")
+    assert not is_cacheable("SELECT NOW(), name FROM students LIMIT 1")
+    assert not is_cacheable("SELECT * FROM scores WHERE assessed_on > CURRENT_DATE LIMIT 1")
@@ -0,0 +1,41 @@
+from my_agents.SchemaRetriever import SchemaRetriever, tokenize
+
+
+def column(name, key=""):
+    return {"name": name, "type": "int", "key": key, "comment": ""}
+
+
+SCHEMA = {
+    "students": [column("student_id", "PRI"), column("name"), column("city")],
+    "courses": [column("course_id", "PRI"), column("subject"), column("credits")],
+    "scores": [column("score_id", "PRI"), column("student_id", "MUL"), column("course_id", "MUL"),
+               column("score")],
+    "attendance": [column("student_id", "MUL"), column("course_id", "MUL"), column("attended")],
+    "hostels": [column("hostel_id", "PRI"), column("warden"), column("capacity")],
+    "library_loans": [column("loan_id", "PRI"), column("book_title"), column("due_date")],
+}
+
+
+def test_tokenize_splits_identifiers_and_folds_plurals():
+    assert tokenize("bookTitle due_date") == ["book", "title", "due", "date"]
+    assert "student" in tokenize("students")
+
+
+def test_picks_the_matching_table_and_its_join_partners():
+    result = SchemaRetriever().retrieve("average score of each student", SCHEMA, "fp")
+    assert not result.fallback
+    assert "scores" in result.tables and "students" in result.tables
+    assert "hostels" not in result.tables and "library_loans" not in result.tables
+    assert result.tokens_saved > 0
+
+
+def test_weak_match_falls_back_to_the_full_schema():
+    result = SchemaRetriever().retrieve("hello there", SCHEMA, "fp")
+    assert result.fallback and result.schema == SCHEMA
+
+
+def test_index_is_rebuilt_when_the_fingerprint_changes():
+    retriever = SchemaRetriever()
+    retriever.retrieve("hostel capacity", SCHEMA, "fp1")
+    changed = {**SCHEMA, "clubs": [column("club_id", "PRI"), column("club_name")]}
+    assert "clubs" in retriever.retrieve("club names", changed, "fp2").tables
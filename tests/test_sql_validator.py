@@ -0,0 +1,77 @@
+import pytest
+
+from my_agents.SQLValidator import SQLValidator
+
+SCHEMA = {
+    "students": ["student_id", "name", "department", "enrollment_date", "city"],
+    "courses": ["course_id", "subject", "credits"],
+    "scores": ["score_id", "student_id", "course_id", "score", "assessed_on"],
+}
+
+
+@pytest.fixture
+def validator():
+    return SQLValidator(SCHEMA)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM students LIMIT 10",
+    "SELECT EXTRACT(YEAR FROM enrollment_date) AS yr, COUNT(*) FROM students GROUP BY yr LIMIT 10",
+    "SELECT TRIM(LEADING 'a' FROM name) FROM students LIMIT 5",
+    "SELECT TRIM(BOTH ' ' FROM city) AS c FROM students LIMIT 5",
+    "SELECT CONVERT(name USING utf8mb4) FROM students LIMIT 5",
+    "SELECT SUBSTRING(name FROM 1 FOR 3) FROM students LIMIT 5",
+    "SELECT s.name, sc.score FROM students s JOIN scores sc ON s.student_id = sc.student_id LIMIT 10",
+    "SELECT name FROM students WHERE student_id IN (SELECT student_id FROM scores WHERE score > 90) LIMIT 5",
+    "WITH top AS (SELECT student_id FROM scores WHERE score > 90) SELECT * FROM top LIMIT 5",
+    "SELECT AVG(score) FROM scores",
+    "SELECT department, COUNT(*) total FROM students GROUP BY department ORDER BY total DESC LIMIT 5;",
+])
+def test_accepts_read_only_queries(validator, sql):
+    result = validator.validate(sql)
+    assert result["is_valid"], result["issues"]
+    assert result["risk_level"] == "low"
+
+
+@pytest.mark.parametrize("sql, issue", [
+    ("DELETE FROM students", "Only SELECT queries are allowed"),
+    ("SELECT * FROM students; DROP TABLE students", "Multiple statements are not allowed"),
+    ("SELECT SLEEP(10) FROM students LIMIT 1", "Forbidden function: SLEEP"),
+    ("SELECT * FROM students LOCK IN SHARE MODE LIMIT 1", "Locking reads are not allowed"),
+    ("SELECT /*!50000 name */ FROM students LIMIT 1", "Executable comments are not allowed"),
+])
+def test_rejects_unsafe_queries_as_high_risk(validator, sql, issue):
+    result = validator.validate(sql)
+    assert not result["is_valid"]
+    assert result["risk_level"] == "high"
+    assert issue in result["issues"]
+
+
+@pytest.mark.parametrize("sql, issue", [
+    ("SELECT * FROM bogus LIMIT 1", "Unknown table: bogus"),
+    ("SELECT nope FROM students LIMIT 1", "Unknown column: nope"),
+    ("SELECT s.nope FROM students s LIMIT 1", "Unknown column: s.nope"),
+    ("SELECT * FROM students CROSS JOIN scores LIMIT 1", "CROSS JOIN is not allowed"),
+    ("SELECT * FROM students, scores LIMIT 1", "Comma join without WHERE produces a cross join"),
+    ("SELECT * FROM students", "Query has no LIMIT and no aggregate; it could return the whole table"),
+])
+def test_flags_schema_and_shape_problems(validator, sql, issue):
+    result = validator.validate(sql)
+    assert not result["is_valid"]
+    assert issue in result["issues"]
+
+
+def test_function_from_is_not_a_table_reference(validator):
+    sql = "SELECT EXTRACT(YEAR FROM enrollment_date), TRIM(LEADING 'a' FROM name) FROM students LIMIT 5"
+    assert validator.referenced_tables(sql) == ["students"]
+
+
+def test_referenced_tables_include_derived_and_subquery_sources(validator):
+    sql = ("SELECT t.student_id FROM (SELECT student_id, AVG(score) a FROM scores GROUP BY student_id) t "
+           "WHERE t.student_id IN (SELECT student_id FROM students) LIMIT 5")
+    assert validator.referenced_tables(sql) == ["scores", "students"]
+
+
+def test_without_schema_only_safety_is_checked():
+    result = SQLValidator().validate("SELECT anything FROM anywhere LIMIT 1")
+    assert result["is_valid"]